@@ -26,11 +26,13 @@
 import json
 import logging
 
-from elasticsearch_dsl.query import Bool, Nested, Q, Term
+from elasticsearch_dsl.query import Bool, Nested, Q, Term, Terms
+from flask import current_app
 from flask_login import current_user
 from invenio_search import RecordsSearch
 from invenio_search.api import MinShouldMatch
 
+from invenio_explicit_acls.api import PRINCIPAL_TOKENS_FIELD
 from invenio_explicit_acls.models import Actor
 from invenio_explicit_acls.proxies import current_explicit_acls
 
@@ -76,14 +78,35 @@ class ACLDefaultFilter:
         :param context:     extra context if user is set. See SystemRoleActor.get_elasticsearch_query for more info
         :return:            ES "bool" query
         """
-        actor_query_part = []
         operations = _make_list_default(operation, self.operations)
 
         context = context or dict()
 
-        # for each registered Actor class get its ES query
         tested_user = user or current_user
         assert tested_user is not None, 'Current_user must be set in order to create ACL query'
+
+        # the compiled filter is reused for the same user, roles and operations
+        key = current_explicit_acls.get_search_filter_key(tested_user, operations, context)
+        if key is not None:
+            key = (type(self).__name__, current_app.config['INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS']) + key
+            cached = current_explicit_acls.get_cached_search_filter(key)
+            if cached is not None:
+                return Q(cached)
+
+        query = self._build_query(operations, tested_user, context)
+        if key is not None:
+            current_explicit_acls.cache_search_filter(key, query.to_dict())
+        return query
+
+    def _build_query(self, operations, tested_user, context):
+        if current_app.config['INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS']:
+            principals = current_explicit_acls.get_user_principal_tokens(tested_user, context)
+            if principals is not None:
+                return self._build_principal_tokens_query(operations, principals)
+
+        actor_query_part = []
+
+        # for each registered Actor class get its ES query
         for actor_model in current_explicit_acls.actor_models:  # type: Actor
             q = actor_model.get_elasticsearch_query(tested_user, context)
             if q:
@@ -125,6 +148,27 @@ class ACLDefaultFilter:
             logger.debug('Query: %s', query.to_dict())
         return query
 
+    def _build_principal_tokens_query(self, operations, principals):
+        """
+        Creates a query matching the user's principal tokens against the flat PRINCIPAL_TOKENS_FIELD property.
+
+        :param operations:  list of operations
+        :param principals:  principal tokens of the user, see AclAPI.get_user_principal_tokens
+        :return:            ES "bool" query with a single non-nested terms query per operation
+        """
+        queries = [
+            Terms(
+                _name=f'{ACL_MATCHED_QUERY}_{operation}',
+                **{PRINCIPAL_TOKENS_FIELD: [f'{operation}|{x}' for x in principals]}
+            )
+            for operation in operations
+        ]
+        query = Bool(should=queries, minimum_should_match=1)
+
+        if logger.isEnabledFor(logging.DEBUG):  # pragma no cover
+            logger.debug('Query: %s', query.to_dict())
+        return query
+
 
 class ACLRecordsSearch(RecordsSearch):
     """ACL enabled RecordsSearch."""
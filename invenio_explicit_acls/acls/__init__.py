@@ -28,5 +28,6 @@ from .default_acls import DefaultACL
 from .elasticsearch_acls import ElasticsearchACL
 from .id_acls import IdACL
 from .propertyvalue_acls import PropertyValueACL
+from .recordset_acls import RecordSetACL
 
-__all__ = ('DefaultACL', 'ElasticsearchACL', 'IdACL', 'PropertyValueACL')
+__all__ = ('DefaultACL', 'ElasticsearchACL', 'IdACL', 'PropertyValueACL', 'RecordSetACL')
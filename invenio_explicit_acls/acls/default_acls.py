@@ -23,15 +23,17 @@
 # SOFTWARE.
 #
 """Models for storing Default ACLs."""
-from typing import Iterable
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
 
 from invenio_db import db
 from invenio_records import Record
-from invenio_search import current_search_client
 from sqlalchemy import func
 
-from invenio_explicit_acls.es import add_doc_type
+from invenio_explicit_acls.es import iter_ids
+from invenio_explicit_acls.matcher import load_acls, load_records_acls
 from invenio_explicit_acls.models import ACL
+from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.utils import get_record_acl_enabled_schema, \
     schema_to_index
 
@@ -58,16 +60,48 @@ class DefaultACL(ACL):
 
         :param record: Invenio record
         """
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            yield from load_acls(DefaultACL, matcher.get_default_acl_ids(record))
+            return
+
         schema = get_record_acl_enabled_schema(record)
-        if db.engine.dialect.name == 'postgresql':
-            # postgresql has array field, so search in the array
-            for r in DefaultACL.query.filter(DefaultACL.schemas.any(schema)).all():
-                yield r
-        else:
-            # otherwise iterate all the default ACLs, let's hope there is not too many of them
-            for acl in DefaultACL.query.all():
-                if schema in acl.schemas:
-                    yield acl
+        yield from DefaultACL.query.filter(DefaultACL.has_schema(schema)).all()
+
+    @classmethod
+    def get_records_acls(clz, records: Iterable[Record]) -> Dict[str, List['ACL']]:
+        """
+        Returns ACL objects applicable for each of the given records.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> list of ACLs
+        """
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return load_records_acls(
+                DefaultACL, {str(record.id): matcher.get_default_acl_ids(record) for record in records})
+
+        ret = {}
+        record_ids_by_schema = defaultdict(list)
+        for record in records:
+            ret[str(record.id)] = []
+            schema = get_record_acl_enabled_schema(record)
+            if schema:
+                record_ids_by_schema[schema].append(str(record.id))
+
+        if not record_ids_by_schema:
+            return ret
+
+        for acl in DefaultACL.query.filter(DefaultACL.has_schema(*record_ids_by_schema)):
+            for schema in acl.schemas:
+                for record_id in record_ids_by_schema.get(schema, ()):
+                    ret[record_id].append(acl)
+        return ret
+
+    @classmethod
+    def get_record_dependencies(clz, index) -> Optional[Set[str]]:
+        """Default ACLs depend only on the schema of the record."""
+        return {'$schema'}
 
     @classmethod
     def prepare_schema_acls(self, schema):
@@ -89,17 +123,7 @@ class DefaultACL(ACL):
         for schema in self.schemas:
             index, doc_type = schema_to_index(schema)
 
-            for r in current_search_client.search(
-                index=index,
-                **add_doc_type(doc_type),
-                body={
-                    "query": {
-                        "match_all": {}
-                    },
-                    "_source": False,
-                }
-            )['hits']['hits']:
-                yield r['_id']
+            yield from iter_ids(index, {"match_all": {}}, doc_type)
 
     def update(self):
         """Update any internal representation / index for the acl."""
@@ -23,23 +23,52 @@
 # SOFTWARE.
 #
 """Mixin for ACLs that are implemented via ES query."""
+import datetime
 import json
 import logging
-from typing import Iterable
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
 
 import elasticsearch
+import elasticsearch.helpers
 from flask import current_app
 from invenio_indexer import current_record_to_index
 from invenio_records import Record
 from invenio_search import current_search, current_search_client
 
-from invenio_explicit_acls.es import add_doc_type
+from invenio_explicit_acls.durability import after_write, \
+    get_write_kwargs, visibility_barrier
+from invenio_explicit_acls.es import add_bulk_doc_type, add_doc_type, \
+    iter_ids
+from invenio_explicit_acls.matcher import load_acls, load_records_acls
 from invenio_explicit_acls.models import ACL
 from invenio_explicit_acls.proxies import current_explicit_acls
-from invenio_explicit_acls.utils import schema_to_index
+from invenio_explicit_acls.selectors import ALL_FIELDS, NO_FIELDS, \
+    get_query_fields, project_document
+from invenio_explicit_acls.utils import get_priority_floors, \
+    prune_by_priority, schema_to_index
 
 logger = logging.getLogger(__name__)
 
+ACL_INDEX_PROPERTIES = {
+    "__acl_record_selector": {
+        "type": "percolator"
+    },
+    "__acl_record_type": {
+        "type": "keyword"
+    },
+    "__acl_record_fields": {
+        "type": "keyword"
+    },
+    "__acl_priority": {
+        "type": "integer"
+    },
+    "__acl_priority_group": {
+        "type": "keyword"
+    }
+}
+"""Properties of ACL documents added to the record mapping in percolator indices."""
+
 
 class ESACLMixin(object):
     """Mixin to be used with ACL class as a base for ES-based ACLs."""
@@ -58,64 +87,175 @@ class ESACLMixin(object):
         :return:
         """
         # run percolate query on the index record's index
-
-        query = clz._get_percolate_query(record)
-        if logger.isEnabledFor(logging.DEBUG) <= logging.DEBUG:
-            logger.debug('get_material_acls: query %s', json.dumps(query, indent=4, ensure_ascii=False))
         index, _doc_type = current_record_to_index(record)
-        try:
-            for r in current_search_client.search(
-                index=clz.get_acl_index_name(index),
-                **add_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME']),
-                body=query
-            )['hits']['hits']:
-                yield clz.query.get(r['_id'])
-        except elasticsearch.TransportError as e:
-            logger.error('Error running ACL query on index %s, doctype %s, query %s',
-                         clz.get_acl_index_name(index), current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME'],
-                         query)
-            if e.status_code == 404:
-                raise RuntimeError('Explicit ACLs were not prepared for the given schema. '
-                                   'Please run invenio explicit-acls prepare %s' % record.get('$schema', ''))
-            else:  # pragma: no cover
-                raise
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('get_material_acls: query %s',
+                         json.dumps(clz._get_percolate_query(record), indent=4, ensure_ascii=False))
+        acl_ids = [acl_id for _acl_type, acl_id, _priority in percolate_records(index, [clz], [record])[0]]
+
+        # load all matched ACLs in a single query, keeping the order of percolator hits
+        acls = {acl.id: acl for acl in load_acls(clz, acl_ids)}
+        for acl_id in acl_ids:
+            if acl_id in acls:
+                yield acls[acl_id]
 
     @classmethod
-    def _get_percolate_query(cls, record):
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "percolate": {
-                                "field": "__acl_record_selector",
-                                "document": dict(record)
-                            }
-                        },
-                        {
-                            "term": {
-                                "__acl_record_type": cls.__mapper_args__['polymorphic_identity']
-                            }
-                        }
-                    ]
-                }
-            }
+    def get_records_acls(clz, records: Iterable[Record]) -> Dict[str, List['ACL']]:
+        """
+        Returns ACL objects applicable for each of the given records.
+
+        All records stored in the same index are percolated in a single multi-document percolate query,
+        matched ACLs are then loaded from the database in a single query.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> list of ACLs
+        """
+        return get_es_records_acls([clz], records)
+
+    @classmethod
+    def get_record_dependencies(clz, index) -> Optional[Set[str]]:
+        """
+        Returns record fields referenced by the percolated ACLs stored for the index.
+
+        :param index: name of the record index
+        :return: set of dotted field paths or None if they are not known
+        """
+        return current_explicit_acls.get_percolated_fields(index)
+
+    @classmethod
+    def _get_in_memory_records_acl_ids(clz, records: List[Record]) -> Dict[str, Iterable[str]]:
+        """
+        Returns ids of ACLs of this type that have been matched in memory, without percolation.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> ACL ids
+        """
+        return {}
+
+    @classmethod
+    def _needs_percolation(clz, index):
+        """
+        Returns True if ACLs of this type need to be percolated for records in the given index.
+
+        :param index: name of the record index
+        """
+        return True
+
+    @classmethod
+    def _percolate(clz, index, query, **kwargs):
+        """
+        Runs the percolate query on ACL index of the given record index and yields all the hits.
+
+        Hits are fetched without _source, so that only ACL ids (and matched document slots for multi-document
+        percolation) are transferred. If they do not fit into a single page of
+        INVENIO_EXPLICIT_ACLS_PERCOLATE_PAGE_SIZE, the query is run once more with a scroll
+        that pages through all the hits regardless of index.max_result_window.
+
+        :param index: name of the record index
+        :param query: percolate query, see _get_percolate_query
+        :param kwargs: extra parameters of the search request body
+        """
+        page_size = current_app.config['INVENIO_EXPLICIT_ACLS_PERCOLATE_PAGE_SIZE']
+        body = {
+            **query,
+            '_source': False,
+            'sort': ['_doc'],
+            **kwargs
         }
-        return query
+        search_kwargs = {
+            'index': clz.get_acl_index_name(index),
+            **add_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME'])
+        }
+        hits = current_search_client.search(body={**body, 'size': page_size}, **search_kwargs)['hits']['hits']
+        if len(hits) < page_size:
+            # the usual case, all the hits are in the first page
+            yield from hits
+            return
+        yield from elasticsearch.helpers.scan(current_search_client._get_current_object(), query=body,
+                                              size=page_size, preserve_order=True, **search_kwargs)
+
+    @classmethod
+    def _percolate_failed(clz, e, index, query, schema):
+        logger.error('Error running ACL query on index %s, doctype %s, query %s',
+                     clz.get_acl_index_name(index), current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME'],
+                     query)
+        if e.status_code == 404:
+            raise RuntimeError('Explicit ACLs were not prepared for the given schema. '
+                               'Please run invenio explicit-acls prepare %s' % schema)
+        else:  # pragma: no cover
+            raise e
+
+    @classmethod
+    def _get_percolate_query(cls, record):
+        index, _doc_type = current_record_to_index(record)
+        return cls._make_percolate_query(index, document=get_percolated_document(index, record))
+
+    @classmethod
+    def _get_in_memory_acl_ids(cls, index):
+        """
+        Returns ids of ACLs of this type that are matched in memory and should not be percolated.
+
+        :param index: name of the record index
+        """
+        return ()
+
+    @classmethod
+    def _make_percolate_query(cls, index, **percolated):
+        return make_percolate_query(index, [cls], **percolated)
 
     @classmethod
     def prepare_schema_acls(self, schema):
         """
         Prepare ACLs for the given index.
 
+        The percolator index is created under a versioned name (see get_acl_index_version_name)
+        and is accessed through an alias returned by get_acl_index_name, so that it can be
+        rebuilt later without downtime via rebuild_schema_acls.
+
         :param schema: schema for which to prepare the ACLs
         """
         index_name, doc_type = schema_to_index(schema)
 
         # create a new index where percolate queries will be stored
         acl_index_name = self.get_acl_index_name(index_name)
-        # create mapping for acl index
+        if current_search_client.indices.exists_alias(name=acl_index_name):
+            self._update_acl_index_mapping(acl_index_name, schema)
+            return
+        if current_search_client.indices.exists(index=acl_index_name):
+            logger.warning('ACL index %s is not versioned, please run invenio explicit-acls rebuild-percolators %s',
+                           acl_index_name, schema)
+            self._update_acl_index_mapping(acl_index_name, schema)
+            return
+        try:
+            self._create_acl_index(index_name, aliased=True)
+        except Exception as e:
+            logger.error('Error in creating index for ACLs: %s', e)
+
+    @classmethod
+    def _update_acl_index_mapping(clz, acl_index_name, schema):
+        """
+        Adds properties of ACL documents missing in an existing percolator index (created by an older version).
+
+        :param acl_index_name: name (or alias) of the percolator index
+        :param schema: schema of the records
+        :raises RuntimeError: if a property has already been mapped with a different type
+        """
+        try:
+            current_search_client.indices.put_mapping(
+                index=acl_index_name, **add_doc_type(current_explicit_acls.acl_doctype_name),
+                body={'properties': ACL_INDEX_PROPERTIES})
+        except elasticsearch.exceptions.RequestError as e:
+            raise RuntimeError('Mapping of percolator index %s is not compatible with this version (%s), '
+                               'please run invenio explicit-acls rebuild-percolators %s' %
+                               (acl_index_name, e, schema)) from e
+
+    @classmethod
+    def _get_acl_index_body(clz, index_name):
+        """
+        Returns the body of the create index request of the percolator index for the given record index.
 
+        :param index_name: name of the record index
+        """
         target_mapping_resource = current_search.mappings[index_name]
         with open(target_mapping_resource) as f:
             mapping = json.load(f)
@@ -129,31 +269,93 @@ class ESACLMixin(object):
                 mapping['mappings'][acl_doctype_name] = mapping['mappings'][fk]
                 del mapping['mappings'][fk]
 
-
             mapping['mappings'][acl_doctype_name]['properties'] = {
                 **mapping['mappings'][acl_doctype_name]['properties'],
-                "__acl_record_selector": {
-                    "type": "percolator"
-                },
-                "__acl_record_type": {
-                    "type": "keyword"
-                }
+                **ACL_INDEX_PROPERTIES
             }
         else:
             # ES7 mapping file
             mapping['mappings']['properties'] = {
                 **mapping['mappings']['properties'],
-                "__acl_record_selector": {
-                    "type": "percolator"
-                },
-                "__acl_record_type": {
-                    "type": "keyword"
-                }
+                **ACL_INDEX_PROPERTIES
             }
-        try:
-            current_search_client.indices.create(index=acl_index_name, body=mapping)
-        except Exception as e:
-            logger.error('Error in creating index for ACLs: %s', e)
+        return mapping
+
+    @classmethod
+    def _create_acl_index(clz, index_name, aliased=False):
+        """
+        Creates a new versioned percolator index for the given record index.
+
+        :param index_name: name of the record index
+        :param aliased: if True, the alias of the percolator index is created together with the index
+        :return: name of the created index
+        """
+        body = clz._get_acl_index_body(index_name)
+        if aliased:
+            body['aliases'] = {clz.get_acl_index_name(index_name): {}}
+        acl_index_version_name = clz.get_acl_index_version_name(index_name)
+        current_search_client.indices.create(index=acl_index_version_name, body=body)
+        return acl_index_version_name
+
+    @classmethod
+    def rebuild_schema_acls(clz, schema, delete_old=True):
+        """
+        Rebuilds the percolator index for the given schema without making percolation unavailable.
+
+        A new versioned index is created with the current mapping of the record index, all ES-based ACLs
+        for the schema are written to it in bulk and the alias is then atomically switched to the new index.
+        ACLs changed or removed during the rebuild are synchronized after the switch.
+
+        A percolator index created by older versions of this library (not behind an alias) is removed
+        in the same atomic operation as the alias is created.
+
+        :param schema: schema whose percolator index should be rebuilt
+        :param delete_old: remove the previous versions of the percolator index
+        :return: name of the new percolator index
+        """
+        index_name, doc_type = schema_to_index(schema)
+        acl_index_name = clz.get_acl_index_name(index_name)
+        started = datetime.datetime.utcnow()
+
+        acls = [acl for acl in ACL.query.filter(ACL.has_schema(schema)) if isinstance(acl, ESACLMixin)]
+        new_index_name = clz._create_acl_index(index_name)
+        success, errors = clz._bulk_write(acls, 'index', index_names={acl_index_name: new_index_name})
+        if errors:
+            current_search_client.indices.delete(index=new_index_name)
+            raise RuntimeError('Could not write ACLs to the new percolator index %s: %s' % (new_index_name, errors))
+        visibility_barrier([new_index_name])
+
+        actions = []
+        old_index_names = []
+        if current_search_client.indices.exists_alias(name=acl_index_name):
+            old_index_names = list(current_search_client.indices.get_alias(name=acl_index_name).keys())
+            actions.extend({'remove': {'index': x, 'alias': acl_index_name}} for x in old_index_names)
+        elif current_search_client.indices.exists(index=acl_index_name):
+            actions.append({'remove_index': {'index': acl_index_name}})
+        actions.append({'add': {'index': new_index_name, 'alias': acl_index_name}})
+        current_search_client.indices.update_aliases(body={'actions': actions})
+
+        # synchronize ACLs that were changed while the new index was being filled
+        written_ids = {acl.id for acl in acls}
+        current_acls = [acl for acl in ACL.query.filter(ACL.has_schema(schema)) if isinstance(acl, ESACLMixin)]
+        changed = [acl for acl in current_acls if acl.id not in written_ids or
+                   (acl.updated is not None and acl.updated >= started)]
+        removed_ids = written_ids - {acl.id for acl in current_acls}
+        if changed:
+            clz._bulk_write(changed, 'index')
+        if removed_ids:
+            doc_type = add_bulk_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME'])
+            elasticsearch.helpers.bulk(current_search_client, (
+                {'_op_type': 'delete', '_index': acl_index_name, '_id': acl_id, **doc_type}
+                for acl_id in sorted(removed_ids)
+            ), raise_on_error=False, **get_write_kwargs())
+            after_write([acl_index_name])
+        current_explicit_acls.es_acls_changed([acl_index_name])
+
+        if delete_old:
+            for old_index_name in old_index_names:
+                current_search_client.indices.delete(index=old_index_name)
+        return new_index_name
 
     def get_matching_resources(self) -> Iterable[str]:
         """
@@ -165,56 +367,142 @@ class ESACLMixin(object):
         for schema in self.schemas:
             index_name, doc_type = schema_to_index(schema)
             try:
-                for doc in elasticsearch.helpers.scan(
-                    current_search_client,
-                    query={
-                        "query": self.record_selector,
-                        "_source": False,
-                    },
-                    index=index_name, **add_doc_type(doc_type)
-                ):
-                    yield doc['_id']
+                yield from iter_ids(index_name, self.record_selector, doc_type)
             except:  # pragma: no cover
                 logger.exception('Error getting resources for schema %s', schema)
 
+    def get_percolator_document(self):
+        """Returns the document representing this ACL in the percolator indices."""
+        record_selector = self.record_selector
+        record_fields = get_query_fields(record_selector)
+        if record_fields is None:
+            record_fields = [ALL_FIELDS]
+        elif not record_fields:
+            record_fields = [NO_FIELDS]
+        return {
+            '__acl_record_selector': record_selector,
+            '__acl_record_type': self.type,
+            '__acl_priority': self.priority or 0,
+            '__acl_priority_group': self.priority_group,
+            '__acl_record_fields': sorted(record_fields)
+        }
+
+    def get_acl_index_names(self):
+        """Returns names of the percolator indices this ACL is stored in."""
+        return [self.get_acl_index_name(schema_to_index(x)[0]) for x in self.schemas]
+
     def update(self):
         """Update any internal representation / index for the acl."""
-        body = {
-            '__acl_record_selector': self.record_selector,
-            '__acl_record_type': self.type
-        }
+        body = self.get_percolator_document()
         if logger.isEnabledFor(logging.DEBUG) <= logging.DEBUG:
             logger.debug('get_material_acls: query %s', json.dumps(body, indent=4, ensure_ascii=False))
-        schema_indices = [schema_to_index(x)[0] for x in self.schemas]
-        acl_index_names = [self.get_acl_index_name(x) for x in schema_indices]
-        for acl_idx_name in acl_index_names:
-            try:
+        acl_index_names = self.get_acl_index_names()
+        try:
+            for acl_idx_name in acl_index_names:
                 resp = current_search_client.index(
                     index=acl_idx_name,
                     **add_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME']),
                     id=self.id,
                     body=body,
-                    refresh='wait_for'
+                    **get_write_kwargs()
                 )
                 assert resp['result'] in ('created', 'updated')
-            finally:
-                current_search_client.indices.flush(index=acl_idx_name)
+        finally:
+            after_write(acl_index_names)
+            current_explicit_acls.es_acls_changed(acl_index_names)
 
     def delete(self):
         """Delete acl from any internal representation / index for the acl."""
-        for schema in self.schemas:
-            acl_index_name = self.get_acl_index_name(schema_to_index(schema)[0])
-            try:
-                return current_search_client.delete(
-                    index=acl_index_name,
-                    **add_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME']),
-                    id=self.id,
-                    refresh='wait_for'
-                )
-            except:  # pragma: no cover
-                logger.exception('Strange, the ACL has not been indexed: %s', repr(self))
-            finally:
-                current_search_client.indices.flush(index=acl_index_name)
+        acl_index_names = self.get_acl_index_names()
+        try:
+            for acl_index_name in acl_index_names:
+                try:
+                    current_search_client.delete(
+                        index=acl_index_name,
+                        **add_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME']),
+                        id=self.id,
+                        **get_write_kwargs()
+                    )
+                except:  # pragma: no cover
+                    logger.exception('Strange, the ACL has not been indexed: %s', repr(self))
+        finally:
+            after_write(acl_index_names)
+            current_explicit_acls.es_acls_changed(acl_index_names)
+
+    @classmethod
+    def bulk_update(clz, acls: Iterable['ESACLMixin']):
+        """
+        Writes the given ACLs to the percolator indices via elasticsearch bulk API.
+
+        Unlike calling update() on each ACL, the durability policy is applied just once at the end.
+
+        :param acls: ACLs of any ESACLMixin based types
+        :return: a tuple (number of written percolator documents, list of errors)
+        """
+        return clz._bulk_write(acls, 'index')
+
+    @classmethod
+    def bulk_delete(clz, acls: Iterable['ESACLMixin']):
+        """
+        Removes the given ACLs from the percolator indices via elasticsearch bulk API.
+
+        :param acls: ACLs of any ESACLMixin based types
+        :return: a tuple (number of removed percolator documents, list of errors)
+        """
+        return clz._bulk_write(acls, 'delete')
+
+    @classmethod
+    def _bulk_write(clz, acls, op_type, index_names=None):
+        """
+        Writes the ACLs to percolator indices via elasticsearch bulk API.
+
+        :param acls: ACLs of any ESACLMixin based types
+        :param op_type: 'index' or 'delete'
+        :param index_names: if set, a dictionary of percolator index alias -> index to write to.
+                            Aliases not present in the dictionary are skipped.
+        """
+        acl_index_names = set()
+        doc_type = add_bulk_doc_type(current_app.config['INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME'])
+
+        def actions():
+            for acl in acls:
+                body = acl.get_percolator_document() if op_type == 'index' else None
+                for acl_index_name in acl.get_acl_index_names():
+                    if index_names is not None:
+                        if acl_index_name not in index_names:
+                            continue
+                        acl_index_name = index_names[acl_index_name]
+                    acl_index_names.add(acl_index_name)
+                    action = {
+                        '_op_type': op_type,
+                        '_index': acl_index_name,
+                        '_id': acl.id,
+                        **doc_type
+                    }
+                    if body is not None:
+                        action['_source'] = body
+                    yield action
+
+        try:
+            success, errors = elasticsearch.helpers.bulk(current_search_client, actions(), raise_on_error=False,
+                                                         **get_write_kwargs())
+            for error in errors:
+                logger.error('Error writing ACL to percolator index: %s', error)
+            return success, errors
+        finally:
+            if acl_index_names:
+                after_write(acl_index_names)
+                current_explicit_acls.es_acls_changed(acl_index_names)
+
+    @classmethod
+    def get_acl_index_version_name(clz, target_index_name):
+        """
+        Returns a new unique name of a versioned percolator index for the given record index.
+
+        :param target_index_name: name of the record index
+        """
+        return '%s-%s' % (clz.get_acl_index_name(target_index_name),
+                          datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
 
     @classmethod
     def get_acl_index_name(clz, target_index_name):
@@ -226,3 +514,183 @@ class ESACLMixin(object):
         :return:    An iterable of Record IDs
         """
         return f'{current_app.config["INVENIO_EXPLICIT_ACLS_INDEX_NAME"]}-{target_index_name}'
+
+
+def get_percolated_document(index, record):
+    """
+    Returns the part of the record that is sent to the percolator.
+
+    Only the fields referenced by the ACLs stored for the index are kept, see AclAPI.get_percolated_fields.
+
+    :param index: name of the record index
+    :param record: Invenio record
+    """
+    fields = current_explicit_acls.get_percolated_fields(index)
+    if fields is None:
+        return dict(record)
+    return project_document(dict(record), fields)
+
+
+def make_percolate_query(index, models, **percolated):
+    """
+    Returns a query percolating ACLs of the given types.
+
+    :param index: name of the record index
+    :param models: ESACLMixin subclasses whose ACLs should be matched
+    :param percolated: document(s) to percolate, either document=... or documents=[...]
+    """
+    acl_types = [model.__mapper_args__['polymorphic_identity'] for model in models]
+    if len(acl_types) == 1:
+        type_query = {
+            "term": {
+                "__acl_record_type": acl_types[0]
+            }
+        }
+    else:
+        type_query = {
+            "terms": {
+                "__acl_record_type": acl_types
+            }
+        }
+    query = {
+        "query": {
+            "bool": {
+                "must": [
+                    {
+                        "percolate": {
+                            "field": "__acl_record_selector",
+                            **percolated
+                        }
+                    },
+                    type_query
+                ]
+            }
+        }
+    }
+    in_memory_acl_ids = set()
+    for model in models:
+        in_memory_acl_ids.update(model._get_in_memory_acl_ids(index))
+    if in_memory_acl_ids:
+        query['query']['bool']['must_not'] = [
+            {
+                "ids": {
+                    "values": sorted(in_memory_acl_ids)
+                }
+            }
+        ]
+    return query
+
+
+def get_es_records_acls(models, records: Iterable[Record], priority_floors=None) -> Dict[str, List[ACL]]:
+    """
+    Returns ACLs of the given ES-based types applicable for each of the given records.
+
+    ACLs of all the types live in the same percolator index, so records stored in the same index
+    are percolated just once for all the types. The hits are then split to the types by
+    their __acl_record_type and loaded from the database in a single query per type.
+
+    :param models: ESACLMixin subclasses
+    :param records: Invenio records
+    :param priority_floors: if set, dict of record id -> {priority group: priority} of the ACLs
+                            already known to be applicable to the record. Percolated ACLs with a lower priority
+                            in their group (or shadowed by another percolated ACL) are not loaded at all.
+    :return: dictionary of record id (string) -> list of ACLs
+    """
+    records = list(records)
+    ret = {str(record.id): [] for record in records}
+    if not models or not records:
+        return ret
+
+    for model in models:
+        in_memory_acl_ids = model._get_in_memory_records_acl_ids(records)
+        if in_memory_acl_ids:
+            for record_id, acls in load_records_acls(model, in_memory_acl_ids).items():
+                ret[record_id].extend(acls)
+
+    records_by_index = defaultdict(list)
+    for record in records:
+        records_by_index[current_record_to_index(record)[0]].append(record)
+
+    models_by_type = {model.__mapper_args__['polymorphic_identity']: model for model in models}
+    record_hits = defaultdict(list)
+    for index, index_records in records_by_index.items():
+        percolated_models = [model for model in models if model._needs_percolation(index)]
+        if not percolated_models:
+            continue
+        for record, hits in zip(index_records, percolate_records(index, percolated_models, index_records)):
+            record_hits[str(record.id)].extend(
+                (models_by_type[acl_type], acl_id, priority) for acl_type, acl_id, priority in hits
+            )
+
+    matched_record_ids = {model: defaultdict(list) for model in models}
+    for record_id, hits in record_hits.items():
+        if priority_floors is not None:
+            floors = get_priority_floors(ret[record_id], floors=priority_floors.get(record_id))
+            hits = prune_by_priority(hits, key=lambda hit: hit[2], floors=floors)
+        for model, acl_id, _priority in hits:
+            matched_record_ids[model][acl_id].append(record_id)
+
+    for model, model_matched_record_ids in matched_record_ids.items():
+        for acl in load_acls(model, model_matched_record_ids):
+            for record_id in model_matched_record_ids[acl.id]:
+                ret[record_id].append(acl)
+    return ret
+
+
+def percolate_records(index, models, records: List[Record]) -> List[List[tuple]]:
+    """
+    Percolates the records stored in the same index against ACLs of the given types.
+
+    Results are cached in AclAPI.percolation_cache under a hash of the percolated (projected) document
+    and the ACL generations, so records sharing the values of all fields referenced by ACL selectors
+    are percolated just once - both within the call and across calls.
+
+    :param index: name of the record index
+    :param models: ESACLMixin subclasses whose ACLs should be matched
+    :param records: Invenio records
+    :return: for each record a list of (acl type, acl id, priority) sorted by priority, highest first
+    """
+    documents = [get_percolated_document(index, record) for record in records]
+    keys = [current_explicit_acls.get_percolation_key(index, models, document) for document in documents]
+    cache = current_explicit_acls.percolation_cache
+
+    results = [None] * len(records)
+    # percolated document -> positions of records sharing it
+    percolated = {}
+    for position, key in enumerate(keys):
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                results[position] = cached
+                continue
+        percolated.setdefault(key if key is not None else position, []).append(position)
+
+    if percolated:
+        positions = list(percolated.values())
+        query = make_percolate_query(index, models, documents=[documents[x[0]] for x in positions])
+        slot_hits = [[] for _ in positions]
+        try:
+            for hit in ESACLMixin._percolate(
+                    index, query,
+                    docvalue_fields=['__acl_record_type', '__acl_priority', '__acl_priority_group'],
+                    sort=[{'__acl_priority': {'order': 'desc', 'unmapped_type': 'integer'}}, '_doc']):
+                fields = hit['fields']
+                matched = (fields['__acl_record_type'][0], hit['_id'], _get_hit_priority(fields))
+                for slot in fields['_percolator_document_slot']:
+                    slot_hits[slot].append(matched)
+        except elasticsearch.TransportError as e:
+            ESACLMixin._percolate_failed(e, index, query, records[0].get('$schema', ''))
+        for slot, slot_positions in enumerate(positions):
+            key = keys[slot_positions[0]]
+            if key is not None:
+                cache.set(key, slot_hits[slot])
+            for position in slot_positions:
+                results[position] = slot_hits[slot]
+    return results
+
+
+def _get_hit_priority(fields):
+    """Returns (priority, priority group) stored with a percolated ACL or None for ACLs indexed without them."""
+    if '__acl_priority' not in fields:
+        return None
+    return fields['__acl_priority'][0], fields.get('__acl_priority_group', [None])[0]
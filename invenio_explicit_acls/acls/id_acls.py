@@ -23,12 +23,14 @@
 # SOFTWARE.
 #
 """Models for storing Elasticsearch ACLs."""
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional, Set
 
 from invenio_db import db
 from invenio_records import Record
 
+from invenio_explicit_acls.matcher import load_acls, load_records_acls
 from invenio_explicit_acls.models import ACL
+from invenio_explicit_acls.proxies import current_explicit_acls
 
 
 class IdACL(ACL):
@@ -74,9 +76,36 @@ class IdACL(ACL):
 
         :param record: Invenio record
         """
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return load_acls(IdACL, matcher.get_id_acl_ids(record))
+
         id_ = str(record.model.id)  # bug in sqlalchemy - can not search with UUID value, need string here
         return IdACL.query.filter_by(record_id=id_)
 
+    @classmethod
+    def get_records_acls(clz, records: Iterable[Record]) -> Dict[str, List['ACL']]:
+        """
+        Returns ACL objects applicable for each of the given records.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> list of ACLs
+        """
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return load_records_acls(IdACL, {str(record.id): matcher.get_id_acl_ids(record) for record in records})
+
+        ret = {str(record.id): [] for record in records}
+        if ret:
+            for acl in IdACL.query.filter(IdACL.record_id.in_(list(ret))):
+                ret[acl.record_id].append(acl)
+        return ret
+
+    @classmethod
+    def get_record_dependencies(clz, index) -> Optional[Set[str]]:
+        """Id ACLs depend only on the id of the record that never changes."""
+        return set()
+
     @classmethod
     def prepare_schema_acls(self, schema):
         """
@@ -25,12 +25,25 @@
 """Simple ACL matching all records that have a metadata property equal to a given value."""
 import enum
 import logging
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Set
 
+from flask import current_app, has_app_context
 from invenio_accounts.models import User
 from invenio_db import db
+from invenio_indexer import current_record_to_index
+from invenio_records import Record
+from sqlalchemy.orm import object_session
 from sqlalchemy_utils import ChoiceType, Timestamp
 
+from invenio_explicit_acls.generation import PENDING_ACL_CHANGES
+from invenio_explicit_acls.matcher import CompiledPropertyValueACL, \
+    _get_field_types, compile_property_values, get_record_values, load_acls
 from invenio_explicit_acls.models import ACL, gen_uuid_key
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.utils import get_record_acl_enabled_schema, \
+    schema_to_index
 
 from .es_mixin import ESACLMixin
 
@@ -118,6 +131,9 @@ class PropertyValueACL(ESACLMixin, ACL):
     property_values = db.relationship("PropertyValue", back_populates="acl")
     """A set of actors for this ACL (who have rights to perform an operation this ACL references)"""
 
+    terms = db.relationship("PropertyValueTerm", cascade="all, delete-orphan")
+    """Rows of the inverted term index for this ACL, maintained automatically when the ACL is flushed"""
+
     @property
     def record_selector(self):
         """Returns an elasticsearch query matching resources that this ACL maps to."""
@@ -136,6 +152,288 @@ class PropertyValueACL(ESACLMixin, ACL):
             'bool': boolProps
         }
 
+    @classmethod
+    def get_record_acls(clz, record: Record) -> Iterable['ACL']:
+        """
+        Returns a list of ACL objects applicable for the given record.
+
+        ACLs consisting only of term conditions are matched in memory, the rest is percolated.
+
+        :param record: Invenio record
+        """
+        index = current_record_to_index(record)[0]
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            acl_ids = matcher.get_property_value_acl_ids(record)
+            needs_percolation = matcher.needs_percolation(index)
+        elif clz._use_term_index():
+            acl_ids = PropertyValueTerm.match_records([record])[str(record.id)]
+            needs_percolation = PropertyValueTerm.has_percolated_acls(index)
+        else:
+            yield from super().get_record_acls(record)
+            return
+
+        yield from load_acls(clz, acl_ids)
+        if needs_percolation:
+            yield from super().get_record_acls(record)
+
+    @classmethod
+    def _use_term_index(clz):
+        """Returns True if term-only ACLs are looked up in the database when the in-memory matcher is not used."""
+        return current_app.config['INVENIO_EXPLICIT_ACLS_PROPERTYVALUE_TERM_INDEX']
+
+    @classmethod
+    def _get_in_memory_records_acl_ids(clz, records: List[Record]) -> Dict[str, Iterable[str]]:
+        """Returns ids of term-only ACLs matched in memory (or via the term index) for each of the records."""
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return {str(record.id): matcher.get_property_value_acl_ids(record) for record in records}
+        if clz._use_term_index():
+            return PropertyValueTerm.match_records(records)
+        return {}
+
+    @classmethod
+    def _needs_percolation(clz, index):
+        """Returns True if there are ACLs on the given index that can not be matched in memory."""
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return matcher.needs_percolation(index)
+        if clz._use_term_index():
+            return PropertyValueTerm.has_percolated_acls(index)
+        return True
+
+    @classmethod
+    def _get_in_memory_acl_ids(clz, index):
+        """Returns ids of ACLs matched in memory on the given index so that they are not percolated."""
+        matcher = current_explicit_acls.acl_matcher
+        if matcher is not None:
+            return matcher.compiled_property_value_acls.get(index, set()) - \
+                matcher.percolated_property_value_acls.get(index, set())
+        if clz._use_term_index():
+            return PropertyValueTerm.get_indexed_acl_ids(index)
+        return ()
+
+    def get_terms(self) -> List['PropertyValueTerm']:
+        """
+        Compiles the property values of this ACL into rows of the inverted term index.
+
+        For each schema, the ACL is either indexed by all its terms or, if it can not be matched
+        from the index (match operations, unsupported fields or no positive term), represented
+        by a single row with the percolate operation.
+        """
+        session = object_session(self)
+        deleted = session.deleted if session is not None else ()
+        property_values = [x for x in self.property_values if x not in deleted]
+        ret = []
+        for schema in self.schemas or ():
+            try:
+                field_types = _get_field_types(schema_to_index(schema)[0])
+            except Exception:
+                logger.exception('Could not get mapping for schema %s, ACL %s will be percolated', schema, self)
+                field_types = {}
+            compiled_terms = compile_property_values(property_values, field_types)
+            if compiled_terms is None or not (compiled_terms[0] or compiled_terms[2]):
+                ret.append(PropertyValueTerm(schema=schema, operation=PropertyValueTerm.PERCOLATE))
+                continue
+            must, must_not, should, properties = compiled_terms
+            for operation, terms in (('must', must), ('must_not', must_not), ('should', should)):
+                for name, value in terms:
+                    field_type, path = properties[name]
+                    ret.append(PropertyValueTerm(schema=schema, name=name, value=_term_value(value),
+                                                 field_type=field_type, path=path, operation=operation))
+        return ret
+
+    def update_terms(self):
+        """Brings rows of the inverted term index in sync with the property values of this ACL."""
+        terms = self.get_terms()
+        if {x.key for x in terms} != {x.key for x in self.terms}:
+            self.terms = terms
+
     def __repr__(self):
         """String representation for model."""
         return '"{0.name}" ({0.id}) on schemas {0.schemas}'.format(self)
+
+
+class PropertyValueTerm(db.Model):
+    """
+    Inverted index of term-only PropertyValueACLs: (schema, property name, normalized value) -> ACL.
+
+    The rows are maintained automatically whenever a PropertyValueACL or its property values are flushed.
+    They are used to resolve record ACLs with a handful of indexed lookups when the in-memory matcher
+    is disabled or can not be used (for example, inside a transaction with uncommitted ACL changes).
+    """
+
+    __tablename__ = 'explicit_acls_propertyvalue_term'
+    __table_args__ = (
+        db.Index('ix_explicit_acls_propertyvalue_term_lookup', 'schema', 'name', 'value'),
+    )
+
+    PERCOLATE = 'percolate'
+    """Operation of the row that marks an ACL that must be percolated on the schema."""
+
+    id = db.Column(
+        db.String(36),
+        default=gen_uuid_key,
+        primary_key=True
+    )
+    """Primary key."""
+
+    acl_id = db.Column(db.ForeignKey('explicit_acls_propertyvalueacl.id',
+                                     name='fk_explicit_acls_propertyvalue_term_acl_id',
+                                     ondelete='CASCADE'),
+                       nullable=False, index=True)
+
+    schema = db.Column(db.String(255), nullable=False)
+    """Schema of records the term applies to. Kept short enough for the lookup index to fit MySQL key length."""
+
+    name = db.Column(db.String(64))
+    """Name of the property in elasticsearch."""
+
+    value = db.Column(db.String(128))
+    """Value of the property normalized to the type of the field in elasticsearch."""
+
+    field_type = db.Column(db.String(32))
+    """Type of the field in elasticsearch mapping."""
+
+    path = db.Column(db.String(64))
+    """Dotted path of the value in record metadata."""
+
+    operation = db.Column(db.String(10), nullable=False)
+    """One of must, must_not, should or percolate."""
+
+    @property
+    def key(self):
+        """Returns a tuple identifying the content of the row."""
+        return self.schema, self.name, self.value, self.field_type, self.path, self.operation
+
+    @classmethod
+    def match_records(cls, records: Iterable[Record]) -> Dict[str, List[str]]:
+        """
+        Returns ids of indexed ACLs matching the records.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> ACL ids
+        """
+        ret = {}
+        records_by_schema = defaultdict(list)
+        for record in records:
+            ret[str(record.id)] = []
+            schema = get_record_acl_enabled_schema(record)
+            if schema:
+                records_by_schema[schema].append(record)
+        if not records_by_schema:
+            return ret
+
+        properties = defaultdict(dict)
+        for schema, name, field_type, path in db.session.query(
+                cls.schema, cls.name, cls.field_type, cls.path).filter(
+                cls.schema.in_(list(records_by_schema)), cls.operation != cls.PERCOLATE).distinct():
+            properties[schema][name] = (field_type, path)
+
+        for schema, schema_properties in properties.items():
+            record_values = {}
+            terms = defaultdict(set)
+            for record in records_by_schema[schema]:
+                values = {
+                    name: {_term_value(x) for x in name_values}
+                    for name, name_values in get_record_values(record, schema_properties).items()
+                }
+                record_values[str(record.id)] = values
+                for name, name_values in values.items():
+                    terms[name].update(name_values)
+            if not terms:
+                continue
+
+            # candidate ACLs are those having a positive term present in at least one of the records
+            candidates = db.select([cls.acl_id]).where(db.and_(
+                cls.schema == schema,
+                cls.operation.in_(('must', 'should')),
+                db.or_(*[db.and_(cls.name == name, cls.value.in_(sorted(values)))
+                         for name, values in terms.items()])
+            ))
+            compiled_terms = defaultdict(lambda: defaultdict(list))
+            for acl_id, name, value, operation in db.session.query(
+                    cls.acl_id, cls.name, cls.value, cls.operation).filter(
+                    cls.schema == schema, cls.acl_id.in_(candidates)):
+                compiled_terms[acl_id][operation].append((name, value))
+            compiled = [
+                CompiledPropertyValueACL(acl_id, x['must'], x['must_not'], x['should'])
+                for acl_id, x in compiled_terms.items()
+            ]
+            for record_id, values in record_values.items():
+                ret[record_id] = [x.id for x in compiled if x.matches(values)]
+        return ret
+
+    @classmethod
+    def _get_index_schemas(cls, index) -> List[str]:
+        ret = []
+        for (schema,) in db.session.query(cls.schema).distinct():
+            try:
+                if schema_to_index(schema)[0] == index:
+                    ret.append(schema)
+            except AttributeError:
+                pass
+        return ret
+
+    @classmethod
+    def has_percolated_acls(cls, index) -> bool:
+        """Returns True if there are PropertyValueACLs that must be percolated on the given (record) index."""
+        return cls._get_index_acl_ids(index)[1]
+
+    @classmethod
+    def get_indexed_acl_ids(cls, index) -> Set[str]:
+        """Returns ids of PropertyValueACLs that are matched from the index on the given (record) index."""
+        return cls._get_index_acl_ids(index)[0]
+
+    @classmethod
+    def _get_index_acl_ids(cls, index):
+        """
+        Returns a tuple (ids of indexed ACLs, True if some ACLs are percolated) for the given (record) index.
+
+        The result is cached until ACL generation changes, unless the session contains uncommitted ACL changes.
+        """
+        if db.session.info.get(PENDING_ACL_CHANGES):
+            return cls._load_index_acl_ids(index)
+        index_acl_ids = current_explicit_acls._generation_cached('propertyvalue_term_index', dict)
+        if index not in index_acl_ids:
+            index_acl_ids[index] = cls._load_index_acl_ids(index)
+        return index_acl_ids[index]
+
+    @classmethod
+    def _load_index_acl_ids(cls, index):
+        schemas = cls._get_index_schemas(index)
+        if not schemas:
+            return frozenset(), False
+        indexed = set()
+        percolated = set()
+        for acl_id, operation in db.session.query(cls.acl_id, cls.operation).filter(
+                cls.schema.in_(schemas)).distinct():
+            (percolated if operation == cls.PERCOLATE else indexed).add(acl_id)
+        return frozenset(indexed - percolated), bool(percolated)
+
+
+def _term_value(value):
+    """Serializes a normalized value (see matcher._normalize_value) for the term index."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return repr(value)
+    return value
+
+
+def update_property_value_terms(session, flush_context, instances):
+    """SQLAlchemy before_flush listener keeping PropertyValueTerm rows in sync with the flushed ACLs."""
+    if not has_app_context() or 'invenio-explicit-acls' not in current_app.extensions:
+        return
+    acls = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, PropertyValue):
+            obj = obj.acl
+        if isinstance(obj, PropertyValueACL) and obj not in session.deleted:
+            acls.add(obj)
+    for acl in acls:
+        acl.update_terms()
+
+
+__all__ = ('MatchOperation', 'BoolOperation', 'PropertyValue', 'PropertyValueACL', 'PropertyValueTerm',
+           'update_property_value_terms')
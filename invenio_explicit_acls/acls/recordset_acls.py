@@ -0,0 +1,169 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# recordset_acls.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""ACL granting access to an explicitly enumerated set of records."""
+from typing import Dict, Iterable, List, Optional, Set
+
+from flask import current_app
+from invenio_db import db
+from invenio_records import Record
+
+from invenio_explicit_acls.generation import PENDING_ACL_CHANGES
+from invenio_explicit_acls.models import ACL
+from invenio_explicit_acls.utils import chunked
+
+
+class RecordSetACLRecord(db.Model):
+    """Membership of a record in the set of records of a RecordSetACL."""
+
+    __tablename__ = 'explicit_acls_recordsetacl_record'
+
+    acl_id = db.Column(db.ForeignKey('explicit_acls_recordsetacl.id', ondelete='CASCADE',
+                                     name='fk_explicit_acls_recordsetacl_record_acl_id'),
+                       primary_key=True)
+    """Id of the RecordSetACL."""
+
+    record_id = db.Column(db.String(36), primary_key=True, index=True)
+    """Id of the record the ACL applies to. Indexed, so that ACLs of a record are found by a single index lookup."""
+
+
+class RecordSetACL(ACL):
+    """An ACL that applies to an explicit set of records, regardless of their metadata."""
+
+    __tablename__ = 'explicit_acls_recordsetacl'
+    __mapper_args__ = {
+        'polymorphic_identity': 'recordset',
+    }
+
+    #
+    # Fields
+    #
+    id = db.Column(db.String(36), db.ForeignKey('explicit_acls_acl.id'), primary_key=True)
+    """Id maps to base class' id"""
+
+    records = db.relationship(RecordSetACLRecord, lazy='dynamic', cascade='all, delete-orphan')
+    """Memberships of records in this ACL, loaded on demand as the set might be large."""
+
+    def __repr__(self):
+        """String representation for model."""
+        return '"{0.name}" ({0.id}) on schemas {0.schemas}'.format(self)
+
+    @property
+    def record_ids(self) -> Iterable[str]:
+        """Streams ids of the records in the set."""
+        for (record_id,) in db.session.query(RecordSetACLRecord.record_id).filter(
+                RecordSetACLRecord.acl_id == self.id).yield_per(
+                current_app.config['INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE']):
+            yield record_id
+
+    def add_records(self, record_ids: Iterable[str]):
+        """
+        Adds records to the set. Records already in the set are skipped.
+
+        The ACL is flushed to the database if it has not been yet, reindex the ACL after the change is committed.
+
+        :param record_ids: ids of the records
+        """
+        if self.id is None:
+            db.session.add(self)
+            db.session.flush()
+        for chunk in chunked({str(x) for x in record_ids}, current_app.config['INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE']):
+            existing = {x for (x,) in db.session.query(RecordSetACLRecord.record_id).filter(
+                RecordSetACLRecord.acl_id == self.id, RecordSetACLRecord.record_id.in_(chunk))}
+            new = [{'acl_id': self.id, 'record_id': x} for x in chunk if x not in existing]
+            if new:
+                db.session.execute(RecordSetACLRecord.__table__.insert(), new)
+                # core statements are not seen by the ORM flush listeners
+                db.session.info[PENDING_ACL_CHANGES] = True
+
+    def remove_records(self, record_ids: Iterable[str]):
+        """
+        Removes records from the set.
+
+        :param record_ids: ids of the records
+        """
+        for chunk in chunked({str(x) for x in record_ids}, current_app.config['INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE']):
+            db.session.execute(RecordSetACLRecord.__table__.delete().where(db.and_(
+                RecordSetACLRecord.acl_id == self.id, RecordSetACLRecord.record_id.in_(chunk))))
+            db.session.info[PENDING_ACL_CHANGES] = True
+
+    @classmethod
+    def get_record_acls(clz, record: Record) -> Iterable['ACL']:
+        """
+        Returns a list of ACL objects applicable for the given record.
+
+        :param record: Invenio record
+        """
+        return clz.query.join(RecordSetACLRecord).filter(RecordSetACLRecord.record_id == str(record.id))
+
+    @classmethod
+    def get_records_acls(clz, records: Iterable[Record]) -> Dict[str, List['ACL']]:
+        """
+        Returns ACL objects applicable for each of the given records, in a single query.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> list of ACLs
+        """
+        ret = {str(record.id): [] for record in records}
+        if ret:
+            for record_id, acl in db.session.query(RecordSetACLRecord.record_id, clz).join(
+                    clz, clz.id == RecordSetACLRecord.acl_id).filter(RecordSetACLRecord.record_id.in_(list(ret))):
+                ret[record_id].append(acl)
+        return ret
+
+    @classmethod
+    def get_record_dependencies(clz, index) -> Optional[Set[str]]:
+        """Record set ACLs depend only on the id of the record that never changes."""
+        return set()
+
+    @classmethod
+    def prepare_schema_acls(self, schema):
+        """
+        Prepare ACLs for the given index.
+
+        :param schema: schema for which to prepare the ACLs
+        """
+        # no need to prepare any index
+        pass
+
+    def get_matching_resources(self) -> Iterable[str]:
+        """
+        Get resources that match the ACL.
+
+        :return:   iterable of resource ids, streamed from the database
+        """
+        return self.record_ids
+
+    def update(self):
+        """Update any internal representation / index for the acl."""
+        # no need to update any index
+        pass
+
+    def delete(self):
+        """Delete acl from any internal representation / index for the acl."""
+        # no need to update any index
+        pass
+
+
+__all__ = ('RecordSetACL', 'RecordSetACLRecord')
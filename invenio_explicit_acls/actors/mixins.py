@@ -23,12 +23,16 @@
 # SOFTWARE.
 #
 """A modul that defines user actor."""
-from typing import Dict, Union
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, \
+    Union
 
 from elasticsearch_dsl import Q
 from elasticsearch_dsl.query import Term
 from flask_security import AnonymousUser
-from invenio_accounts.models import User
+from invenio_accounts.models import User, userrole
+from invenio_db import db
+from sqlalchemy import event, inspect
 
 
 class UserMixin:
@@ -71,6 +75,32 @@ class UserMixin:
         else:
             return None
 
+    @classmethod
+    def get_principal_tokens(clz, representation) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens (``u:<user id>``) of the elasticsearch representation.
+
+        :param representation: list of user ids
+        """
+        return ['u:%s' % x for x in representation or ()]
+
+    @classmethod
+    def get_query_principal_tokens(clz, user: Union[User, AnonymousUser], context: Dict) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens of the user, see get_principal_tokens.
+
+        :param user:  the user to be checked
+        :param context:  any extra context carrying information about the user
+        """
+        if user.is_authenticated:
+            return ['u:%s' % user.id]
+        return []
+
+    @classmethod
+    def get_user_cache_key(clz, user: Union[User, AnonymousUser], context: Dict) -> Optional[Hashable]:
+        """The query depends only on the user id that is already part of the search filter key."""
+        return ()
+
 
 class RoleMixin:
     """An actor mixin for matching a set of roles."""
@@ -110,3 +140,100 @@ class RoleMixin:
         if user.is_authenticated:
             return Q('terms', _invenio_explicit_acls__role=[x.id for x in user.roles])
         return None
+
+    @classmethod
+    def get_principal_tokens(clz, representation) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens (``r:<role id>``) of the elasticsearch representation.
+
+        :param representation: list of role ids
+        """
+        return ['r:%s' % x for x in representation or ()]
+
+    @classmethod
+    def get_query_principal_tokens(clz, user: User, context: Dict) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens of the user, see get_principal_tokens.
+
+        :param user:  the user to be checked
+        :param context:  any extra context carrying information about the user
+        """
+        if user.is_authenticated:
+            return ['r:%s' % x.id for x in user.roles]
+        return []
+
+    @classmethod
+    def get_user_cache_key(clz, user: User, context: Dict) -> Optional[Hashable]:
+        """Roles of the user are represented by the role membership generation in the search filter key."""
+        return ()
+
+
+def get_role_user_ids(role_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """
+    Returns ids of users holding each of the roles, in a single query over the roles-users association table.
+
+    :param role_ids: ids of invenio roles
+    :return: dictionary of role id -> set of user ids, roles without users are left out
+    """
+    role_ids = set(role_ids)
+    ret = defaultdict(set)
+    if role_ids:
+        for role_id, user_id in db.session.query(userrole.c.role_id, userrole.c.user_id).filter(
+                userrole.c.role_id.in_(role_ids)):
+            ret[role_id].add(user_id)
+    return ret
+
+
+class MemberIdsMixin:
+    """
+    Id-only access to members (users, roles) of an actor stored in an association table.
+
+    Subclasses set the name of the relationship with member ORM objects, the association table and
+    the name of its column with member ids. The ids are read directly from the association table,
+    the ORM objects are loaded only when the relationship is accessed (for example in the admin UI).
+    """
+
+    _member_relationship = None
+    """Name of the relationship with member ORM objects."""
+
+    _member_table = None
+    """Association table between actors and members."""
+
+    _member_column = None
+    """Name of the column of the association table containing member ids."""
+
+    @property
+    def member_ids(self) -> List[int]:
+        """Returns sorted ids of members of this actor."""
+        if self._member_relationship not in inspect(self).unloaded or self.id is None:
+            # in-session changes of the relationship are taken into account
+            return sorted(x.id for x in getattr(self, self._member_relationship))
+        if '_member_ids' not in self.__dict__:
+            type(self).preload([self])
+        return self.__dict__['_member_ids']
+
+    @classmethod
+    def preload(clz, actors):
+        """Loads member ids of all the actors in a single query."""
+        actors = [x for x in actors if x.id is not None and '_member_ids' not in x.__dict__]
+        if not actors:
+            return
+        actor_column = clz._member_table.c.actor_id
+        member_column = clz._member_table.c[clz._member_column]
+        member_ids = defaultdict(list)
+        for actor_id, member_id in db.session.query(actor_column, member_column).filter(
+                actor_column.in_([x.id for x in actors])).order_by(member_column):
+            member_ids[actor_id].append(member_id)
+        for actor in actors:
+            actor.__dict__['_member_ids'] = member_ids.get(actor.id, [])
+
+    @classmethod
+    def register_member_ids_listeners(clz):
+        """Drops the loaded member ids whenever the actor is expired or refreshed."""
+        for name in ('expire', 'refresh'):
+            if not event.contains(clz, name, _clear_member_ids):
+                event.listen(clz, name, _clear_member_ids)
+
+
+def _clear_member_ids(target, *args):
+    target.__dict__.pop('_member_ids', None)
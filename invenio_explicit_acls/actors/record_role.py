@@ -23,15 +23,17 @@
 # SOFTWARE.
 #
 """Actor matching invenio roles."""
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from elasticsearch_dsl import Q
-from invenio_accounts.models import Role, User
+from invenio_accounts.models import User
 from invenio_db import db
 from invenio_records import Record
 from jsonpointer import resolve_pointer
 
-from invenio_explicit_acls.actors.mixins import RoleMixin
+from invenio_explicit_acls.actors.mixins import RoleMixin, \
+    get_role_user_ids
+from invenio_explicit_acls.utils import json_pointer_to_path
 
 from ..models import Actor
 
@@ -74,6 +76,18 @@ class RecordRoleActor(RoleMixin, Actor):
             ret = [ret]
         return ret
 
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """Returns record fields referenced by paths of all actors of this type."""
+        ret = set()
+        for (path,) in db.session.query(clz.path).distinct():
+            path = json_pointer_to_path(path)
+            if not path:
+                # the whole record
+                return None
+            ret.add(path)
+        return ret
+
     def user_matches(self, user: User, context: Dict, record: Record = None) -> bool:
         """
         Checks if a user is allowed to perform any operation according to the ACL.
@@ -97,13 +111,27 @@ class RecordRoleActor(RoleMixin, Actor):
 
         :return: Iterable of a user ids
         """
-        if record is None:
-            return []
+        return self.resolve_matching_user_ids([(self, record)])[0]
 
-        ret = set()
-        role_ids = self._get_role_ids(record)
+    @classmethod
+    def resolve_matching_user_ids(clz, actor_records: List[Tuple['RecordRoleActor', Optional[Record]]]) \
+            -> List[Set[int]]:
+        """
+        Returns ids of users matching many actors/records at once.
 
-        for r in Role.query.filter(Role.id.in_(role_ids)):
-            for u in r.users:
-                ret.add(u.id)
+        Role ids of all the records are resolved to users with a single query.
+
+        :param actor_records: list of (actor, record the actor is evaluated on)
+        :return: list of sets of user ids, in the order of actor_records
+        """
+        role_ids = [actor._get_role_ids(record) if record is not None else [] for actor, record in actor_records]
+        role_users = get_role_user_ids(x for ids in role_ids for x in ids)
+        # role ids in record metadata might be strings
+        role_users = {str(k): v for k, v in role_users.items()}
+        ret = []
+        for ids in role_ids:
+            user_ids = set()
+            for role_id in ids:
+                user_ids.update(role_users.get(str(role_id), ()))
+            ret.append(user_ids)
         return ret
@@ -23,7 +23,7 @@
 # SOFTWARE.
 #
 """A modul that defines user actor. The user is a property of the indexed record."""
-from typing import Dict, Iterable, Union
+from typing import Dict, Iterable, Optional, Set, Union
 
 from flask_security import AnonymousUser
 from invenio_accounts.models import User
@@ -32,6 +32,7 @@ from invenio_records import Record
 from jsonpointer import resolve_pointer
 
 from invenio_explicit_acls.actors.mixins import UserMixin
+from invenio_explicit_acls.utils import json_pointer_to_path
 
 from ..models import Actor
 
@@ -74,6 +75,18 @@ class RecordUserActor(UserMixin, Actor):
             ret = [ret]
         return ret
 
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """Returns record fields referenced by paths of all actors of this type."""
+        ret = set()
+        for (path,) in db.session.query(clz.path).distinct():
+            path = json_pointer_to_path(path)
+            if not path:
+                # the whole record
+                return None
+            ret.add(path)
+        return ret
+
     def user_matches(self, user: Union[User, AnonymousUser], context: Dict, record: Record = None) -> bool:
         """
         Checks if a user is allowed to perform any operation according to the ACL.
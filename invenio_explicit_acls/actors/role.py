@@ -23,14 +23,16 @@
 # SOFTWARE.
 #
 """Actor matching invenio roles."""
-from typing import Dict, Iterable
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from elasticsearch_dsl import Q
-from invenio_accounts.models import Role, User
+from flask import current_app
+from invenio_accounts.models import Role, User, userrole
 from invenio_db import db
 from invenio_records import Record
 
-from invenio_explicit_acls.actors.mixins import RoleMixin
+from invenio_explicit_acls.actors.mixins import MemberIdsMixin, RoleMixin
 
 from ..models import Actor
 
@@ -42,7 +44,7 @@ roles_actors = db.Table('explicit_acls_roles_roleactors',
                         )
 
 
-class RoleActor(RoleMixin, Actor):
+class RoleActor(MemberIdsMixin, RoleMixin, Actor):
     """An actor matching set of invenio roles."""
 
     __tablename__ = 'explicit_acls_roleactor'
@@ -53,8 +55,18 @@ class RoleActor(RoleMixin, Actor):
     id = db.Column(db.String(36), db.ForeignKey('explicit_acls_actor.id'), primary_key=True)
     """Id maps to base class' id"""
 
-    roles = db.relationship(Role, secondary=roles_actors, lazy='subquery',
+    roles = db.relationship(Role, secondary=roles_actors, lazy=True,
                             backref=db.backref('actors', lazy=True))
+    """Roles of the actor. Serialization and matching use just their ids, see role_ids."""
+
+    _member_relationship = 'roles'
+    _member_table = roles_actors
+    _member_column = 'role_id'
+
+    @property
+    def role_ids(self) -> List[int]:
+        """Returns sorted ids of roles of this actor without loading the Role objects."""
+        return self.member_ids
 
     def __str__(self):
         """Returns the string representation of the actor."""
@@ -68,7 +80,12 @@ class RoleActor(RoleMixin, Actor):
                         The implementation should merge it with its own ES representation
         :return: The elasticsearch representation of the property on Record
         """
-        return list(set([x.id for x in self.roles] + (others or [])))
+        return list(set(self.role_ids + (others or [])))
+
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """The representation does not depend on the record."""
+        return set()
 
     def user_matches(self, user: User, context: Dict, record: Record = None) -> bool:
         """
@@ -77,7 +94,7 @@ class RoleActor(RoleMixin, Actor):
         :param user: user being checked against the ACL
         :param context:  any extra context carrying information about the user
         """
-        role_ids = set(x.id for x in self.roles)
+        role_ids = set(self.role_ids)
         for role in user.roles:
             if role.id in role_ids:
                 return True
@@ -89,8 +106,43 @@ class RoleActor(RoleMixin, Actor):
 
         :return: Iterable of a user ids
         """
-        ret = set()
-        for r in self.roles:
-            for u in r.users:
-                ret.add(u.id)
-        return ret
+        return set(self.iter_matching_user_ids(record))
+
+    def _get_matching_users_query(self):
+        return db.session.query(userrole.c.user_id).join(
+            roles_actors, roles_actors.c.role_id == userrole.c.role_id).filter(
+            roles_actors.c.actor_id == self.id).distinct()
+
+    def iter_matching_user_ids(self, record: Record = None) -> Iterable[int]:
+        """
+        Streams ids of users holding any of the roles of this Actor, resolved by a single join.
+
+        :return: Iterable of user ids
+        """
+        query = self._get_matching_users_query().order_by(userrole.c.user_id)
+        for (user_id,) in query.yield_per(current_app.config['INVENIO_EXPLICIT_ACLS_USER_ID_CHUNK_SIZE']):
+            yield user_id
+
+    def count_matching_users(self, record: Record = None) -> int:
+        """Returns the number of users matching this Actor."""
+        return self._get_matching_users_query().count()
+
+    @classmethod
+    def resolve_matching_user_ids(clz, actor_records: List[Tuple['RoleActor', Optional[Record]]]) -> List[Set[int]]:
+        """
+        Returns ids of users matching many actors at once, with a single join over the association tables.
+
+        :param actor_records: list of (actor, record the actor is evaluated on)
+        :return: list of sets of user ids, in the order of actor_records
+        """
+        actor_ids = {actor.id for actor, _record in actor_records}
+        user_ids = defaultdict(set)
+        if actor_ids:
+            for actor_id, user_id in db.session.query(roles_actors.c.actor_id, userrole.c.user_id).join(
+                    userrole, roles_actors.c.role_id == userrole.c.role_id).filter(
+                    roles_actors.c.actor_id.in_(actor_ids)):
+                user_ids[actor_id].add(user_id)
+        return [set(user_ids.get(actor.id, ())) for actor, _record in actor_records]
+
+
+RoleActor.register_member_ids_listeners()
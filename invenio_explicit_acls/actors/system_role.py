@@ -24,10 +24,10 @@
 #
 """A modul that defines anonymous actor."""
 import logging
-from typing import Dict, Iterable
+from typing import Dict, Hashable, Iterable, Optional, Set
 
 from elasticsearch_dsl import Q
-from flask import g
+from flask import current_app, g
 from invenio_accounts.models import User
 from invenio_db import db
 from invenio_records import Record
@@ -85,6 +85,11 @@ class SystemRoleActor(Actor):
         """
         return [self.system_role] + (another or [])
 
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """The representation does not depend on the record."""
+        return set()
+
     @classmethod
     def get_elasticsearch_query(clz, user: User, context: Dict) -> Q or None:
         """
@@ -108,6 +113,32 @@ class SystemRoleActor(Actor):
 
         return Q('terms', _invenio_explicit_acls__system_role=roles)
 
+    @classmethod
+    def get_principal_tokens(clz, representation) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens (``s:<system role>``) of the elasticsearch representation.
+
+        :param representation: list of system roles
+        """
+        return ['s:%s' % x for x in representation or ()]
+
+    @classmethod
+    def get_query_principal_tokens(clz, user: User, context: Dict) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens of the user, see get_principal_tokens and get_elasticsearch_query.
+
+        :param user:  the user to be checked
+        :param context:  any extra context carrying information about the user.
+        """
+        if user.is_anonymous:
+            return ['s:any_user']
+        return ['s:%s' % x for x in clz._get_system_roles(context, user)]
+
+    @classmethod
+    def get_user_cache_key(clz, user: User, context: Dict) -> Optional[Hashable]:
+        """System roles of the user are already part of the search filter key."""
+        return ()
+
     @classmethod
     def _get_system_roles(cls, context, user):
         if 'system_roles' in context:
@@ -156,9 +187,30 @@ class SystemRoleActor(Actor):
 
         :return: Iterable of a user ids
         """
+        yield from self.iter_matching_user_ids(record)
+
+    def get_audience_system_role(self) -> Optional[str]:
+        """System roles are kept symbolic in record audience, users are not enumerated."""
+        return self.system_role
+
+    def _get_matching_users_query(self):
         if self.system_role == 'any_user' or self.system_role == 'authenticated_user':
-            for u in User.query.all():
-                yield u.id
-        else:
-            raise NotImplementedError(
-                'Can not get a list of matching users for system role %s - not implemented' % self.system_role)
+            return db.session.query(User.id)
+        raise NotImplementedError(
+            'Can not get a list of matching users for system role %s - not implemented' % self.system_role)
+
+    def iter_matching_user_ids(self, record: Record = None) -> Iterable[int]:
+        """
+        Streams ids of users matching this Actor.
+
+        Only the primary keys are fetched, with a server-side cursor where the database supports it.
+
+        :return: Iterable of user ids
+        """
+        query = self._get_matching_users_query().order_by(User.id)
+        for (user_id,) in query.yield_per(current_app.config['INVENIO_EXPLICIT_ACLS_USER_ID_CHUNK_SIZE']):
+            yield user_id
+
+    def count_matching_users(self, record: Record = None) -> int:
+        """Returns the number of users matching this Actor."""
+        return self._get_matching_users_query().count()
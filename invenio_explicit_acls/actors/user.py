@@ -23,14 +23,14 @@
 # SOFTWARE.
 #
 """A modul that defines user actor."""
-from typing import Dict, Iterable, Union
+from typing import Dict, Iterable, List, Optional, Set, Union
 
 from flask_security import AnonymousUser
 from invenio_accounts.models import User
 from invenio_db import db
 from invenio_records import Record
 
-from invenio_explicit_acls.actors.mixins import UserMixin
+from invenio_explicit_acls.actors.mixins import MemberIdsMixin, UserMixin
 
 from ..models import Actor
 
@@ -42,7 +42,7 @@ users_actors = db.Table('explicit_acls_users_useractors',
                         )
 
 
-class UserActor(UserMixin, Actor):
+class UserActor(MemberIdsMixin, UserMixin, Actor):
     """An actor matching a set of users identified by ID."""
 
     __tablename__ = 'explicit_acls_useractor'
@@ -53,8 +53,18 @@ class UserActor(UserMixin, Actor):
     id = db.Column(db.String(36), db.ForeignKey('explicit_acls_actor.id'), primary_key=True)
     """Id maps to base class' id"""
 
-    users = db.relationship(User, secondary=users_actors, lazy='subquery',
+    users = db.relationship(User, secondary=users_actors, lazy=True,
                             backref=db.backref('actors', lazy=True))
+    """Users of the actor. Serialization and matching use just their ids, see user_ids."""
+
+    _member_relationship = 'users'
+    _member_table = users_actors
+    _member_column = 'user_id'
+
+    @property
+    def user_ids(self) -> List[int]:
+        """Returns sorted ids of users of this actor without loading the User objects."""
+        return self.member_ids
 
     def __str__(self):
         """Returns the string representation of the actor."""
@@ -68,7 +78,12 @@ class UserActor(UserMixin, Actor):
                         The implementation should merge it with its own ES representation
         :return: The elasticsearch representation of the property on Record
         """
-        return list(set([x.id for x in self.users] + (another or [])))
+        return list(set(self.user_ids + (another or [])))
+
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """The representation does not depend on the record."""
+        return set()
 
     def user_matches(self, user: Union[User, AnonymousUser], context: Dict, record: Record = None) -> bool:
         """
@@ -79,10 +94,7 @@ class UserActor(UserMixin, Actor):
         """
         if user.is_anonymous:
             return False
-        for x in self.users:
-            if x == user:
-                return True
-        return False
+        return user.id in self.user_ids
 
     def get_matching_users(self, record: Record = None) -> Iterable[int]:
         """
@@ -90,4 +102,7 @@ class UserActor(UserMixin, Actor):
 
         :return: Iterable of a user ids
         """
-        return [x.id for x in self.users]
+        return list(self.user_ids)
+
+
+UserActor.register_member_ids_listeners()
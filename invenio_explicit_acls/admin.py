@@ -27,6 +27,8 @@ from __future__ import absolute_import, print_function
 
 import traceback
 
+from flask import flash
+from flask_admin.actions import action
 from flask_admin.contrib import sqla
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.form import Select2Widget
@@ -46,6 +48,7 @@ from invenio_explicit_acls.acls.propertyvalue_acls import BoolOperation, \
 from invenio_explicit_acls.actors import RecordRoleActor, RecordUserActor, \
     RoleActor, SystemRoleActor, UserActor
 from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.selectors import check_selector_cost
 
 
 def _(x):
@@ -107,6 +110,16 @@ class ACLModelViewMixin(FieldValidatorMixin, OriginatorMixin):
         """Called when ACL has been deleted."""
         current_explicit_acls.reindex_acl_remove(model)
 
+    @action('reindex', _('Reindex'), _('Are you sure you want to reindex the selected ACLs and their records?'))
+    def action_reindex(self, ids):
+        """Updates the selected ACLs in bulk and reindexes the records they apply to."""
+        try:
+            current_explicit_acls.reindex_acls(self.get_query().filter(self.model.id.in_(ids)).all())
+            flash(_('The selected ACLs have been scheduled for reindexing.'), 'success')
+        except Exception as e:
+            traceback.print_exc()
+            flash(_('Failed to reindex the selected ACLs: %s') % e, 'error')
+
 
 class ElasticsearchACLModelView(ACLModelViewMixin, ModelView):
     """ModelView for the elasticsearch ACLs."""
@@ -154,6 +167,12 @@ class ElasticsearchACLModelView(ACLModelViewMixin, ModelView):
                 )
         except Exception as e:
             raise StopValidation(str(e))
+        try:
+            warning = check_selector_cost(record_selector)
+        except ValueError as e:
+            raise StopValidation(str(e))
+        if warning:
+            flash(warning, 'warning')
 
 
 #
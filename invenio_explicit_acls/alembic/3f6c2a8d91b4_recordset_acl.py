@@ -0,0 +1,40 @@
+#
+# This file is part of Invenio.
+# Copyright (C) 2016-2018 CERN.
+#
+# Invenio is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""RecordSetACL."""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a8d91b4'
+down_revision = '854a5351f76f'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_table('explicit_acls_recordsetacl',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.ForeignKeyConstraint(['id'], ['explicit_acls_acl.id'], name=op.f('fk_explicit_acls_recordsetacl_id_explicit_acls_acl')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_explicit_acls_recordsetacl'))
+    )
+    op.create_table('explicit_acls_recordsetacl_record',
+    sa.Column('acl_id', sa.String(length=36), nullable=False),
+    sa.Column('record_id', sa.String(length=36), nullable=False),
+    sa.ForeignKeyConstraint(['acl_id'], ['explicit_acls_recordsetacl.id'], name='fk_explicit_acls_recordsetacl_record_acl_id', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('acl_id', 'record_id', name=op.f('pk_explicit_acls_recordsetacl_record'))
+    )
+    op.create_index(op.f('ix_explicit_acls_recordsetacl_record_record_id'), 'explicit_acls_recordsetacl_record', ['record_id'], unique=False)
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index(op.f('ix_explicit_acls_recordsetacl_record_record_id'), table_name='explicit_acls_recordsetacl_record')
+    op.drop_table('explicit_acls_recordsetacl_record')
+    op.drop_table('explicit_acls_recordsetacl')
@@ -0,0 +1,58 @@
+#
+# This file is part of Invenio.
+# Copyright (C) 2016-2018 CERN.
+#
+# Invenio is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""PropertyValueACL term index."""
+
+import json
+import uuid
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d2c1a9f0'
+down_revision = '3f6c2a8d91b4'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    term_table = op.create_table('explicit_acls_propertyvalue_term',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('acl_id', sa.String(length=36), nullable=False),
+    sa.Column('schema', sa.String(length=255), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=True),
+    sa.Column('value', sa.String(length=128), nullable=True),
+    sa.Column('field_type', sa.String(length=32), nullable=True),
+    sa.Column('path', sa.String(length=64), nullable=True),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.ForeignKeyConstraint(['acl_id'], ['explicit_acls_propertyvalueacl.id'], name='fk_explicit_acls_propertyvalue_term_acl_id', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_explicit_acls_propertyvalue_term'))
+    )
+    op.create_index(op.f('ix_explicit_acls_propertyvalue_term_acl_id'), 'explicit_acls_propertyvalue_term', ['acl_id'], unique=False)
+    op.create_index('ix_explicit_acls_propertyvalue_term_lookup', 'explicit_acls_propertyvalue_term', ['schema', 'name', 'value'], unique=False)
+
+    # mappings are not available here, so existing ACLs are marked as percolated on all their schemas.
+    # Run "invenio explicit-acls index-property-values" to index them.
+    acl_table = sa.table('explicit_acls_acl', sa.column('id'), sa.column('schemas'), sa.column('type'))
+    rows = []
+    for acl_id, schemas in op.get_bind().execute(
+            sa.select([acl_table.c.id, acl_table.c.schemas]).where(acl_table.c.type == 'propertyvalue')):
+        if isinstance(schemas, str):
+            schemas = json.loads(schemas)
+        for schema in schemas or ():
+            rows.append({'id': str(uuid.uuid4()), 'acl_id': acl_id, 'schema': schema, 'operation': 'percolate'})
+    if rows:
+        op.bulk_insert(term_table, rows)
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index('ix_explicit_acls_propertyvalue_term_lookup', table_name='explicit_acls_propertyvalue_term')
+    op.drop_index(op.f('ix_explicit_acls_propertyvalue_term_acl_id'), table_name='explicit_acls_propertyvalue_term')
+    op.drop_table('explicit_acls_propertyvalue_term')
@@ -0,0 +1,46 @@
+#
+# This file is part of Invenio.
+# Copyright (C) 2016-2018 CERN.
+#
+# Invenio is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""ACL schema association table."""
+
+import json
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e1f25d37'
+down_revision = 'b7e4d2c1a9f0'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    schema_table = op.create_table('explicit_acls_acl_schema',
+    sa.Column('schema', sa.String(length=255), nullable=False),
+    sa.Column('acl_id', sa.String(length=36), nullable=False),
+    sa.ForeignKeyConstraint(['acl_id'], ['explicit_acls_acl.id'], name='fk_explicit_acls_acl_schema_acl_id', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('schema', 'acl_id', name=op.f('pk_explicit_acls_acl_schema'))
+    )
+    op.create_index(op.f('ix_explicit_acls_acl_schema_acl_id'), 'explicit_acls_acl_schema', ['acl_id'], unique=False)
+
+    acl_table = sa.table('explicit_acls_acl', sa.column('id'), sa.column('schemas'))
+    rows = []
+    for acl_id, schemas in op.get_bind().execute(sa.select([acl_table.c.id, acl_table.c.schemas])):
+        if isinstance(schemas, str):
+            schemas = json.loads(schemas)
+        for schema in sorted(set(schemas or ())):
+            rows.append({'acl_id': acl_id, 'schema': schema})
+    if rows:
+        op.bulk_insert(schema_table, rows)
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index(op.f('ix_explicit_acls_acl_schema_acl_id'), table_name='explicit_acls_acl_schema')
+    op.drop_table('explicit_acls_acl_schema')
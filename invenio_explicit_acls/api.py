@@ -24,28 +24,54 @@
 #
 """Public API for explicit ACL module."""
 import datetime
+import hashlib
 import json
 import logging
 import os
 from collections import defaultdict
-from typing import Iterable
+from typing import Dict, FrozenSet, Iterable, List, Optional
 
 from elasticsearch import VERSION as ES_VERSION
-from flask import current_app
+from flask import current_app, g, has_app_context
 from invenio_db import db
+from invenio_indexer import current_record_to_index
 from invenio_records import Record
 from invenio_records_rest.utils import obj_or_import_string
 from invenio_search import current_search_client
+from sqlalchemy import inspect
+from sqlalchemy.orm import with_polymorphic
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.utils import cached_property, import_string
 
+from invenio_explicit_acls.acls.es_mixin import ESACLMixin, \
+    get_es_records_acls
 from invenio_explicit_acls.tasks import acl_changed_reindex, \
     acl_deleted_reindex
-from invenio_explicit_acls.utils import schema_to_index
+from invenio_explicit_acls.utils import get_priority_floors, \
+    get_record_acl_enabled_schema, prune_by_priority, schema_to_index
+from .audience import Audience, resolve_audiences
+from .cache import LocalCache, default_audience_cache, \
+    default_percolation_cache, default_record_acls_cache
+from .durability import DURABILITY_FLUSH, DURABILITY_REFRESH, \
+    get_durability_policy, visibility_barrier
 from .es import add_doc_type
+from .generation import ACL_GENERATION, ES_ACL_GENERATION, \
+    PENDING_ACL_CHANGES, PENDING_ROLE_CHANGES, ROLE_GENERATION, \
+    default_generation_store
+from .instrumentation import STAGE_ACTORS, STAGE_FILTER, STAGE_LOOKUP, \
+    STAGE_REUSE, STAGE_SERIALIZE, TimingHistogram, timed
 from .models import ACL, Actor
+from .selectors import get_selector_constructs, get_selector_cost, \
+    profile_selector, project_document
 
 logger = logging.getLogger(__name__)
 
+SEARCH_FILTERS_REQUEST_CACHE = '_invenio_explicit_acls_search_filters'
+"""Attribute of flask.g holding ACL search filters compiled during the current request."""
+
+PRINCIPAL_TOKENS_FIELD = '_invenio_explicit_acls_tokens'
+"""Property of indexed records holding flat operation|principal tokens, see INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS."""
+
 
 # noinspection PyMethodMayBeStatic
 class AclAPI:
@@ -58,6 +84,9 @@ class AclAPI:
         :param app: invenio application
         """
         self.app = app
+        self._generation_cache = {}
+        self.timing_histogram = TimingHistogram()
+        """Timings of ACL resolution stages, collected if INVENIO_EXPLICIT_ACLS_TIMING_HISTOGRAM is set."""
 
     @property
     def actor_models(self):
@@ -83,6 +112,15 @@ class AclAPI:
             if isinstance(cls, type) and issubclass(cls, ACL) and cls is not ACL
         ]
 
+    @property
+    def es_acl_models(self):
+        """
+        Returns all ACL db models that are matched by elasticsearch percolator.
+
+        :return list of ACL classes inheriting from ESACLMixin
+        """
+        return [cls for cls in self.acl_models if issubclass(cls, ESACLMixin)]
+
     def prepare(self, schema):
         """
         Add ACL support for a given schema.
@@ -132,37 +170,125 @@ class AclAPI:
         """
         applicable_acls = []
         for acl in self.acl_models:
-            applicable_acls.extend(acl.get_record_acls(record))
+            if not issubclass(acl, ESACLMixin):
+                with timed(STAGE_LOOKUP, acl_type=acl.__mapper_args__['polymorphic_identity']):
+                    applicable_acls.extend(acl.get_record_acls(record))
+        priority_floors = {str(record.id): get_priority_floors(applicable_acls)} if self.priority_pruning else None
+        es_acl_models = self.es_acl_models
+        with timed(STAGE_LOOKUP, acl_type=self._get_acl_types(es_acl_models)):
+            applicable_acls.extend(
+                get_es_records_acls(es_acl_models, [record], priority_floors=priority_floors)[str(record.id)])
 
         if not applicable_acls:
             return []
 
-        return self._applicable_acls_filter(applicable_acls)
+        with timed(STAGE_FILTER):
+            applicable_acls = list(self._applicable_acls_filter(applicable_acls))
+        self.preload_actors(applicable_acls)
+        return applicable_acls
+
+    def get_records_acls(self, records: Iterable[Record]) -> Dict[str, List[ACL]]:
+        """
+        Returns ACL objects applicable for each of the given records.
+
+        Each ACL type resolves the whole batch at once and all elasticsearch based ACL types share
+        a single percolation, so the number of calls to the database and elasticsearch does not depend
+        on the number of records. Records whose schema is not ACL enabled are not contained in the result.
+
+        :param records: Invenio records
+        :return: dictionary of record id (string) -> list of applicable ACLs
+        """
+        records = [record for record in records if get_record_acl_enabled_schema(record)]
+        applicable_acls = {str(record.id): [] for record in records}
+        if not records:
+            return applicable_acls
+
+        for acl in self.acl_models:
+            if not issubclass(acl, ESACLMixin):
+                with timed(STAGE_LOOKUP, acl_type=acl.__mapper_args__['polymorphic_identity'], records=len(records)):
+                    for record_id, record_acls in acl.get_records_acls(records).items():
+                        applicable_acls[record_id].extend(record_acls)
+        priority_floors = {
+            record_id: get_priority_floors(record_acls) for record_id, record_acls in applicable_acls.items()
+        } if self.priority_pruning else None
+        es_acl_models = self.es_acl_models
+        with timed(STAGE_LOOKUP, acl_type=self._get_acl_types(es_acl_models), records=len(records)):
+            for record_id, record_acls in get_es_records_acls(es_acl_models, records,
+                                                              priority_floors=priority_floors).items():
+                applicable_acls[record_id].extend(record_acls)
+
+        with timed(STAGE_FILTER, records=len(records)):
+            applicable_acls = {
+                record_id: list(self._applicable_acls_filter(record_acls)) if record_acls else []
+                for record_id, record_acls in applicable_acls.items()
+            }
+        self.preload_actors(acl for record_acls in applicable_acls.values() for acl in record_acls)
+        return applicable_acls
+
+    @staticmethod
+    def _get_acl_types(models):
+        return ','.join(sorted(model.__mapper_args__['polymorphic_identity'] for model in models))
+
+    def preload_actors(self, acls: Iterable[ACL]):
+        """
+        Loads actors of the given ACLs in a single query.
+
+        The strategy is set by INVENIO_EXPLICIT_ACLS_ACTOR_LOADING:
+
+        * ``selectin`` (default) - actors of all the ACLs whose actors have not been loaded yet
+          are loaded in one query that joins tables of all Actor subclasses (with_polymorphic).
+          Then Actor.preload is called for each actor type - ids of users of UserActors and roles
+          of RoleActors are loaded by one query each, so serializing any number of ACLs takes
+          at most 3 SQL statements
+        * ``lazy`` - actors are lazy loaded one ACL at a time when accessed
+
+        :param acls: ACLs whose actors should be loaded
+        """
+        if self.app.config['INVENIO_EXPLICIT_ACLS_ACTOR_LOADING'] != 'selectin':
+            return
+
+        acls = {acl.id: acl for acl in acls if 'actors' in inspect(acl).unloaded}
+        if not acls:
+            return
+
+        with timed(STAGE_ACTORS):
+            actors = defaultdict(list)
+            polymorphic_actor = with_polymorphic(Actor, '*')
+            for actor in db.session.query(polymorphic_actor).filter(polymorphic_actor.acl_id.in_(list(acls))):
+                actors[actor.acl_id].append(actor)
+
+            for acl_id, acl in acls.items():
+                set_committed_value(acl, 'actors', actors[acl_id])
+
+            actors_by_type = defaultdict(list)
+            for acl_actors in actors.values():
+                for actor in acl_actors:
+                    actors_by_type[type(actor)].append(actor)
+            for actor_type, typed_actors in actors_by_type.items():
+                actor_type.preload(typed_actors)
 
     @cached_property
     def _applicable_acls_filter(self):
 
         def default_applicable_acls_filter(applicable_acls):
-            max_priorities = defaultdict(list)
-            for x in applicable_acls:
-                if x.priority_group in max_priorities:
-                    max_priorities_group = max_priorities[x.priority_group]
-                    if x.priority < max_priorities_group[0].priority:
-                        continue
-                    if x.priority > max_priorities_group[0].priority:
-                        max_priorities_group.clear()
-                    max_priorities_group.append(x)
-                else:
-                    max_priorities[x.priority_group].append(x)
-
-            max_priority = max([x.priority for x in applicable_acls])
-            return [x for x in applicable_acls if x.priority == max_priority]
+            # only the ACLs with the highest priority within their priority group are applied
+            return prune_by_priority(applicable_acls)
 
         return obj_or_import_string(
             current_app.config.get('INVENIO_EXPLICIT_ACLS_APPLICABLE_ACLS_FILTER'),
             default=default_applicable_acls_filter
         )
 
+    @property
+    def priority_pruning(self):
+        """
+        Returns True if ACL lookups may drop ACLs shadowed by a higher priority ACL in the same priority group.
+
+        This is the case for the default applicable ACLs filter. A custom INVENIO_EXPLICIT_ACLS_APPLICABLE_ACLS_FILTER
+        gets all the applicable ACLs.
+        """
+        return not self.app.config.get('INVENIO_EXPLICIT_ACLS_APPLICABLE_ACLS_FILTER')
+
     @property
     def acl_doctype_name(self):
         """Return doctype of index in which percolate ACL queries are stored."""
@@ -170,8 +296,433 @@ class AclAPI:
 
     @property
     def enabled_schemas(self):
-        """Returns a set of schemas for which there exists at least one ACL."""
-        return ACL.enabled_schemas()
+        """
+        Returns a set of schemas for which there exists at least one ACL.
+
+        The set is cached until a change to ACLs is committed (in this or, with a shared generation store,
+        in any other process). A session with flushed but not yet committed ACL changes always gets
+        a fresh value from the database.
+        """
+        if db.session.info.get(PENDING_ACL_CHANGES):
+            return frozenset(ACL.enabled_schemas())
+        return self._generation_cached('enabled_schemas', lambda: frozenset(ACL.enabled_schemas()))
+
+    @property
+    def acl_matcher(self):
+        """
+        Returns ACLMatcher with DefaultACLs, IdACLs and PropertyValueACLs compiled for in-memory matching.
+
+        The matcher is rebuilt when ACL generation changes. Returns None if the matcher is disabled
+        by INVENIO_EXPLICIT_ACLS_IN_MEMORY_MATCHER or if the current session contains uncommitted ACL changes
+        (ACLs are then looked up in the database and elasticsearch).
+        """
+        if not self.app.config['INVENIO_EXPLICIT_ACLS_IN_MEMORY_MATCHER'] or \
+                not self.generation_caching or \
+                db.session.info.get(PENDING_ACL_CHANGES):
+            return None
+        from .matcher import ACLMatcher
+        return self._generation_cached('acl_matcher', lambda: ACLMatcher.build(prune=self.priority_pruning))
+
+    def get_percolated_fields(self, index):
+        """
+        Returns fields of records in the given index that are referenced by percolated ACLs.
+
+        The fields are stored with each ACL in the percolator index by ESACLMixin.update()
+        and are cached until an ACL is written to or removed from a percolator index.
+
+        :param index: name of the record index
+        :return: set of dotted field paths (including sources of copy_to and alias fields)
+                 or None if the whole record should be percolated
+        """
+        if not self.app.config['INVENIO_EXPLICIT_ACLS_TRIM_PERCOLATED_DOCUMENTS'] or \
+                not self.generation_caching or \
+                db.session.info.get(PENDING_ACL_CHANGES):
+            return None
+        percolated_fields = self._generation_cached('percolated_fields', dict, ES_ACL_GENERATION)
+        if index not in percolated_fields:
+            percolated_fields[index] = self._load_percolated_fields(index)
+        return percolated_fields[index]
+
+    def _load_percolated_fields(self, index):
+        from .acls.es_mixin import ESACLMixin
+        from .selectors import ALL_FIELDS, NO_FIELDS, expand_field_sources, \
+            get_field_sources
+
+        try:
+            resp = current_search_client.search(
+                index=ESACLMixin.get_acl_index_name(index),
+                **add_doc_type(self.acl_doctype_name),
+                body={
+                    'size': 0,
+                    'aggs': {
+                        'fields': {
+                            'terms': {
+                                'field': '__acl_record_fields',
+                                'size': 10000
+                            }
+                        },
+                        'missing_fields': {
+                            'missing': {
+                                'field': '__acl_record_fields'
+                            }
+                        }
+                    }
+                }
+            )
+        except Exception:
+            logger.exception('Could not get fields of percolated ACLs on index %s, '
+                             'whole records will be percolated', index)
+            return None
+
+        aggs = resp['aggregations']
+        if aggs['missing_fields']['doc_count'] or aggs['fields']['sum_other_doc_count']:
+            # some of the ACLs were indexed without fields, call update() on them to enable trimming
+            return None
+        fields = {bucket['key'] for bucket in aggs['fields']['buckets']}
+        if ALL_FIELDS in fields:
+            return None
+        # selectors without any field (such as match_all) do not need anything from the record
+        fields.discard(NO_FIELDS)
+        return frozenset(expand_field_sources(fields, get_field_sources(index)))
+
+    def _generation_cached(self, key, factory, generation_key=ACL_GENERATION):
+        """Returns a value computed by factory, cached until the generation changes."""
+        if not self.generation_caching:
+            return factory()
+        generation = self.generation_store.get(generation_key)
+        cached = self._generation_cache.get(key)
+        if cached is None or cached[0] != generation:
+            cached = (generation, factory())
+            self._generation_cache[key] = cached
+        return cached[1]
+
+    @cached_property
+    def generation_store(self):
+        """Store of generation counters, configurable via INVENIO_EXPLICIT_ACLS_GENERATION_STORE."""
+        return obj_or_import_string(
+            self.app.config.get('INVENIO_EXPLICIT_ACLS_GENERATION_STORE'),
+            default=default_generation_store
+        )(self.app)
+
+    @cached_property
+    def generation_caching(self):
+        """
+        Returns True if data cached under ACL generations may be used.
+
+        Generations in a process-local store are not seen by other processes (celery workers, other web workers),
+        so with such a store nothing is cached unless INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING is set.
+        """
+        return getattr(self.generation_store, 'shared', True) or \
+            bool(self.app.config['INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING'])
+
+    @property
+    def generation(self):
+        """Returns the current ACL generation. It changes whenever a change to ACLs is committed."""
+        return self.generation_store.get(ACL_GENERATION)
+
+    def es_acls_changed(self, acl_index_names: Iterable[str] = None):
+        """
+        Called after ACLs have been written to or removed from percolator indices.
+
+        Percolated fields and percolation results are cached under the new generation, so they must not be computed
+        from the previous state of the indices. Unless the durability policy has already refreshed them,
+        the written indices are made searchable before the generation is bumped.
+
+        :param acl_index_names: names of the written percolator indices
+        """
+        if acl_index_names and get_durability_policy() not in (DURABILITY_FLUSH, DURABILITY_REFRESH):
+            visibility_barrier(acl_index_names)
+        self.generation_store.bump(ES_ACL_GENERATION)
+
+    def visibility_barrier(self, schemas: Iterable[str] = None):
+        """
+        Makes all writes to record and percolator indices of the given schemas searchable.
+
+        Needed for read-your-writes when INVENIO_EXPLICIT_ACLS_DURABILITY is 'wait_for' or 'none'.
+
+        :param schemas: record schemas, all enabled schemas if not set
+        """
+        if schemas is None:
+            schemas = self.enabled_schemas
+        indices = set()
+        for schema in schemas:
+            index = schema_to_index(schema)[0]
+            indices.add(index)
+            indices.add(ESACLMixin.get_acl_index_name(index))
+        visibility_barrier(indices)
+
+    def acl_changed(self):
+        """Called after a change to ACLs has been committed, invalidates cached ACL data in all processes."""
+        self._generation_cache = {}
+        self.generation_store.bump(ACL_GENERATION)
+
+    def roles_changed(self):
+        """Called after a change to role memberships has been committed, invalidates cached search filters."""
+        if has_app_context():
+            g.pop(SEARCH_FILTERS_REQUEST_CACHE, None)
+        self.generation_store.bump(ROLE_GENERATION)
+
+    @cached_property
+    def search_filter_cache(self):
+        """Process-local cache of compiled ACL search filters."""
+        return LocalCache(self.app.config['INVENIO_EXPLICIT_ACLS_SEARCH_FILTER_CACHE_SIZE'],
+                          timeout=self.app.config['INVENIO_EXPLICIT_ACLS_SEARCH_FILTER_CACHE_TIMEOUT'])
+
+    def get_search_filter_key(self, user, operations, context=None) -> Optional[tuple]:
+        """
+        Returns the key of the compiled ACL search filter of the user.
+
+        The filter depends on the user, its roles and system roles and on the operations. Roles are
+        represented by the user id and the role membership generation, so that they do not have to be loaded.
+
+        :param user: the user the filter is created for
+        :param operations: list of operations
+        :param context: context passed to the actors, see SystemRoleActor.get_elasticsearch_query
+        Actor types add the state of the user their queries depend on via Actor.get_user_cache_key.
+
+        :return: the key or None if the filter must not be cached (disabled by
+                 INVENIO_EXPLICIT_ACLS_CACHE_SEARCH_FILTER, process-local generation store, uncommitted
+                 role changes in the session, unknown system roles, context with other keys than
+                 system_roles that custom actors might depend on or an actor type that does not support
+                 caching)
+        """
+        if not self.app.config['INVENIO_EXPLICIT_ACLS_CACHE_SEARCH_FILTER'] or not self.generation_caching or \
+                db.session.info.get(PENDING_ROLE_CHANGES):
+            return None
+        context = context or {}
+        if set(context) - {'system_roles'}:
+            return None
+        from .actors import SystemRoleActor
+        if user.is_anonymous and 'system_roles' not in context:
+            # anonymous identity does not carry the user id checked by SystemRoleActor._get_system_roles
+            identity = g.get('identity')
+            if not identity:
+                return None
+            system_roles = sorted(p[1] for p in identity.provides if p[0] == 'system_role')
+        else:
+            try:
+                system_roles = SystemRoleActor._get_system_roles(context, user)
+            except AttributeError:
+                return None
+        actor_keys = tuple(model.get_user_cache_key(user, context) for model in self.actor_models)
+        if any(x is None for x in actor_keys):
+            return None
+        user_id = None if user.is_anonymous else user.id
+        return user_id, tuple(system_roles), tuple(operations), actor_keys
+
+    def get_cached_search_filter(self, key) -> Optional[dict]:
+        """
+        Returns the compiled search filter cached under the key (see get_search_filter_key).
+
+        The filter is looked up in the current request first, then in the process-local cache.
+        """
+        request_cache = g.get(SEARCH_FILTERS_REQUEST_CACHE)
+        if request_cache is not None and key in request_cache:
+            return request_cache[key]
+        cached = self.search_filter_cache.get(key + (self.generation_store.get(ROLE_GENERATION),))
+        if cached is not None:
+            g.setdefault(SEARCH_FILTERS_REQUEST_CACHE, {})[key] = cached
+        return cached
+
+    def cache_search_filter(self, key, search_filter: dict):
+        """
+        Caches the compiled search filter in the current request and in the process-local cache.
+
+        :param key: the key returned by get_search_filter_key
+        :param search_filter: the filter as a dictionary
+        """
+        g.setdefault(SEARCH_FILTERS_REQUEST_CACHE, {})[key] = search_filter
+        self.search_filter_cache.set(key + (self.generation_store.get(ROLE_GENERATION),), search_filter)
+
+    def get_record_dependencies(self, index) -> Optional[FrozenSet[str]]:
+        """
+        Returns record fields that ACLs (and their actors) applicable to records in the index depend on.
+
+        :param index: name of the record index
+        :return: set of dotted field paths or None if ACLs might depend on any field
+        """
+        actor_dependencies = self._generation_cached('actor_dependencies', self._get_actor_dependencies)
+        if actor_dependencies is None:
+            return None
+        dependencies = set(actor_dependencies)
+        for model in self.acl_models:
+            model_dependencies = model.get_record_dependencies(index)
+            if model_dependencies is None:
+                return None
+            dependencies.update(model_dependencies)
+        return frozenset(dependencies)
+
+    def _get_actor_dependencies(self):
+        dependencies = set()
+        for model in self.actor_models:
+            model_dependencies = model.get_record_dependencies()
+            if model_dependencies is None:
+                return None
+            dependencies.update(model_dependencies)
+        return frozenset(dependencies)
+
+    def get_record_fingerprint(self, record: Record) -> Optional[str]:
+        """
+        Returns a hash of record fields that ACLs depend on and of the current ACL generations.
+
+        If the fingerprint of a record has not changed, the previously serialized ACLs of the record can be reused.
+
+        :param record: Invenio record
+        :return: the fingerprint or None if serialized ACLs must not be reused
+                 (disabled by INVENIO_EXPLICIT_ACLS_REUSE_RECORD_ACLS, uncommitted ACL changes in the session
+                 or unknown dependencies)
+        """
+        if not self.app.config['INVENIO_EXPLICIT_ACLS_REUSE_RECORD_ACLS'] or \
+                not self.generation_caching or \
+                db.session.info.get(PENDING_ACL_CHANGES):
+            return None
+        index, _doc_type = current_record_to_index(record)
+        dependencies = self.get_record_dependencies(index)
+        if dependencies is None:
+            return None
+        fingerprint = json.dumps([
+            self.generation,
+            self.generation_store.get(ES_ACL_GENERATION),
+            project_document(dict(record), dependencies)
+        ], sort_keys=True, default=str)
+        return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    def get_percolation_key(self, index, models, document) -> Optional[str]:
+        """
+        Returns the key of percolation results of the document in percolation_cache.
+
+        :param index: name of the record index
+        :param models: ESACLMixin subclasses whose ACLs are percolated
+        :param document: percolated document, already projected by get_percolated_document
+        :return: the key or None if the results must not be cached (disabled by INVENIO_EXPLICIT_ACLS_CACHE_PERCOLATION,
+                 uncommitted ACL changes in the session or the document is not projected)
+        """
+        if not self.app.config['INVENIO_EXPLICIT_ACLS_CACHE_PERCOLATION'] or \
+                not self.generation_caching or \
+                db.session.info.get(PENDING_ACL_CHANGES) or \
+                self.get_percolated_fields(index) is None:
+            return None
+        key = json.dumps([
+            index,
+            sorted(model.__mapper_args__['polymorphic_identity'] for model in models),
+            self.generation,
+            self.generation_store.get(ES_ACL_GENERATION),
+            document
+        ], sort_keys=True, default=str)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    @cached_property
+    def percolation_cache(self):
+        """Cache of percolation results, configurable via INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE."""
+        return obj_or_import_string(
+            self.app.config.get('INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE'),
+            default=default_percolation_cache
+        )(self.app)
+
+    @cached_property
+    def record_acls_cache(self):
+        """Cache of serialized record ACLs, configurable via INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE."""
+        return obj_or_import_string(
+            self.app.config.get('INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE'),
+            default=default_record_acls_cache
+        )(self.app)
+
+    @cached_property
+    def audience_cache(self):
+        """Cache of record audiences, configurable via INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE."""
+        return obj_or_import_string(
+            self.app.config.get('INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE'),
+            default=default_audience_cache
+        )(self.app)
+
+    def get_record_audience(self, record: Record, operation) -> Audience:
+        """
+        Returns users allowed to perform the operation on the record according to the applicable ACLs.
+
+        :param record: Invenio record
+        :param operation: the operation, such as 'get' or 'update'
+        :return: the audience, SystemRoleActors are represented by their system roles
+        """
+        return self.get_records_audience([record], operation)[str(record.id)]
+
+    def get_records_audience(self, records: Iterable[Record], operation) -> Dict[str, Audience]:
+        """
+        Returns users allowed to perform the operation on each of the records.
+
+        Applicable ACLs are resolved and filtered by priority as during indexing (see get_records_acls),
+        actors of the same type are resolved at once. Records whose schema is not ACL enabled get an empty audience.
+
+        If INVENIO_EXPLICIT_ACLS_CACHE_AUDIENCE is set, the audiences are cached under the record fingerprint
+        (see get_record_fingerprint) and the role membership generation, so they are recomputed when ACLs,
+        the record fields they depend on or role memberships of users change.
+
+        :param records: Invenio records
+        :param operation: the operation, such as 'get' or 'update'
+        :return: dictionary of record id (string) -> Audience
+        """
+        records = list(records)
+        ret = {}
+        keys = {}
+        if self.app.config['INVENIO_EXPLICIT_ACLS_CACHE_AUDIENCE'] and not db.session.info.get(PENDING_ROLE_CHANGES):
+            role_generation = self.generation_store.get(ROLE_GENERATION)
+            for record in records:
+                fingerprint = self.get_record_fingerprint(record)
+                if fingerprint is None:
+                    continue
+                keys[str(record.id)] = key = '%s:%s:%s:%s' % (record.id, operation, fingerprint, role_generation)
+                cached = self.audience_cache.get(key)
+                if cached is not None:
+                    ret[str(record.id)] = cached
+
+        missing = [record for record in records if str(record.id) not in ret]
+        if missing:
+            audiences = resolve_audiences(missing, self.get_records_acls(missing), operation)
+            for record_id, audience in audiences.items():
+                ret[record_id] = audience
+                if record_id in keys:
+                    self.audience_cache.set(keys[record_id], audience)
+        return ret
+
+    def has_serialized_record_acls(self, record: Record) -> bool:
+        """
+        Returns True if previously serialized ACLs of the record can be reused.
+
+        :param record: Invenio record
+        """
+        fingerprint = self.get_record_fingerprint(record)
+        if fingerprint is None:
+            return False
+        cached = self.record_acls_cache.get(str(record.id))
+        return cached is not None and cached[0] == fingerprint
+
+    def get_serialized_record_acls(self, record: Record, record_acls: Iterable[ACL] = None):
+        """
+        Returns serialized ACLs applicable to the record.
+
+        The ACLs serialized during the previous indexing of the record are reused if neither ACLs
+        nor the record fields they depend on have changed, see get_record_fingerprint.
+
+        :param record: Invenio record
+        :param record_acls: ACLs applicable to the record if they have already been resolved
+        :return: json with precompiled ACLs, see serialize_record_acls
+        """
+        with timed(STAGE_REUSE):
+            fingerprint = self.get_record_fingerprint(record)
+            cached = None
+            if fingerprint is not None and record_acls is None:
+                cached = self.record_acls_cache.get(str(record.id))
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        if record_acls is None:
+            record_acls = self.get_record_acls(record)
+        record_acls = list(record_acls)
+        self.preload_actors(record_acls)
+        with timed(STAGE_SERIALIZE):
+            serialized_acls = self.serialize_record_acls(record_acls, record=record)
+        if fingerprint is not None:
+            self.record_acls_cache.set(str(record.id), (fingerprint, serialized_acls))
+        return serialized_acls
 
     def serialize_record_acls(self, record_acls: Iterable[ACL], record=None):
         """
@@ -182,6 +733,9 @@ class AclAPI:
         """
         timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
 
+        record_acls = list(record_acls)
+        self.preload_actors(record_acls)
+
         acl_def = []
 
         for record_acl in record_acls:  # type: ACL
@@ -200,6 +754,48 @@ class AclAPI:
 
         return acl_def
 
+    def get_principal_tokens(self, serialized_acls: Iterable[dict]) -> List[str]:
+        """
+        Returns flat principal tokens of ACLs serialized by serialize_record_acls.
+
+        Each token combines the operation of an ACL with a principal token of its actors
+        (see Actor.get_principal_tokens), for example ``get|u:42``. Actor types that do not
+        support principal tokens are left out.
+
+        :param serialized_acls: json with precompiled ACLs
+        :return: sorted list of tokens to be put to the PRINCIPAL_TOKENS_FIELD property
+        """
+        actor_models = {
+            actor.__mapper_args__['polymorphic_identity']: actor for actor in self.actor_models
+        }
+        tokens = set()
+        for acl in serialized_acls:
+            for actor_type, representation in acl.items():
+                actor_model = actor_models.get(actor_type)
+                if actor_model is None:
+                    continue
+                principals = actor_model.get_principal_tokens(representation)
+                if principals is not None:
+                    tokens.update(f'{acl["operation"]}|{x}' for x in principals)
+        return sorted(tokens)
+
+    def get_user_principal_tokens(self, user, context=None) -> Optional[List[str]]:
+        """
+        Returns principal tokens of the user collected from all actor types, see Actor.get_query_principal_tokens.
+
+        :param user: the user to be checked
+        :param context: context passed to the actors, see SystemRoleActor.get_elasticsearch_query
+        :return: sorted list of tokens without the operation or None if any actor type does not support them
+        """
+        context = context or {}
+        tokens = set()
+        for actor_model in self.actor_models:
+            principals = actor_model.get_query_principal_tokens(user, context)
+            if principals is None:
+                return None
+            tokens.update(principals)
+        return sorted(tokens)
+
     def reindex_acl(self, acl: ACL, delayed=True):
         """
         Reindex resources when ACL is changed.
@@ -218,6 +814,64 @@ class AclAPI:
         else:
             acl_changed_reindex(str(acl.id))
 
+    def reindex_acls(self, acls: Iterable[ACL], delayed=True):
+        """
+        Reindex resources when several ACLs are changed at once.
+
+        Percolator documents of elasticsearch based ACLs are written in a single bulk request,
+        see ESACLMixin.bulk_update.
+
+        :param acls:        the ACLs that have been created/changed
+        :param delayed:     see reindex_acl
+        """
+        acls = list(acls)
+        try:
+            for acl in acls:
+                if not isinstance(acl, ESACLMixin):
+                    acl.update()
+            ESACLMixin.bulk_update(acl for acl in acls if isinstance(acl, ESACLMixin))
+        except:  # pragma no cover
+            logger.exception('Error: could not update ACL index')
+
+        for acl in acls:
+            if delayed and current_app.config['INVENIO_EXPLICIT_ACLS_DELAYED_REINDEX']:
+                acl_changed_reindex.delay(str(acl.id))  # pragma no cover
+            else:
+                acl_changed_reindex(str(acl.id))
+
+    def profile_selectors(self, schemas: Iterable[str] = None) -> List[dict]:
+        """
+        Profiles record selectors of all elasticsearch based ACLs.
+
+        Each selector is run through elasticsearch validate and profile APIs against the record index
+        of each of the ACL's schemas and its static cost is computed (see selectors.get_selector_cost).
+
+        :param schemas: if set, only ACLs on these schemas are profiled
+        :return: list of dicts with keys 'acl', 'schema', 'index', 'cost', 'constructs', 'valid',
+                 'error' and 'time_in_nanos', the most expensive selectors first
+        """
+        ret = []
+        for acl in ACL.query.all():
+            if not isinstance(acl, ESACLMixin):
+                continue
+            record_selector = acl.record_selector
+            constructs = get_selector_constructs(record_selector)
+            cost = get_selector_cost(record_selector)
+            for schema in acl.schemas:
+                if schemas is not None and schema not in schemas:
+                    continue
+                index = schema_to_index(schema)[0]
+                ret.append({
+                    'acl': acl,
+                    'schema': schema,
+                    'index': index,
+                    'cost': cost,
+                    'constructs': constructs,
+                    **profile_selector(index, record_selector)
+                })
+        ret.sort(key=lambda x: (not x['valid'], x['cost'], x['time_in_nanos'] or 0), reverse=True)
+        return ret
+
     def reindex_acl_removed(self, acl: ACL, delayed=True):
         """
         Reindex resources when ACL is removed.
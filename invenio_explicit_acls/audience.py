@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# audience.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Effective audience of a record - users allowed to perform an operation on the record."""
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from invenio_records import Record
+
+ANY_USER = 'any_user'
+"""System role matching everyone, including anonymous users."""
+
+AUTHENTICATED_USER = 'authenticated_user'
+"""System role matching every authenticated user."""
+
+
+class Audience:
+    """
+    Users allowed to perform an operation on a record.
+
+    Actors that match users symbolically (SystemRoleActor) are not enumerated, their system roles
+    are kept in system_roles instead.
+    """
+
+    __slots__ = ('user_ids', 'system_roles')
+
+    def __init__(self, user_ids: Iterable[int] = (), system_roles: Iterable[str] = ()):
+        """
+        Creates the audience.
+
+        :param user_ids:     ids of users explicitly allowed to perform the operation
+        :param system_roles: system roles (such as any_user) allowed to perform the operation
+        """
+        self.user_ids = set(user_ids)
+        self.system_roles = set(system_roles)
+
+    @property
+    def everyone(self) -> bool:
+        """Returns True if anyone (including anonymous users) may perform the operation."""
+        return ANY_USER in self.system_roles
+
+    def includes(self, user_id) -> bool:
+        """
+        Checks if a user belongs to the audience.
+
+        :param user_id: id of an authenticated user
+        """
+        return user_id in self.user_ids or bool(self.system_roles & {ANY_USER, AUTHENTICATED_USER})
+
+    def update(self, other: 'Audience'):
+        """Adds users and system roles of another audience to this one."""
+        self.user_ids.update(other.user_ids)
+        self.system_roles.update(other.system_roles)
+
+    def __getstate__(self):
+        """Compact representation used when the audience is cached."""
+        return sorted(self.user_ids), sorted(self.system_roles)
+
+    def __setstate__(self, state):
+        """Restores the audience from its compact representation."""
+        self.user_ids = set(state[0])
+        self.system_roles = set(state[1])
+
+    def __eq__(self, other):
+        """Audiences are equal if they have the same users and system roles."""
+        return isinstance(other, Audience) and \
+            self.user_ids == other.user_ids and self.system_roles == other.system_roles
+
+    def __repr__(self):
+        """String representation for debugging."""
+        return 'Audience(user_ids=%r, system_roles=%r)' % (sorted(self.user_ids), sorted(self.system_roles))
+
+
+def resolve_audiences(records: List[Record], records_acls: Dict[str, Iterable], operation) -> Dict[str, Audience]:
+    """
+    Resolves audiences of records from their applicable ACLs.
+
+    Actors are resolved in batches by their type (see Actor.resolve_matching_user_ids), so the number
+    of database queries depends on the number of actor types, not on the number of records or ACLs.
+
+    :param records: Invenio records
+    :param records_acls: dictionary of record id (string) -> ACLs applicable to the record
+    :param operation: the operation, such as 'get' or 'update'
+    :return: dictionary of record id (string) -> Audience
+    """
+    ret = {str(record.id): Audience() for record in records}
+    actor_records = defaultdict(list)
+    for record in records:
+        record_id = str(record.id)
+        for acl in records_acls.get(record_id, ()):
+            if acl.operation != operation:
+                continue
+            for actor in acl.actors:
+                system_role = actor.get_audience_system_role()
+                if system_role is not None:
+                    ret[record_id].system_roles.add(system_role)
+                else:
+                    actor_records[type(actor)].append((actor, record))
+
+    for actor_type, items in actor_records.items():
+        for (_actor, record), user_ids in zip(items, actor_type.resolve_matching_user_ids(items)):
+            ret[str(record.id)].user_ids.update(user_ids)
+    return ret
+
+
+__all__ = ('ANY_USER', 'AUTHENTICATED_USER', 'Audience', 'resolve_audiences')
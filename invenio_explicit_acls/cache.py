@@ -0,0 +1,133 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# cache.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Caches of values computed from ACLs, such as serialized ACLs of records."""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from invenio_cache import current_cache
+except ImportError:  # pragma no cover
+    current_cache = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """Least recently used cache kept in the memory of the current process."""
+
+    def __init__(self, maxsize, timeout=None):
+        """
+        Cache initialization.
+
+        :param maxsize: maximal number of cached values
+        :param timeout: expiration of cached values in seconds, values do not expire if not set
+        """
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value or None if it is not cached or has expired."""
+        with self._lock:
+            try:
+                self._values.move_to_end(key)
+            except KeyError:
+                return None
+            expires, value = self._values[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        """Caches the value, evicting the least recently used one if the cache is full."""
+        expires = time.monotonic() + self.timeout if self.timeout else None
+        with self._lock:
+            self._values[key] = (expires, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached values."""
+        with self._lock:
+            self._values.clear()
+
+
+class SharedCache:
+    """Cache shared between processes via invenio-cache."""
+
+    def __init__(self, prefix, timeout=None):
+        """
+        Cache initialization.
+
+        :param prefix:  prefix of keys in invenio-cache
+        :param timeout: expiration of cached values in seconds
+        """
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def get(self, key):
+        """Returns the cached value or None if it is not cached."""
+        return current_cache.get(self.prefix + key)
+
+    def set(self, key, value):
+        """Caches the value."""
+        current_cache.set(self.prefix + key, value, timeout=self.timeout)
+
+
+def default_record_acls_cache(app):
+    """Returns cache of serialized record ACLs - shared if invenio-cache is enabled, process-local otherwise."""
+    if current_cache is not None and 'invenio-cache' in app.extensions:
+        return SharedCache('invenio_explicit_acls:record_acls:',
+                           timeout=app.config['INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE_TIMEOUT'])
+    return LocalCache(app.config['INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE_SIZE'])
+
+
+def default_percolation_cache(app):
+    """Returns process-local cache of percolation results."""
+    return LocalCache(app.config['INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE_SIZE'])
+
+
+def shared_percolation_cache(app):
+    """Returns cache of percolation results shared between processes via invenio-cache."""
+    return SharedCache('invenio_explicit_acls:percolation:',
+                       timeout=app.config['INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE_TIMEOUT'])
+
+
+def default_audience_cache(app):
+    """Returns cache of record audiences - shared if invenio-cache is enabled, process-local otherwise."""
+    if current_cache is not None and 'invenio-cache' in app.extensions:
+        return SharedCache('invenio_explicit_acls:audience:',
+                           timeout=app.config['INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE_TIMEOUT'])
+    return LocalCache(app.config['INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE_SIZE'],
+                      timeout=app.config['INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE_TIMEOUT'])
+
+
+__all__ = ('LocalCache', 'SharedCache', 'default_record_acls_cache', 'default_percolation_cache',
+           'shared_percolation_cache', 'default_audience_cache')
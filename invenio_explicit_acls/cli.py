@@ -31,12 +31,15 @@ import click
 from flask import cli, current_app
 from invenio_db import db
 from invenio_indexer import current_record_to_index
-from invenio_indexer.api import RecordIndexer
 from invenio_jsonschemas import current_jsonschemas
 from invenio_records import Record
 from invenio_records.models import RecordMetadata
 from sqlalchemy import cast
 
+from invenio_explicit_acls.acls.es_mixin import ESACLMixin
+from invenio_explicit_acls.api import PRINCIPAL_TOKENS_FIELD
+from invenio_explicit_acls.indexer import ACLRecordIndexer, \
+    get_records_in_chunks
 from invenio_explicit_acls.models import ACL
 from invenio_explicit_acls.proxies import current_explicit_acls
 
@@ -117,10 +120,17 @@ def full_reindex_impl(verbose, records, in_bulk=True):
     # 1. for each ACL update the ACL's index etc
     if verbose:
         print('Reindexing ACLs')
+    es_acls = []
     for acl in ACL.query.all():
         if verbose:
             print('Updating ACL representation for', acl)
-        acl.update()
+        if isinstance(acl, ESACLMixin):
+            # percolator documents are written in bulk below
+            es_acls.append(acl)
+        else:
+            acl.update()
+    if es_acls:
+        ESACLMixin.bulk_update(es_acls)
     if not records:
         return
     # 2. for each of ACL enabled indices reindex all documents
@@ -138,17 +148,91 @@ def full_reindex_impl(verbose, records, in_bulk=True):
         print('Adding %s records to indexing queue' % len(uuids))
 
     if in_bulk:
-        RecordIndexer().bulk_index(uuids)
+        ACLRecordIndexer().bulk_index(uuids)
 
         if verbose:
             print('Running bulk indexer on %s records' % len(uuids))
-        RecordIndexer(version_type=None).process_bulk_queue(
+        ACLRecordIndexer(version_type=None).process_bulk_queue(
             es_bulk_kwargs={'raise_on_error': False})
     else:
-        indexer = RecordIndexer()
-        for rec_uuid in uuids:
-            r = Record.get_record(rec_uuid)
-            indexer.index(r)
+        ACLRecordIndexer().index_records(get_records_in_chunks(uuids))
+
+
+@explicit_acls.command(name='rebuild-percolators')
+@click.argument('schemas', nargs=-1)
+@click.option('--keep-old/--no-keep-old', default=False)
+@cli.with_appcontext
+def rebuild_percolators(schemas, keep_old):  # pragma no cover
+    """
+    Rebuilds percolator indices of ES-based ACLs and atomically switches them in.
+
+    :param schemas: schemas whose percolator indices should be rebuilt, all ACL enabled schemas if not set
+    """
+    rebuild_percolators_impl(schemas, keep_old)
+
+
+def rebuild_percolators_impl(schemas, keep_old=False):
+    """
+    Rebuilds percolator indices of ES-based ACLs and atomically switches them in.
+
+    :param schemas: schemas whose percolator indices should be rebuilt, all ACL enabled schemas if not set
+    :param keep_old: do not remove the previous versions of the percolator indices
+    """
+    for schema in (schemas or sorted(current_explicit_acls.enabled_schemas)):
+        index_name = ESACLMixin.rebuild_schema_acls(schema, delete_old=not keep_old)
+        print('Percolator index for schema %s rebuilt as %s' % (schema, index_name))
+
+
+@explicit_acls.command(name='index-property-values')
+@cli.with_appcontext
+def index_property_values():  # pragma no cover
+    """Rebuilds the database term index of PropertyValueACLs, for example after record mapping has changed."""
+    index_property_values_impl()
+
+
+def index_property_values_impl():
+    """Rebuilds the database term index of PropertyValueACLs, for example after record mapping has changed."""
+    from invenio_explicit_acls.acls import PropertyValueACL
+
+    for acl in PropertyValueACL.query:
+        acl.update_terms()
+        percolated = sorted(x.schema for x in acl.terms if x.operation == x.PERCOLATE)
+        if percolated:
+            print('ACL %s is percolated on %s' % (acl, ', '.join(percolated)))
+    db.session.commit()
+
+
+@explicit_acls.command(name='profile-selectors')
+@click.argument('schemas', nargs=-1)
+@cli.with_appcontext
+def profile_selectors(schemas):  # pragma no cover
+    """
+    Lists record selectors of ES-based ACLs ordered by their percolation cost.
+
+    :param schemas: only ACLs on these schemas are profiled, all if not set
+    """
+    profile_selectors_impl(schemas)
+
+
+def profile_selectors_impl(schemas):
+    """
+    Lists record selectors of ES-based ACLs ordered by their percolation cost.
+
+    :param schemas: only ACLs on these schemas are profiled, all if not set
+    """
+    threshold = current_app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_THRESHOLD']
+    for profile in current_explicit_acls.profile_selectors(schemas or None):
+        if profile['valid']:
+            print('%6s %10.3f ms %s %s on %s' % (
+                profile['cost'], profile['time_in_nanos'] / 1000000,
+                'EXPENSIVE' if profile['cost'] > threshold else '         ',
+                profile['acl'], profile['schema']))
+        else:
+            print('%6s %13s %s %s on %s' % (profile['cost'], '', 'INVALID  ', profile['acl'], profile['schema']))
+            print('        error:', profile['error'])
+        for construct, path in profile['constructs']:
+            if construct != 'clause':
+                print('        %s at %s' % (construct, path))
 
 
 @explicit_acls.command()
@@ -187,19 +271,18 @@ def explain_impl(record, debug):
             schema = current_jsonschemas.url_to_path(schema)
 
         print('Possible ACLs')
-        for acl in ACL.query.all():
-            if schema in acl.schemas:
-                print('    ', type(acl).__name__, acl)
-
-                for k in dir(acl):
-                    if k.startswith('_'): continue
-                    if k in ('metadata', 'query'): continue
-                    val = getattr(acl, k)
-                    if not callable(val) and val:
-                        if isinstance(val, list):
-                            print('        %s = %s' % (k, [str(x) for x in val]))
-                        else:
-                            print('        %s = %s' % (k, val))
+        for acl in ACL.query.filter(ACL.has_schema(schema)):
+            print('    ', type(acl).__name__, acl)
+
+            for k in dir(acl):
+                if k.startswith('_'): continue
+                if k in ('metadata', 'query'): continue
+                val = getattr(acl, k)
+                if not callable(val) and val:
+                    if isinstance(val, list):
+                        print('        %s = %s' % (k, [str(x) for x in val]))
+                    else:
+                        print('        %s = %s' % (k, val))
         print()
 
         applicable_acls = []
@@ -239,6 +322,10 @@ def explain_impl(record, debug):
         print()
 
         print('The ACLs will get serialized to the following element')
-        print(json.dumps({
-            '_invenio_explicit_acls': current_explicit_acls.serialize_record_acls(matching_acls)
-        }, indent=4))
+        serialized_acls = current_explicit_acls.serialize_record_acls(matching_acls)
+        serialized = {
+            '_invenio_explicit_acls': serialized_acls
+        }
+        if current_app.config['INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS']:
+            serialized[PRINCIPAL_TOKENS_FIELD] = current_explicit_acls.get_principal_tokens(serialized_acls)
+        print(json.dumps(serialized, indent=4))
@@ -28,3 +28,79 @@ INVENIO_EXPLICIT_ACLS_DOCTYPE_NAME = '_doc'
 INVENIO_EXPLICIT_ACLS_MIXIN_NAME = 'invenio-acl-mixin-v1.0.0'
 INVENIO_EXPLICIT_ACLS_DELAYED_REINDEX = True
 INVENIO_EXPLICIT_ACLS_SCHEMA_TO_INDEX = 'invenio_explicit_acls.utils.default_schema_to_index'
+INVENIO_EXPLICIT_ACLS_GENERATION_STORE = None
+"""Store for ACL generation counters. If not set, invenio-cache is used when enabled, process memory otherwise."""
+INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING = False
+"""Use caches of ACL data even if the generation store is process-local. Other processes (celery workers, other
+web workers) do not see changes to ACLs and roles then, so set it only if everything runs in a single process."""
+INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE = 100
+"""Number of records for which ACLs are resolved at once during bulk indexing."""
+INVENIO_EXPLICIT_ACLS_IN_MEMORY_MATCHER = True
+"""Match DefaultACLs, IdACLs and term-only PropertyValueACLs in memory instead of the database/percolator."""
+INVENIO_EXPLICIT_ACLS_PROPERTYVALUE_TERM_INDEX = True
+"""Look up term-only PropertyValueACLs in the database term index when the in-memory matcher is not used."""
+INVENIO_EXPLICIT_ACLS_ACTOR_LOADING = 'selectin'
+"""How actors of applicable ACLs are loaded: 'selectin' (all at once) or 'lazy' (one ACL at a time)."""
+INVENIO_EXPLICIT_ACLS_PERCOLATE_PAGE_SIZE = 1000
+"""Number of matching ACLs fetched from the percolator in a single request."""
+INVENIO_EXPLICIT_ACLS_TRIM_PERCOLATED_DOCUMENTS = True
+"""Send only the fields referenced by ACL record selectors in percolate requests instead of the whole record."""
+INVENIO_EXPLICIT_ACLS_REUSE_RECORD_ACLS = True
+"""Reuse serialized ACLs of a record if none of the fields ACLs depend on has changed since the last indexing."""
+INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE = None
+"""Cache of serialized record ACLs. If not set, invenio-cache is used when enabled, process memory otherwise."""
+INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE_SIZE = 10000
+"""Maximal number of records whose serialized ACLs are kept in the process memory."""
+INVENIO_EXPLICIT_ACLS_RECORD_ACLS_CACHE_TIMEOUT = 24 * 3600
+"""Expiration (in seconds) of serialized record ACLs kept in invenio-cache."""
+INVENIO_EXPLICIT_ACLS_TIMING_HISTOGRAM = True
+"""Collect timings of ACL resolution stages to current_explicit_acls.timing_histogram."""
+INVENIO_EXPLICIT_ACLS_DURABILITY = 'refresh'
+"""What to do after ACLs and records are written to elasticsearch: 'flush', 'refresh', 'wait_for' or 'none'."""
+INVENIO_EXPLICIT_ACLS_CACHE_PERCOLATION = True
+"""Cache percolation results of records with the same values of fields referenced by ACL selectors."""
+INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE = None
+"""Factory (app -> cache) of the percolation cache. Set to 'invenio_explicit_acls.cache.shared_percolation_cache'
+to share the cache between processes via invenio-cache, defaults to process-local LRU cache."""
+INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE_SIZE = 10000
+"""Maximal number of percolation results in the process-local cache."""
+INVENIO_EXPLICIT_ACLS_PERCOLATION_CACHE_TIMEOUT = 3600
+"""Expiration (in seconds) of percolation results kept in invenio-cache."""
+INVENIO_EXPLICIT_ACLS_CACHE_SEARCH_FILTER = True
+"""Cache ACL search filters compiled for a user until role memberships of users change. The filter is cached
+only if all actor types describe the user state their queries depend on, see Actor.get_user_cache_key."""
+INVENIO_EXPLICIT_ACLS_SEARCH_FILTER_CACHE_SIZE = 1000
+"""Maximal number of compiled ACL search filters kept in the process memory."""
+INVENIO_EXPLICIT_ACLS_SEARCH_FILTER_CACHE_TIMEOUT = 300
+"""Expiration (in seconds) of compiled ACL search filters kept in the process memory."""
+INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS = False
+"""Index flat operation|principal tokens (such as get|u:42) along with the nested ACLs and check access in
+ACLDefaultFilter with a terms query on them instead of a nested query. Reindex records after enabling it."""
+INVENIO_EXPLICIT_ACLS_CACHE_AUDIENCE = False
+"""Cache record audiences (see AclAPI.get_record_audience) until ACLs or the record fields they depend on change."""
+INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE = None
+"""Cache of record audiences. If not set, invenio-cache is used when enabled, process memory otherwise."""
+INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE_SIZE = 10000
+"""Maximal number of record audiences kept in the process memory."""
+INVENIO_EXPLICIT_ACLS_AUDIENCE_CACHE_TIMEOUT = 3600
+"""Expiration (in seconds) of record audiences kept in invenio-cache or in the process memory."""
+INVENIO_EXPLICIT_ACLS_SELECTOR_COSTS = {
+    'clause': 1,
+    'wildcard': 5,
+    'fuzzy': 20,
+    'query_string': 20,
+    'regexp': 50,
+    'leading_wildcard': 100,
+    'script': 100,
+}
+"""Costs of record selector constructs, see invenio_explicit_acls.selectors.get_selector_constructs."""
+INVENIO_EXPLICIT_ACLS_SELECTOR_COST_THRESHOLD = 50
+"""Record selectors with a higher cost are subject to INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY."""
+INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY = 'warn'
+"""What to do when an expensive record selector is saved in admin: 'warn', 'reject' or None to allow it."""
+INVENIO_EXPLICIT_ACLS_SCAN_SLICES = 1
+"""Number of parallel slices used when enumerating records an ACL applies to, see invenio_explicit_acls.es.iter_ids."""
+INVENIO_EXPLICIT_ACLS_SCAN_PAGE_SIZE = 1000
+"""Number of record ids fetched by a single scroll request when enumerating records an ACL applies to."""
+INVENIO_EXPLICIT_ACLS_USER_ID_CHUNK_SIZE = 1000
+"""Number of user ids fetched from the database at once and the default chunk size of matching user ids."""
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# durability.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Durability policy of writes to elasticsearch performed when ACLs change."""
+from typing import Iterable
+
+from flask import current_app
+from invenio_search import current_search_client
+
+DURABILITY_FLUSH = 'flush'
+"""Refresh the written indices and flush them (Lucene commit) after each write."""
+
+DURABILITY_REFRESH = 'refresh'
+"""Refresh the written indices after each write, so that the changes are immediately searchable."""
+
+DURABILITY_WAIT_FOR = 'wait_for'
+"""Writes wait until the changes are made visible by the next periodic refresh of the index."""
+
+DURABILITY_NONE = 'none'
+"""Do not wait for anything, changes become searchable after the index refresh interval."""
+
+DURABILITY_POLICIES = (DURABILITY_FLUSH, DURABILITY_REFRESH, DURABILITY_WAIT_FOR, DURABILITY_NONE)
+
+
+def get_durability_policy():
+    """Returns the durability policy set in INVENIO_EXPLICIT_ACLS_DURABILITY."""
+    policy = current_app.config['INVENIO_EXPLICIT_ACLS_DURABILITY']
+    if policy not in DURABILITY_POLICIES:
+        raise AttributeError('INVENIO_EXPLICIT_ACLS_DURABILITY must be one of %s, got %s' %
+                             (', '.join(DURABILITY_POLICIES), policy))
+    return policy
+
+
+def get_write_kwargs():
+    """Returns extra arguments of elasticsearch write (index, delete, bulk) requests according to the policy."""
+    if get_durability_policy() == DURABILITY_WAIT_FOR:
+        return {'refresh': 'wait_for'}
+    return {}
+
+
+def after_write(indices: Iterable[str]):
+    """
+    Makes writes to the given indices durable/visible according to the policy.
+
+    :param indices: names of the indices that have been written to
+    """
+    indices = ','.join(sorted(set(indices)))
+    if not indices:
+        return
+    policy = get_durability_policy()
+    if policy in (DURABILITY_FLUSH, DURABILITY_REFRESH):
+        current_search_client.indices.refresh(index=indices)
+    if policy == DURABILITY_FLUSH:
+        current_search_client.indices.flush(index=indices)
+
+
+def visibility_barrier(indices: Iterable[str]):
+    """
+    Makes all the writes to the given indices searchable, regardless of the durability policy.
+
+    Use it when the code needs to read its own writes, for example before searching for records
+    that an ACL applies to.
+
+    :param indices: names of the indices
+    """
+    indices = ','.join(sorted(set(indices)))
+    if indices:
+        current_search_client.indices.refresh(index=indices)
+
+
+__all__ = ('DURABILITY_FLUSH', 'DURABILITY_REFRESH', 'DURABILITY_WAIT_FOR', 'DURABILITY_NONE',
+           'get_durability_policy', 'get_write_kwargs', 'after_write', 'visibility_barrier')
@@ -1,4 +1,10 @@
+import queue
+import threading
+
+import elasticsearch.helpers
 from elasticsearch import VERSION as ES_VERSION
+from flask import current_app
+from invenio_search import current_search_client
 
 
 def add_doc_type(doc_type):
@@ -8,3 +14,95 @@ def add_doc_type(doc_type):
         return {
             'doc_type': doc_type
         }
+
+
+def add_bulk_doc_type(doc_type):
+    if ES_VERSION[0] >= 7:
+        return {}
+    else:
+        return {
+            '_type': doc_type
+        }
+
+
+class _SliceError:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_SLICE_DONE = object()
+
+
+def iter_ids(index, query, doc_type=None, slices=None):
+    """
+    Yields ids of all documents in the index matching the query, without their sources.
+
+    The index is read with a sliced scroll, the slices are consumed in parallel threads. The number of slices
+    is set by INVENIO_EXPLICIT_ACLS_SCAN_SLICES, each slice fetches INVENIO_EXPLICIT_ACLS_SCAN_PAGE_SIZE
+    documents per request. The order of the returned ids is not defined.
+
+    :param index: name of the index
+    :param query: elasticsearch query (the content of the "query" element)
+    :param doc_type: document type, used only on elasticsearch 6
+    :param slices: number of slices, overrides INVENIO_EXPLICIT_ACLS_SCAN_SLICES
+    """
+    slices = slices or current_app.config['INVENIO_EXPLICIT_ACLS_SCAN_SLICES']
+    size = current_app.config['INVENIO_EXPLICIT_ACLS_SCAN_PAGE_SIZE']
+    # threads do not have the application context, so pass them the client itself
+    client = current_search_client._get_current_object()
+    body = {
+        'query': query,
+        '_source': False,
+        'sort': ['_doc']
+    }
+    doc_type = add_doc_type(doc_type) if doc_type else {}
+
+    def scan(slice_body):
+        for doc in elasticsearch.helpers.scan(client, query=slice_body, index=index, size=size, **doc_type):
+            yield doc['_id']
+
+    if slices <= 1:
+        yield from scan(body)
+        return
+
+    results = queue.Queue(maxsize=slices * size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def consume_slice(slice_id):
+        ids = scan({**body, 'slice': {'id': slice_id, 'max': slices}})
+        try:
+            for doc_id in ids:
+                if not put(doc_id):
+                    break
+        except Exception as e:
+            put(_SliceError(e))
+        finally:
+            ids.close()
+            put(_SLICE_DONE)
+
+    threads = [threading.Thread(target=consume_slice, args=(slice_id,), daemon=True) for slice_id in range(slices)]
+    for thread in threads:
+        thread.start()
+    try:
+        running = slices
+        while running:
+            item = results.get()
+            if item is _SLICE_DONE:
+                running -= 1
+            elif isinstance(item, _SliceError):
+                raise item.exception
+            else:
+                yield item
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
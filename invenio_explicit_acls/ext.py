@@ -44,7 +44,8 @@ class InvenioExplicitAcls(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
-        app.extensions['invenio-explicit-acls'] = AclAPI(app)
+        state = AclAPI(app)
+        app.extensions['invenio-explicit-acls'] = state
 
         # register signals
         from invenio_explicit_acls.signals import add_acls
@@ -52,6 +53,28 @@ class InvenioExplicitAcls(object):
 
         before_record_index.connect(add_acls)
 
+        # invalidate cached ACL data when ACLs are changed
+        from invenio_explicit_acls.generation import register_session_listeners
+
+        register_session_listeners()
+
+        # keep the schema association table and the term index of PropertyValueACLs in sync
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+
+        from invenio_explicit_acls.acls.propertyvalue_acls import \
+            update_property_value_terms
+        from invenio_explicit_acls.models import sync_acl_schemas
+
+        for listener in (sync_acl_schemas, update_property_value_terms):
+            if not event.contains(Session, 'before_flush', listener):
+                event.listen(Session, 'before_flush', listener)
+
+        if app.config['INVENIO_EXPLICIT_ACLS_TIMING_HISTOGRAM']:
+            from invenio_explicit_acls.instrumentation import acl_timing
+
+            acl_timing.connect(state.timing_histogram, sender=app)
+
     def init_config(self, app):
         """Initialize configuration."""
         for k in dir(config):
@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# generation.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""ACL generation counters used to invalidate data cached from the ACL tables."""
+import logging
+import threading
+import time
+from collections import defaultdict
+from itertools import chain
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+try:
+    from invenio_cache import current_cache
+except ImportError:  # pragma no cover
+    current_cache = None
+
+logger = logging.getLogger(__name__)
+
+ACL_GENERATION = 'acl'
+"""Generation that is incremented whenever a change to ACLs, actors or their related rows is committed."""
+
+ES_ACL_GENERATION = 'es-acl'
+"""Generation that is incremented whenever an ACL is written to or removed from the percolator indices."""
+
+PENDING_ACL_CHANGES = 'invenio_explicit_acls_pending_changes'
+"""Key in session.info marking that the session has flushed ACL changes that are not yet committed."""
+
+ROLE_GENERATION = 'roles'
+"""Generation that is incremented whenever a change to role memberships of users is committed."""
+
+PENDING_ROLE_CHANGES = 'invenio_explicit_acls_pending_role_changes'
+"""Key in session.info marking that the session has flushed role membership changes that are not yet committed."""
+
+
+class LocalGenerationStore:
+    """
+    Generation counters kept in the memory of the current process.
+
+    Other processes are not notified about the changes, so caches keyed by the generations are not used
+    with this store unless INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING is set (for example, in tests
+    or in a single process deployment).
+    """
+
+    shared = False
+    """Generations are not seen by other processes."""
+
+    def __init__(self, app=None):
+        """Store initialization."""
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the current generation for the key."""
+        return self._counters[key]
+
+    def bump(self, key):
+        """Increments the generation for the key and returns the new value."""
+        with self._lock:
+            self._counters[key] += 1
+            return self._counters[key]
+
+
+class CacheGenerationStore:
+    """Generation counters shared between processes via invenio-cache (redis in a usual deployment)."""
+
+    shared = True
+    """Generations are seen by all processes using the same invenio-cache."""
+
+    def __init__(self, app=None, prefix='invenio_explicit_acls:generation:'):
+        """Store initialization."""
+        self.prefix = prefix
+
+    def get(self, key):
+        """Returns the current generation for the key."""
+        value = current_cache.get(self.prefix + key)
+        if value is None:
+            value = self._initialize(key)
+        return value
+
+    def bump(self, key):
+        """Increments the generation for the key and returns the new value."""
+        if current_cache.get(self.prefix + key) is None:
+            self._initialize(key)
+        return current_cache.inc(self.prefix + key)
+
+    def _initialize(self, key):
+        """
+        Starts a missing (never set or evicted) counter from the current time in microseconds.
+
+        Restarting from 0 would reuse generations that data might still be cached under.
+        """
+        initial = int(time.time() * 1000000)
+        current_cache.add(self.prefix + key, initial)
+        value = current_cache.get(self.prefix + key)
+        return initial if value is None else value
+
+
+def default_generation_store(app):
+    """Returns a shared generation store if invenio-cache is enabled, process-local store otherwise."""
+    if current_cache is not None and 'invenio-cache' in app.extensions:
+        return CacheGenerationStore(app)
+    if not app.config.get('INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING'):
+        logger.warning('invenio-cache is not enabled, ACL generation is tracked only inside the current process. '
+                       'Caches of ACL data are disabled, set INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING '
+                       'to enable them in a single process deployment.')
+    return LocalGenerationStore(app)
+
+
+def _is_acl_object(obj):
+    return getattr(obj, '__tablename__', '').startswith('explicit_acls_')
+
+
+def _is_role_membership_change(obj, deleted):
+    tablename = getattr(obj, '__tablename__', '')
+    if tablename == 'accounts_role':
+        return deleted or inspect(obj).attrs.users.history.has_changes()
+    if tablename == 'accounts_user':
+        return deleted or inspect(obj).attrs.roles.history.has_changes()
+    return False
+
+
+def _after_flush(session, flush_context):
+    if any(_is_acl_object(x) for x in chain(session.new, session.dirty, session.deleted)):
+        session.info[PENDING_ACL_CHANGES] = True
+    if any(_is_role_membership_change(x, False) for x in chain(session.new, session.dirty)) or \
+            any(_is_role_membership_change(x, True) for x in session.deleted):
+        session.info[PENDING_ROLE_CHANGES] = True
+
+
+def _after_commit(session):
+    transaction = session.transaction
+    if transaction is not None and transaction.nested:
+        # just a savepoint has been released, the changes are not visible outside this session yet
+        return
+    if session.info.pop(PENDING_ACL_CHANGES, False):
+        if has_app_context() and 'invenio-explicit-acls' in current_app.extensions:
+            current_app.extensions['invenio-explicit-acls'].acl_changed()
+    if session.info.pop(PENDING_ROLE_CHANGES, False):
+        if has_app_context() and 'invenio-explicit-acls' in current_app.extensions:
+            current_app.extensions['invenio-explicit-acls'].roles_changed()
+
+
+def _after_soft_rollback(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        # just a savepoint (or a subtransaction) has been rolled back, the enclosing transaction
+        # might still contain flushed changes that will be committed
+        return
+    # uncommitted changes are never cached, so there is nothing to invalidate
+    session.info.pop(PENDING_ACL_CHANGES, None)
+    session.info.pop(PENDING_ROLE_CHANGES, None)
+
+
+def register_session_listeners():
+    """Registers SQLAlchemy session listeners that track committed changes to ACLs."""
+    for name, listener in (('after_flush', _after_flush),
+                           ('after_commit', _after_commit),
+                           ('after_soft_rollback', _after_soft_rollback)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+__all__ = ('ACL_GENERATION', 'ES_ACL_GENERATION', 'ROLE_GENERATION', 'PENDING_ACL_CHANGES', 'PENDING_ROLE_CHANGES',
+           'LocalGenerationStore', 'CacheGenerationStore', 'default_generation_store', 'register_session_listeners')
@@ -0,0 +1,190 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# indexer.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Record indexer resolving explicit ACLs for a batch of records at once."""
+import logging
+from typing import Iterable
+
+from elasticsearch import VERSION as ES_VERSION
+from elasticsearch.helpers import bulk
+from elasticsearch.helpers import expand_action as default_expand_action
+from flask import current_app
+from invenio_indexer import current_record_to_index
+from invenio_indexer.api import RecordIndexer
+from invenio_indexer.utils import _es7_expand_action
+from invenio_records import Record
+
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+
+class ACLRecordIndexer(RecordIndexer):
+    """
+    RecordIndexer that resolves explicit ACLs for a chunk of records at once.
+
+    The ACLs are resolved via AclAPI.get_records_acls and passed to the before_record_index signal,
+    so that bulk indexing makes a constant number of ACL lookups per chunk, not per record.
+    """
+
+    def __init__(self, *args, acl_chunk_size=None, **kwargs):
+        """
+        Initialize indexer.
+
+        :param acl_chunk_size: number of records for which ACLs are resolved at once.
+                               If not set, INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE is used
+        For the rest of the parameters see RecordIndexer
+        """
+        super().__init__(*args, **kwargs)
+        self._acl_chunk_size = acl_chunk_size
+
+    @property
+    def acl_chunk_size(self):
+        """Number of records for which ACLs are resolved at once."""
+        return self._acl_chunk_size or current_app.config['INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE']
+
+    def index_records(self, records: Iterable[Record], es_bulk_kwargs=None):
+        """
+        Index records synchronously via elasticsearch bulk API.
+
+        :param records: iterable of records to index
+        :param dict es_bulk_kwargs: Passed to elasticsearch.helpers.bulk
+        :return: a tuple (number of indexed records, number of errors). Failed records are logged
+        """
+        es_bulk_kwargs = es_bulk_kwargs or {}
+        success, errors = bulk(
+            self.client,
+            self._records_actionsiter(records),
+            stats_only=False,
+            request_timeout=current_app.config['INDEXER_BULK_REQUEST_TIMEOUT'],
+            expand_action_callback=(
+                _es7_expand_action if ES_VERSION[0] >= 7
+                else default_expand_action
+            ),
+            **es_bulk_kwargs
+        )
+        for error in errors:
+            logger.error('Failed to index record: %s', error)
+        if errors:
+            logger.error('Failed to index %s records', len(errors))
+        return success, len(errors)
+
+    def _records_actionsiter(self, records):
+        for chunk in chunked(records, self.acl_chunk_size):
+            records_acls = current_explicit_acls.get_records_acls(_records_to_resolve(chunk))
+            for record in chunk:
+                yield self._acl_index_action(record, records_acls.get(str(record.id)))
+
+    def _actionsiter(self, message_iterator):
+        """
+        Iterate bulk actions.
+
+        Messages are processed in chunks, records of each chunk are loaded in a single query
+        and ACLs for all of them are resolved at once.
+
+        :param message_iterator: Iterator yielding messages from a queue.
+        """
+        for chunk in chunked(message_iterator, self.acl_chunk_size):
+            payloads = [message.decode() for message in chunk]
+            index_ids = [payload['id'] for payload in payloads if payload['op'] != 'delete']
+
+            records = {}
+            records_acls = {}
+            if index_ids:
+                records = {str(record.id): record for record in Record.get_records(index_ids)}
+                try:
+                    records_acls = current_explicit_acls.get_records_acls(_records_to_resolve(records.values()))
+                except Exception:
+                    # fall back to resolving ACLs record by record in the signal handler
+                    logger.exception('Could not resolve ACLs for a chunk of records')
+
+            for message, payload in zip(chunk, payloads):
+                try:
+                    if payload['op'] == 'delete':
+                        yield self._delete_action(payload)
+                    else:
+                        record = records.get(str(payload['id']))
+                        if record is None:
+                            message.reject()
+                            continue
+                        yield self._acl_index_action(record, records_acls.get(str(record.id)))
+                    message.ack()
+                except Exception:
+                    message.reject()
+                    current_app.logger.error(
+                        "Failed to index record {0}".format(payload.get('id')),
+                        exc_info=True)
+
+    def _acl_index_action(self, record, record_acls):
+        """
+        Bulk index action with already resolved ACLs.
+
+        :param record: the record to be indexed
+        :param record_acls: ACLs applicable to the record or None if they should be resolved in add_acls
+        :returns: Dictionary defining an Elasticsearch bulk 'index' action.
+        """
+        index, doc_type = self.record_to_index(record)
+
+        arguments = {}
+        body = self._prepare_record(record, index, doc_type, arguments, record_acls=record_acls)
+        index, doc_type = self._prepare_index(index, doc_type)
+
+        action = {
+            '_op_type': 'index',
+            '_index': index,
+            '_type': doc_type,
+            '_id': str(record.id),
+            '_version': record.revision_id,
+            '_version_type': self._version_type,
+            '_source': body
+        }
+        action.update(arguments)
+
+        return action
+
+
+def _records_to_resolve(records):
+    """Returns records whose previously serialized ACLs can not be reused."""
+    return [record for record in records if not current_explicit_acls.has_serialized_record_acls(record)]
+
+
+def get_records_in_chunks(record_ids, indices=None):
+    """
+    Loads records in chunks, skipping the ones that have been removed in the meanwhile.
+
+    :param record_ids:  iterable of record ids
+    :param indices:     if set, names of indices of the returned records are added to this set
+    :return:            iterable of records
+    """
+    for chunk in chunked(record_ids, current_app.config['INVENIO_EXPLICIT_ACLS_BULK_CHUNK_SIZE']):
+        # records removed in the meanwhile by another thread/process are not returned,
+        # indexer should have been called to remove them from ES
+        for rec in Record.get_records(chunk):
+            if indices is not None:
+                indices.add(current_record_to_index(rec)[0])
+            yield rec
+
+
+__all__ = ('ACLRecordIndexer', 'get_records_in_chunks')
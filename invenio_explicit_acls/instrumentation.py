@@ -0,0 +1,169 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# instrumentation.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Timing of the stages of ACL resolution performed when records are indexed."""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from blinker import Namespace
+from flask import current_app
+
+_signals = Namespace()
+
+acl_timing = _signals.signal('invenio-explicit-acls-timing')
+"""
+Signal sent when a stage of ACL resolution has finished.
+
+The sender is the Flask application, keyword arguments are:
+
+* ``stage`` - one of ``schema``, ``reuse``, ``lookup``, ``filter``, ``actors`` and ``serialize``
+* ``acl_type`` - polymorphic identity of the ACL type for the ``lookup`` stage (elasticsearch based
+  ACL types are looked up together, their identities are joined by a comma), None otherwise
+* ``duration`` - duration of the stage in seconds
+* ``records`` - number of records processed in the stage
+
+Timings are measured only if there is a receiver connected to the signal.
+"""
+
+STAGE_SCHEMA = 'schema'
+"""Checking that the record's schema is ACL enabled."""
+
+STAGE_REUSE = 'reuse'
+"""Looking up previously serialized ACLs of the record."""
+
+STAGE_LOOKUP = 'lookup'
+"""Looking up ACLs of an ACL type applicable to the record(s)."""
+
+STAGE_FILTER = 'filter'
+"""Filtering the applicable ACLs by priority."""
+
+STAGE_ACTORS = 'actors'
+"""Loading actors of the applicable ACLs."""
+
+STAGE_SERIALIZE = 'serialize'
+"""Serializing ACLs to the representation stored in elasticsearch."""
+
+
+@contextmanager
+def timed(stage, acl_type=None, records=1):
+    """
+    Measures the duration of the enclosed block and sends it via acl_timing signal.
+
+    :param stage: the stage, see acl_timing
+    :param acl_type: ACL type for the lookup stage
+    :param records: number of processed records
+    """
+    if not acl_timing.receivers:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        acl_timing.send(current_app._get_current_object(), stage=stage, acl_type=acl_type,
+                        duration=time.perf_counter() - start, records=records)
+
+
+class TimingHistogram:
+    """
+    In-memory histogram of ACL stage timings, a receiver of acl_timing signal.
+
+    Timings are kept separately for each stage and ACL type.
+    """
+
+    DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+    """Upper bounds (in seconds) of the histogram buckets, the last bucket is unbounded."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Histogram initialization.
+
+        :param buckets: sorted upper bounds of the buckets in seconds
+        """
+        self.buckets = tuple(buckets)
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, sender, stage=None, acl_type=None, duration=None, records=1, **kwargs):
+        """Receives the acl_timing signal."""
+        self.record(stage, duration, acl_type=acl_type, records=records)
+
+    def record(self, stage, duration, acl_type=None, records=1):
+        """
+        Records a timing.
+
+        :param stage: the stage, see acl_timing
+        :param duration: duration in seconds
+        :param acl_type: ACL type for the lookup stage
+        :param records: number of processed records
+        """
+        bucket = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            timing = self._timings.get((stage, acl_type))
+            if timing is None:
+                timing = self._timings[(stage, acl_type)] = {
+                    'count': 0,
+                    'records': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'buckets': [0] * (len(self.buckets) + 1)
+                }
+            timing['count'] += 1
+            timing['records'] += records
+            timing['total'] += duration
+            timing['max'] = max(timing['max'], duration)
+            timing['buckets'][bucket] += 1
+
+    def snapshot(self):
+        """
+        Returns the recorded timings.
+
+        :return: list of dicts with stage, acl_type, count (of calls), records, total and max (in seconds)
+                 and buckets (list of (upper bound, number of calls), the last upper bound is None)
+        """
+        bounds = self.buckets + (None,)
+        with self._lock:
+            return [
+                {
+                    'stage': stage,
+                    'acl_type': acl_type,
+                    'count': timing['count'],
+                    'records': timing['records'],
+                    'total': timing['total'],
+                    'max': timing['max'],
+                    'buckets': list(zip(bounds, timing['buckets']))
+                }
+                for (stage, acl_type), timing in self._timings.items()
+            ]
+
+    def reset(self):
+        """Removes all the recorded timings."""
+        with self._lock:
+            self._timings = {}
+
+
+__all__ = ('acl_timing', 'timed', 'TimingHistogram', 'STAGE_SCHEMA', 'STAGE_REUSE', 'STAGE_LOOKUP',
+           'STAGE_FILTER', 'STAGE_ACTORS', 'STAGE_SERIALIZE')
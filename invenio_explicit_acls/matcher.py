@@ -0,0 +1,370 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# matcher.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""In-memory matching of ACLs that do not need elasticsearch to decide whether they apply to a record."""
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from invenio_db import db
+from invenio_records import Record
+from invenio_search import current_search
+from sqlalchemy.orm import selectinload
+
+from invenio_explicit_acls.selectors import get_field_sources
+from invenio_explicit_acls.utils import acl_priority, \
+    get_record_acl_enabled_schema, prune_by_priority, \
+    schema_to_index
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELD_TYPES = {'long', 'integer', 'short', 'byte', 'double', 'float', 'half_float', 'scaled_float'}
+
+
+def _normalize_value(field_type, value):
+    """
+    Converts a value to the form in which it is compared by elasticsearch term query on a field of the given type.
+
+    :raises ValueError: if the value can not be converted
+    """
+    if isinstance(value, (dict, list)) or value is None:
+        raise ValueError('Only scalar values are supported')
+    if field_type == 'keyword':
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+    if field_type == 'boolean':
+        if value in (True, 'true'):
+            return True
+        if value in (False, 'false'):
+            return False
+        raise ValueError('Not a boolean value: %r' % (value,))
+    if field_type in NUMERIC_FIELD_TYPES:
+        if isinstance(value, bool):
+            raise ValueError('Not a numeric value: %r' % (value,))
+        return float(value)
+    raise ValueError('Unsupported field type %s' % field_type)
+
+
+def _get_values(data, path):
+    """Returns all scalar values at the dotted path in record metadata, lists are flattened as in elasticsearch."""
+    current = [data]
+    for key in path.split('.'):
+        nested = []
+        for item in current:
+            if isinstance(item, dict) and key in item:
+                value = item[key]
+                if isinstance(value, list):
+                    nested.extend(value)
+                else:
+                    nested.append(value)
+        current = nested
+    return [x for x in current if x is not None and not isinstance(x, (dict, list))]
+
+
+def _get_field_types(index_name):
+    """
+    Returns field types from the mapping of the given index.
+
+    :return: dict of dotted field path -> (field type, dotted path of the value in the record).
+             Only fields that can be matched in memory are included, that is fields without normalizers,
+             ignore_above or null_value settings, not disabled for indexing, not placed inside nested fields
+             and taking their values from the record itself (not copy_to targets or aliases, see get_field_sources).
+    """
+    with open(current_search.mappings[index_name]) as f:
+        mapping = json.load(f)['mappings']
+    if 'properties' not in mapping:
+        # ES6-style mapping file
+        mapping = next(iter(mapping.values()))
+
+    ret = {}
+
+    def supported(definition):
+        return not any(x in definition for x in ('normalizer', 'ignore_above', 'null_value')) and \
+            definition.get('index', True) is not False
+
+    def walk(properties, prefix):
+        for name, definition in properties.items():
+            path = prefix + name
+            field_type = definition.get('type', 'object')
+            if field_type == 'object':
+                if definition.get('enabled', True) is not False:
+                    walk(definition.get('properties', {}), path + '.')
+                continue
+            if field_type == 'nested':
+                # term queries outside of nested query do not see nested documents
+                continue
+            if supported(definition):
+                ret[path] = (field_type, path)
+            for subname, subdefinition in definition.get('fields', {}).items():
+                if supported(subdefinition):
+                    ret[path + '.' + subname] = (subdefinition.get('type', 'object'), path)
+
+    walk(mapping.get('properties', {}), '')
+    # values of copy_to targets and aliases are not in the record, term queries on them are left to elasticsearch
+    field_sources = get_field_sources(index_name)
+    return {k: v for k, v in ret.items() if v[1] not in field_sources}
+
+
+def compile_property_values(property_values, field_types):
+    """
+    Compiles property values of a PropertyValueACL into term conditions that can be evaluated in memory.
+
+    :param property_values: PropertyValue instances of the ACL
+    :param field_types:     field types of the schema's index, see _get_field_types
+    :return: tuple (must, must_not, should, properties) where the first three items are lists
+             of (property name, normalized value) and properties is a dict of property name ->
+             (field type, dotted path of the value in the record). None is returned if the property
+             values need to be evaluated by elasticsearch.
+    """
+    terms = defaultdict(list)
+    properties = {}
+    for prop in property_values:
+        if prop.match_operation.value != 'term' or prop.name not in field_types:
+            return None
+        field_type, path = field_types[prop.name]
+        try:
+            terms[prop.bool_operation.value].append((prop.name, _normalize_value(field_type, prop.value)))
+        except ValueError:
+            return None
+        properties[prop.name] = (field_type, path)
+
+    must = terms['must'] + terms['filter']
+    if must and terms['should']:
+        # should clauses are optional if there are must clauses, keep the exact semantics to elasticsearch
+        return None
+    return must, terms['must_not'], terms['should'], properties
+
+
+def get_record_values(record, properties):
+    """
+    Returns normalized values of the given properties in the record.
+
+    :param record:     record metadata
+    :param properties: dict of property name -> (field type, dotted path of the value in the record)
+    :return: dict of property name -> set of normalized values, properties without values are left out
+    """
+    record_values = {}
+    for name, (field_type, path) in properties.items():
+        values = set()
+        for value in _get_values(record, path):
+            try:
+                values.add(_normalize_value(field_type, value))
+            except ValueError:
+                pass
+        if values:
+            record_values[name] = values
+    return record_values
+
+
+class CompiledPropertyValueACL:
+    """PropertyValueACL compiled into a set of term conditions evaluated in memory."""
+
+    __slots__ = ('id', 'must', 'must_not', 'should')
+
+    def __init__(self, acl_id, must, must_not, should):
+        """
+        Creates a compiled ACL.
+
+        :param acl_id:   id of the ACL
+        :param must:     list of (property name, normalized value) that must all be present in the record
+        :param must_not: list of (property name, normalized value) none of which may be present in the record
+        :param should:   list of (property name, normalized value) at least one of which must be present
+                         in the record (if the list is not empty)
+        """
+        self.id = acl_id
+        self.must = must
+        self.must_not = must_not
+        self.should = should
+
+    def matches(self, record_values):
+        """
+        Checks if the ACL matches the record.
+
+        :param record_values: dict of property name -> set of normalized values in the record
+        """
+        def present(term):
+            return term[1] in record_values.get(term[0], ())
+
+        return all(present(x) for x in self.must) and \
+            not any(present(x) for x in self.must_not) and \
+            (not self.should or any(present(x) for x in self.should))
+
+
+class PropertyValueIndex:
+    """Hash index of compiled PropertyValueACLs for a single schema, keyed by (property name, value)."""
+
+    def __init__(self, field_types):
+        """
+        Creates an empty index.
+
+        :param field_types: field types of the schema's index, see _get_field_types
+        """
+        self.field_types = field_types
+        self.by_term = defaultdict(list)
+        self.unanchored = []
+        self.properties = {}
+
+    def compile(self, acl) -> bool:
+        """
+        Compiles the PropertyValueACL and adds it to the index.
+
+        :return: True if the ACL has been compiled, False if it needs to be evaluated by elasticsearch
+        """
+        compiled_terms = compile_property_values(acl.property_values, self.field_types)
+        if compiled_terms is None:
+            return False
+        must, must_not, should, properties = compiled_terms
+
+        compiled = CompiledPropertyValueACL(acl.id, must, must_not, should)
+        # ACL is a candidate only for records that contain one of its anchor terms
+        anchors = must[:1] or should
+        if anchors:
+            for term in anchors:
+                self.by_term[term].append(compiled)
+        else:
+            self.unanchored.append(compiled)
+        self.properties.update(properties)
+        return True
+
+    def match(self, record) -> List[str]:
+        """Returns ids of compiled ACLs matching the record."""
+        record_values = get_record_values(record, self.properties)
+        candidates = {id(x): x for x in self.unanchored}
+        for name, values in record_values.items():
+            for value in values:
+                for compiled in self.by_term.get((name, value), ()):
+                    candidates[id(compiled)] = compiled
+        return [x.id for x in candidates.values() if x.matches(record_values)]
+
+
+class ACLMatcher:
+    """
+    ACLs compiled into in-memory hash indices.
+
+    DefaultACLs are indexed by schema, IdACLs by record id and PropertyValueACLs consisting only of term
+    conditions on supported fields by (property name, value). Other PropertyValueACLs and all the other
+    ES based ACLs are still evaluated by the percolator.
+    """
+
+    def __init__(self, prune=False):
+        """
+        Creates an empty matcher, use ACLMatcher.build() to create a matcher from the database.
+
+        :param prune: if True, only ids of ACLs with the highest priority within their priority group are returned
+        """
+        self.prune = prune
+        self.priorities = {}
+        self.default_acls = defaultdict(list)
+        self.id_acls = defaultdict(list)
+        self.property_value_indices = {}
+        self.compiled_property_value_acls = defaultdict(set)
+        self.percolated_property_value_acls = defaultdict(set)
+
+    @classmethod
+    def build(cls, prune=False):
+        """
+        Compiles all DefaultACLs, IdACLs and PropertyValueACLs in the database.
+
+        :param prune: see ACLMatcher()
+        """
+        from invenio_explicit_acls.acls import DefaultACL, IdACL, PropertyValueACL
+
+        matcher = cls(prune=prune)
+        for acl_id, schemas, priority, priority_group in db.session.query(
+                DefaultACL.id, DefaultACL.schemas, DefaultACL.priority, DefaultACL.priority_group):
+            matcher.priorities[acl_id] = (priority or 0, priority_group)
+            for schema in schemas or ():
+                matcher.default_acls[schema].append(acl_id)
+
+        for acl_id, record_id, priority, priority_group in db.session.query(
+                IdACL.id, IdACL.record_id, IdACL.priority, IdACL.priority_group):
+            matcher.priorities[acl_id] = (priority or 0, priority_group)
+            matcher.id_acls[record_id].append(acl_id)
+
+        field_types = {}
+        for acl in PropertyValueACL.query.options(selectinload(PropertyValueACL.property_values)):
+            for schema in acl.schemas or ():
+                try:
+                    index_name = schema_to_index(schema)[0]
+                    if index_name not in field_types:
+                        field_types[index_name] = _get_field_types(index_name)
+                except Exception:
+                    logger.exception('Could not get mapping for schema %s, ACL %s will be percolated', schema, acl)
+                    continue
+                if schema not in matcher.property_value_indices:
+                    matcher.property_value_indices[schema] = PropertyValueIndex(field_types[index_name])
+                if matcher.property_value_indices[schema].compile(acl):
+                    matcher.priorities[acl.id] = acl_priority(acl)
+                    matcher.compiled_property_value_acls[index_name].add(acl.id)
+                else:
+                    matcher.percolated_property_value_acls[index_name].add(acl.id)
+        return matcher
+
+    def get_default_acl_ids(self, record: Record) -> List[str]:
+        """Returns ids of DefaultACLs applicable to the record."""
+        return self._prune(self.default_acls.get(get_record_acl_enabled_schema(record), []))
+
+    def get_id_acl_ids(self, record: Record) -> List[str]:
+        """Returns ids of IdACLs applicable to the record."""
+        return self._prune(self.id_acls.get(str(record.id), []))
+
+    def get_property_value_acl_ids(self, record: Record) -> List[str]:
+        """Returns ids of compiled PropertyValueACLs applicable to the record."""
+        index = self.property_value_indices.get(get_record_acl_enabled_schema(record))
+        if not index:
+            return []
+        return self._prune(index.match(record))
+
+    def _prune(self, acl_ids):
+        # an ACL shadowed by a higher priority ACL of the same type is shadowed in the final result as well
+        if not self.prune or len(acl_ids) < 2:
+            return acl_ids
+        return prune_by_priority(acl_ids, key=self.priorities.get)
+
+    def needs_percolation(self, index_name) -> bool:
+        """Returns True if there are PropertyValueACLs that must be percolated on the given (record) index."""
+        return bool(self.percolated_property_value_acls.get(index_name))
+
+
+def load_acls(clz, acl_ids: Iterable[str]):
+    """Loads ACLs of the given class by their ids in a single query."""
+    acl_ids = list(set(acl_ids))
+    if not acl_ids:
+        return []
+    return clz.query.filter(clz.id.in_(acl_ids)).all()
+
+
+def load_records_acls(clz, record_acl_ids: Dict[str, Iterable[str]]) -> Dict[str, List]:
+    """Loads ACLs for a batch of records in a single query. Takes and returns a dict keyed by record id."""
+    acls = {acl.id: acl for acl in load_acls(clz, (x for ids in record_acl_ids.values() for x in ids))}
+    return {
+        record_id: [acls[x] for x in acl_ids if x in acls]
+        for record_id, acl_ids in record_acl_ids.items()
+    }
+
+
+__all__ = ('ACLMatcher', 'CompiledPropertyValueACL', 'PropertyValueIndex', 'compile_property_values',
+           'get_record_values', 'load_acls', 'load_records_acls')
@@ -28,21 +28,20 @@ import json
 import os
 import uuid
 from abc import abstractmethod
-from typing import Dict, Iterable, Union
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple, \
+    Union
 
-import elasticsearch
 from elasticsearch_dsl import Q
+from flask import current_app
 from flask_security import AnonymousUser
 from invenio_accounts.models import User
 from invenio_db import db
 from invenio_records import Record
-from invenio_search import current_search_client
-from sqlalchemy import func
 from sqlalchemy.util import classproperty
 from sqlalchemy_utils import Timestamp
 
-from invenio_explicit_acls.utils import schema_to_index
-from .es import add_doc_type
+from invenio_explicit_acls.utils import chunked, schema_to_index
+from .es import iter_ids
 
 try:
     from psycopg2 import apilevel
@@ -130,6 +129,9 @@ class ACL(db.Model, Timestamp):
     actors = db.relationship("Actor", back_populates="acl")
     """A set of actors for this ACL (who have rights to perform an operation this ACL references)"""
 
+    schema_associations = db.relationship("ACLSchema", cascade="all, delete-orphan")
+    """Indexed copy of the schemas, kept in sync with the schemas column when the ACL is flushed"""
+
     __mapper_args__ = {
         'polymorphic_identity': 'acl',
         'polymorphic_on': type
@@ -145,6 +147,32 @@ class ACL(db.Model, Timestamp):
         """
         raise NotImplementedError('Must be implemented')
 
+    @classmethod
+    def get_records_acls(clz, records: Iterable[Record]) -> Dict[str, List['ACL']]:
+        """
+        Returns ACL objects applicable for each of the given records.
+
+        The default implementation calls get_record_acls for each record, subclasses should override it
+        to resolve the whole batch with a constant number of calls to the database/elasticsearch.
+
+        :param records: Invenio records with ACL enabled schemas
+        :return: dictionary of record id (string) -> list of ACLs
+        """
+        return {str(record.id): list(clz.get_record_acls(record)) for record in records}
+
+    @classmethod
+    def get_record_dependencies(clz, index) -> Optional[Set[str]]:
+        """
+        Returns record fields that ACLs of this type look at when matching records.
+
+        If none of these fields changes, ACLs applicable to the record do not change either
+        (until ACLs themselves are changed).
+
+        :param index: name of the index of matched records
+        :return: set of dotted field paths or None if the ACLs might depend on any field
+        """
+        return None
+
     @classmethod
     @abstractmethod
     def prepare_schema_acls(self, schema):
@@ -177,17 +205,25 @@ class ACL(db.Model, Timestamp):
     @classmethod
     def enabled_schemas(clz) -> Iterable[str]:
         """Returns all schemas that have at least one ACL defined on them."""
-        schemas = set()
-        if db.engine.dialect.name == 'postgresql':
-            # postgresql has array field, so return it from the array
-            for acl_schemas in db.session.query(func.unnest(ACL.schemas)).distinct().all():
-                schemas.update(acl_schemas)
-        else:
-            # otherwise iterate all the ACLs, let's hope there is not too many of them
-            for acl in ACL.query.all():
-                for schema in acl.schemas:
-                    schemas.add(schema)
-        return schemas
+        return {schema for (schema,) in db.session.query(ACLSchema.schema).distinct()}
+
+    @classmethod
+    def has_schema(clz, *schemas):
+        """
+        Returns an SQL condition selecting ACLs that handle at least one of the schemas.
+
+        The condition is evaluated via the indexed explicit_acls_acl_schema table on all database backends.
+
+        :param schemas: relative schema paths
+        """
+        return clz.id.in_(db.select([ACLSchema.acl_id]).where(ACLSchema.schema.in_(schemas)))
+
+    def update_schema_associations(self):
+        """Brings the schema association rows in sync with the schemas of this ACL."""
+        schemas = set(self.schemas or ())
+        current = {x.schema: x for x in self.schema_associations}
+        if schemas != set(current):
+            self.schema_associations = [current.get(x) or ACLSchema(schema=x) for x in sorted(schemas)]
 
     def used_in_records(self, older_than_timestamp=None):
         """
@@ -232,16 +268,30 @@ class ACL(db.Model, Timestamp):
                     }
                 }
             }
-            for doc in elasticsearch.helpers.scan(
-                current_search_client,
-                query={
-                    "query": query,
-                    "_source": False,
-                },
-                index=index,
-                **add_doc_type(doc_type)
-            ):
-                yield doc['_id']
+            yield from iter_ids(index, query, doc_type)
+
+
+class ACLSchema(db.Model):
+    """Association of an ACL with a schema it handles, a normalized and indexed copy of ACL.schemas."""
+
+    __tablename__ = 'explicit_acls_acl_schema'
+
+    # schema is the leading column of the primary key, so that ACLs of a schema are looked up via the key
+    schema = db.Column(db.String(255), primary_key=True)
+    """Relative path of the schema. Kept short enough for the primary key to fit MySQL key length."""
+
+    acl_id = db.Column(db.String(36),
+                       db.ForeignKey('explicit_acls_acl.id', name='fk_explicit_acls_acl_schema_acl_id',
+                                     ondelete='CASCADE'),
+                       primary_key=True, index=True)
+    """Id of the ACL."""
+
+
+def sync_acl_schemas(session, flush_context, instances):
+    """SQLAlchemy before_flush listener keeping ACLSchema rows in sync with ACL.schemas of the flushed ACLs."""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, ACL):
+            obj.update_schema_associations()
 
 
 class Actor(db.Model, Timestamp):
@@ -320,6 +370,15 @@ class Actor(db.Model, Timestamp):
         """
         raise NotImplementedError("Must be implemented")
 
+    @classmethod
+    def get_record_dependencies(clz) -> Optional[Set[str]]:
+        """
+        Returns record fields that the elasticsearch representation of actors of this type depends on.
+
+        :return: set of dotted field paths or None if the representation might depend on any field
+        """
+        return None
+
     @classmethod
     @abstractmethod
     def get_elasticsearch_query(clz, user: Union[User, AnonymousUser], context: Dict) -> Q or None:
@@ -335,6 +394,49 @@ class Actor(db.Model, Timestamp):
         """
         raise NotImplementedError("Must be implemented")
 
+    @classmethod
+    def get_principal_tokens(clz, representation) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens of the elasticsearch representation of actors of this type.
+
+        Used when INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS is enabled. A token identifies a user, role, system role
+        or any other principal the ACL grants access to, for example ``u:42``. Tokens prefixed with the operation
+        of the ACL (``get|u:42``) are stored in the flat _invenio_explicit_acls_tokens property.
+
+        :param representation: merged representation of actors of this type, see get_elasticsearch_representation
+        :return: iterable of tokens or None if the actor type does not support principal tokens
+        """
+        return None
+
+    @classmethod
+    def get_query_principal_tokens(clz, user: Union[User, AnonymousUser], context: Dict) -> Optional[Iterable[str]]:
+        """
+        Returns principal tokens of the user, the counterpart of get_principal_tokens.
+
+        If any actor type returns None, ACLDefaultFilter falls back to the nested query.
+
+        :param user:     the user to be checked
+        :param context:  any extra context carrying information about the user
+        :return:         iterable of tokens (empty if no actor of this type can match the user)
+                         or None if the actor type does not support principal tokens
+        """
+        return None
+
+    @classmethod
+    def get_user_cache_key(clz, user: Union[User, AnonymousUser], context: Dict) -> Optional[Hashable]:
+        """
+        Returns the state of the user that get_elasticsearch_query and get_query_principal_tokens depend on.
+
+        The value becomes part of the key under which the compiled ACL search filter of the user is cached
+        (see AclAPI.get_search_filter_key). The key already contains the user id, system roles and
+        the role membership generation, actor types depending on nothing else return an empty tuple.
+
+        :param user:     the user to be checked
+        :param context:  any extra context carrying information about the user
+        :return:         hashable value or None if the search filter of the user must not be cached
+        """
+        return None
+
     @abstractmethod
     def user_matches(self, user: Union[User, AnonymousUser], context: Dict, record: Record = None) -> bool:
         """
@@ -354,8 +456,71 @@ class Actor(db.Model, Timestamp):
         """
         raise NotImplementedError('Must be implemented')
 
+    def iter_matching_user_ids(self, record: Record = None) -> Iterable[int]:
+        """
+        Streams ids of users matching this Actor.
+
+        Subclasses matching a large number of users should override it to fetch just the ids in bounded memory,
+        the default implementation delegates to get_matching_users.
+
+        :param record: the record the actor is evaluated on
+        :return: Iterable of user ids
+        """
+        yield from self.get_matching_users(record)
+
+    def iter_matching_user_id_chunks(self, record: Record = None, chunk_size=None) -> Iterable[List[int]]:
+        """
+        Streams ids of users matching this Actor in chunks.
+
+        :param record: the record the actor is evaluated on
+        :param chunk_size: maximal number of ids in a chunk, INVENIO_EXPLICIT_ACLS_USER_ID_CHUNK_SIZE if not set
+        :return: Iterable of lists of user ids
+        """
+        chunk_size = chunk_size or current_app.config['INVENIO_EXPLICIT_ACLS_USER_ID_CHUNK_SIZE']
+        return chunked(self.iter_matching_user_ids(record), chunk_size)
+
+    def count_matching_users(self, record: Record = None) -> int:
+        """
+        Returns the number of users matching this Actor.
+
+        :param record: the record the actor is evaluated on
+        """
+        return sum(1 for _ in self.iter_matching_user_ids(record))
+
+    def get_audience_system_role(self) -> Optional[str]:
+        """
+        Returns the system role this actor stands for when record audience is computed.
+
+        Actors that match users symbolically (for example everyone) return the system role instead
+        of having their users enumerated, the default implementation returns None.
+        """
+        return None
+
+    @classmethod
+    def preload(clz, actors: List['Actor']):
+        """
+        Loads data needed to serialize the given actors of this type in a constant number of queries.
+
+        Called when actors of many ACLs are loaded at once, the default implementation does nothing.
+
+        :param actors: actors of this type
+        """
+
+    @classmethod
+    def resolve_matching_user_ids(clz, actor_records: List[Tuple['Actor', Optional[Record]]]) -> List[Set[int]]:
+        """
+        Returns ids of users matching many actors of this type at once.
+
+        Subclasses override it to resolve the whole batch with a constant number of database queries.
+
+        :param actor_records: list of (actor, record the actor is evaluated on)
+        :return: list of sets of user ids, in the order of actor_records
+        """
+        return [set(actor.iter_matching_user_ids(record)) for actor, record in actor_records]
+
 
 __all__ = [
     'ACL',
+    'ACLSchema',
     'Actor'
 ]
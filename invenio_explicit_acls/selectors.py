@@ -0,0 +1,337 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# selectors.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Extraction of fields referenced by ACL record selectors and projection of percolated documents."""
+import json
+import logging
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from invenio_search import current_search, current_search_client
+
+FIELD_KEY_QUERIES = {
+    'term', 'terms', 'terms_set', 'match', 'match_phrase', 'match_phrase_prefix', 'match_bool_prefix',
+    'prefix', 'wildcard', 'regexp', 'fuzzy', 'range'
+}
+"""Queries in the form of {"query_type": {"field name": ...}}."""
+
+QUERY_OPTIONS = {'boost', '_name'}
+"""Top-level options of FIELD_KEY_QUERIES that are not field names."""
+
+ALL_FIELDS = '*'
+"""Stored in place of the selector fields when they can not be determined."""
+
+NO_FIELDS = '-'
+"""Stored in place of the selector fields when the selector does not reference any field (for example match_all),
+so that it can be told apart from ACLs indexed without the fields."""
+
+LEAF_QUERIES = FIELD_KEY_QUERIES | {
+    'exists', 'ids', 'match_all', 'match_none', 'multi_match', 'geo_shape', 'geo_distance', 'geo_bounding_box'
+}
+"""Queries that are counted as a single 'clause' construct by get_selector_constructs."""
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_fields(query) -> Optional[Set[str]]:
+    """
+    Returns dotted paths of all fields referenced by an elasticsearch query.
+
+    :param query: elasticsearch query (the content of the "query" element)
+    :return: set of field paths or None if the fields can not be determined (for example,
+             query_string query or a query type that is not known)
+    """
+    fields = set()
+
+    def add(field):
+        if not isinstance(field, str) or '*' in field:
+            raise ValueError('Unsupported field %s' % field)
+        fields.add(field)
+
+    def walk_queries(queries):
+        if isinstance(queries, dict):
+            queries = [queries]
+        for q in queries:
+            walk(q)
+
+    def walk(q):
+        if not isinstance(q, dict) or len(q) != 1:
+            raise ValueError('Unsupported query %s' % q)
+        query_type, definition = next(iter(q.items()))
+        if query_type in FIELD_KEY_QUERIES:
+            for field in definition:
+                if field not in QUERY_OPTIONS:
+                    add(field)
+        elif query_type == 'exists':
+            add(definition['field'])
+        elif query_type == 'multi_match':
+            for field in definition['fields']:
+                add(field.split('^')[0])
+        elif query_type == 'simple_query_string':
+            for field in definition['fields']:
+                add(field.split('^')[0])
+        elif query_type == 'bool':
+            for clause in ('must', 'filter', 'should', 'must_not'):
+                walk_queries(definition.get(clause, []))
+        elif query_type == 'constant_score':
+            walk(definition['filter'])
+        elif query_type == 'dis_max':
+            walk_queries(definition['queries'])
+        elif query_type == 'boosting':
+            walk(definition['positive'])
+            walk(definition['negative'])
+        elif query_type == 'nested':
+            add(definition['path'])
+            walk(definition['query'])
+        elif query_type in ('match_all', 'match_none', 'ids'):
+            pass
+        else:
+            raise ValueError('Unsupported query type %s' % query_type)
+
+    try:
+        walk(query)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return fields
+
+
+def get_field_sources(index_name):
+    """
+    Returns fields of the index mapping whose values are taken from other fields of the document.
+
+    :param index_name: name of the record index
+    :return: dict of dotted field path -> set of dotted paths of the source fields
+             (fields that are copied to the field via copy_to and targets of field aliases)
+    """
+    with open(current_search.mappings[index_name]) as f:
+        mapping = json.load(f)['mappings']
+    if 'properties' not in mapping:
+        # ES6-style mapping file
+        mapping = next(iter(mapping.values()))
+
+    ret = {}
+
+    def add_copy_to(path, definition):
+        copy_to = definition.get('copy_to', [])
+        if isinstance(copy_to, str):
+            copy_to = [copy_to]
+        for target in copy_to:
+            ret.setdefault(target, set()).add(path)
+
+    def walk(properties, prefix):
+        for name, definition in properties.items():
+            path = prefix + name
+            if definition.get('type') == 'alias':
+                ret.setdefault(path, set()).add(definition['path'])
+            add_copy_to(path, definition)
+            for subdefinition in definition.get('fields', {}).values():
+                add_copy_to(path, subdefinition)
+            walk(definition.get('properties', {}), path + '.')
+
+    walk(mapping.get('properties', {}), '')
+    return ret
+
+
+def expand_field_sources(fields: Iterable[str], field_sources) -> Set[str]:
+    """
+    Adds source fields of copy_to targets and aliases to a set of fields.
+
+    :param fields: dotted field paths
+    :param field_sources: result of get_field_sources
+    """
+    ret = set()
+    todo = list(fields)
+    while todo:
+        field = todo.pop()
+        if field in ret:
+            continue
+        ret.add(field)
+        todo.extend(field_sources.get(field, ()))
+    return ret
+
+
+def project_document(document, fields: Iterable[str]):
+    """
+    Returns a copy of the document containing only the given fields.
+
+    A path is followed as long as it exists in the document, so that a multi-field
+    (for example, "title.raw") keeps the whole "title" property.
+
+    :param document: json document
+    :param fields: dotted field paths
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split('.'):
+            node = node.setdefault(part, {})
+
+    def project(value, node):
+        if not node:
+            return value
+        if isinstance(value, dict):
+            return {
+                # keys with dots are ambiguous in elasticsearch, keep them as they are
+                k: project(v, node[k]) if k in node else v
+                for k, v in value.items()
+                if k in node or '.' in k
+            }
+        if isinstance(value, list):
+            return [project(x, node) for x in value]
+        return value
+
+    return project(document, tree)
+
+
+def get_selector_constructs(query) -> List[Tuple[str, str]]:
+    """
+    Returns constructs of an elasticsearch query that influence the cost of its percolation.
+
+    The constructs are 'clause' (a simple leaf query), 'wildcard', 'leading_wildcard', 'regexp',
+    'fuzzy', 'query_string' and 'script'. Their costs are set in INVENIO_EXPLICIT_ACLS_SELECTOR_COSTS.
+
+    :param query: elasticsearch query (the content of the "query" element)
+    :return: list of (construct, dotted path of the construct in the query)
+    """
+    constructs = []
+
+    def pattern_of(definition, *keys):
+        if isinstance(definition, dict):
+            for key in keys:
+                if key in definition:
+                    return str(definition[key])
+            return ''
+        return str(definition)
+
+    def field_patterns(definition, *keys):
+        for field, field_definition in definition.items():
+            if field not in QUERY_OPTIONS:
+                yield field, pattern_of(field_definition, *keys)
+
+    def walk(q, path):
+        if isinstance(q, list):
+            for idx, item in enumerate(q):
+                walk(item, '%s.%s' % (path, idx) if path else str(idx))
+            return
+        if not isinstance(q, dict):
+            return
+        for key, definition in q.items():
+            key_path = '%s.%s' % (path, key) if path else key
+            if key == 'script':
+                constructs.append(('script', key_path))
+            elif key == 'wildcard' and isinstance(definition, dict):
+                for field, pattern in field_patterns(definition, 'value', 'wildcard'):
+                    constructs.append(('leading_wildcard' if pattern[:1] in ('*', '?') else 'wildcard',
+                                       '%s.%s' % (key_path, field)))
+            elif key == 'regexp' and isinstance(definition, dict):
+                for field, _pattern in field_patterns(definition, 'value'):
+                    constructs.append(('regexp', '%s.%s' % (key_path, field)))
+            elif key == 'fuzzy' and isinstance(definition, dict):
+                for field, _pattern in field_patterns(definition, 'value'):
+                    constructs.append(('fuzzy', '%s.%s' % (key_path, field)))
+            elif key in ('query_string', 'simple_query_string') and isinstance(definition, dict):
+                constructs.append(('query_string', key_path))
+                terms = re.split(r'[\s():]+', str(definition.get('query', '')))
+                if definition.get('allow_leading_wildcard', True) and any(x[:1] in ('*', '?') for x in terms):
+                    constructs.append(('leading_wildcard', key_path))
+            elif key in LEAF_QUERIES and isinstance(definition, dict):
+                constructs.append(('clause', key_path))
+            else:
+                walk(definition, key_path)
+
+    walk(query, '')
+    return constructs
+
+
+def get_selector_cost(query) -> int:
+    """
+    Returns a static estimate of the cost of percolating the query.
+
+    It is the sum of costs (INVENIO_EXPLICIT_ACLS_SELECTOR_COSTS) of constructs found by get_selector_constructs.
+
+    :param query: elasticsearch query (the content of the "query" element)
+    """
+    costs = current_app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COSTS']
+    return sum(costs.get(construct, 1) for construct, _path in get_selector_constructs(query))
+
+
+def check_selector_cost(query) -> Optional[str]:
+    """
+    Applies INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY to a record selector that is about to be saved.
+
+    :param query: elasticsearch query (the content of the "query" element)
+    :return: a warning if the cost of the selector is above INVENIO_EXPLICIT_ACLS_SELECTOR_COST_THRESHOLD
+             and the policy is 'warn', None otherwise
+    :raises ValueError: if the cost of the selector is above the threshold and the policy is 'reject'
+    """
+    policy = current_app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY']
+    if not policy:
+        return None
+    cost = get_selector_cost(query)
+    threshold = current_app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_THRESHOLD']
+    if cost <= threshold:
+        return None
+    expensive = sorted({'%s at %s' % (construct, path) for construct, path in get_selector_constructs(query)
+                        if construct != 'clause'})
+    message = 'Record selector is too expensive to percolate (cost %s, allowed %s): %s' % (
+        cost, threshold, ', '.join(expensive) or 'too many clauses')
+    if policy == 'reject':
+        raise ValueError(message)
+    logger.warning(message)
+    return message
+
+
+def profile_selector(index_name, query):
+    """
+    Runs the query through elasticsearch validate and profile APIs against the record index.
+
+    :param index_name: name of the record index
+    :param query: elasticsearch query (the content of the "query" element)
+    :return: dict with keys 'valid', 'error' (explanation of an invalid query)
+             and 'time_in_nanos' (total query time over all shards, None for an invalid query)
+    """
+    validation = current_search_client.indices.validate_query(index=index_name, body={'query': query}, explain=True)
+    if not validation['valid']:
+        errors = [x['error'] for x in validation.get('explanations', []) if x.get('error')]
+        return {
+            'valid': False,
+            'error': '; '.join(errors) or validation.get('error', 'invalid query'),
+            'time_in_nanos': None
+        }
+    resp = current_search_client.search(index=index_name, body={'query': query, 'profile': True, 'size': 0})
+    return {
+        'valid': True,
+        'error': None,
+        'time_in_nanos': sum(
+            q['time_in_nanos']
+            for shard in resp['profile']['shards']
+            for search in shard['searches']
+            for q in search['query']
+        )
+    }
+
+
+__all__ = ('get_query_fields', 'get_field_sources', 'expand_field_sources', 'project_document',
+           'get_selector_constructs', 'get_selector_cost', 'check_selector_cost', 'profile_selector')
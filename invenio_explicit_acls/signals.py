@@ -25,21 +25,32 @@
 """Signal called to add cached ACLs to ES data."""
 from invenio_jsonschemas import current_jsonschemas
 
+from invenio_explicit_acls.api import PRINCIPAL_TOKENS_FIELD
+from invenio_explicit_acls.instrumentation import STAGE_SCHEMA, timed
 from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.utils import get_record_acl_enabled_schema
 
 
-def add_acls(app, json=None, index=None, record=None, doc_type=None, **kwargs):
-    """Signal handler that adds cached ACLs for all records that are ACL enabled."""
+def add_acls(app, json=None, index=None, record=None, doc_type=None, record_acls=None, **kwargs):
+    """
+    Signal handler that adds cached ACLs for all records that are ACL enabled.
+
+    If record_acls is passed (for example, by ACLRecordIndexer that resolves ACLs for a batch of records),
+    it is used instead of looking up the ACLs applicable to the record. Otherwise ACLs serialized
+    during the previous indexing are reused if the record fields that ACLs depend on have not changed.
+    """
     # prevent injection of explicit acls even in case of a schema that
     # is not enabled and when marshmallow is circumvented
     if '_invenio_explicit_acls' in json:
         del json['_invenio_explicit_acls']  # pragma no cover
+    if PRINCIPAL_TOKENS_FIELD in json:
+        del json[PRINCIPAL_TOKENS_FIELD]  # pragma no cover
 
-    schema = get_record_acl_enabled_schema(record)
+    with timed(STAGE_SCHEMA):
+        schema = get_record_acl_enabled_schema(record)
     if not schema:
         return  # pragma no cover
 
-    matching_acls = current_explicit_acls.get_record_acls(record)
-    acl_props = current_explicit_acls.serialize_record_acls(matching_acls, record=record)
-    json['_invenio_explicit_acls'] = acl_props
+    json['_invenio_explicit_acls'] = current_explicit_acls.get_serialized_record_acls(record, record_acls=record_acls)
+    if app.config['INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS']:
+        json[PRINCIPAL_TOKENS_FIELD] = current_explicit_acls.get_principal_tokens(json['_invenio_explicit_acls'])
@@ -26,17 +26,14 @@
 import datetime
 import logging
 
-import elasticsearch
 from celery import shared_task
-from invenio_indexer import current_record_to_index
-from invenio_indexer.api import RecordIndexer
-from invenio_records import Record
-from invenio_search import current_search_client
-from sqlalchemy.orm.exc import NoResultFound
 
-from invenio_explicit_acls.es import add_doc_type
+from invenio_explicit_acls.durability import after_write, \
+    get_write_kwargs, visibility_barrier
+from invenio_explicit_acls.es import iter_ids
+from invenio_explicit_acls.indexer import ACLRecordIndexer, \
+    get_records_in_chunks
 from invenio_explicit_acls.models import ACL
-from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.utils import schema_to_index
 
 logger = logging.getLogger(__name__)
@@ -59,61 +56,30 @@ def acl_changed_reindex(acl_id):
         # deleted in the meanwhile, so just return
         return          # pragma no cover
 
-    # make sure all indices are flushed so that no resource is obsolete in index
-    for schema in acl.schemas:
-        current_search_client.indices.refresh(index=schema_to_index(schema)[0])
-        current_search_client.indices.flush(index=schema_to_index(schema)[0])
+    # make sure all indexed resources are searchable so that no resource is obsolete in index
+    visibility_barrier(schema_to_index(schema)[0] for schema in acl.schemas)
 
-    indexer = RecordIndexer()
-    updated_count = 0
-    removed_count = 0
+    indexer = ACLRecordIndexer()
 
     indices_to_refresh = set()
-    for id in acl.get_matching_resources():
-        try:
-            rec = Record.get_record(id)
-            indices_to_refresh.add(current_record_to_index(rec)[0])
-        except:     # pragma no cover
-            # record removed in the meanwhile by another thread/process,
-            # indexer should have been called to remove it from ES
-            # won't test this so pragma no cover
-            continue
-        try:
-            indexer.index(rec)
-            updated_count += 1
-        except Exception as e:  # pragma no cover
-            logger.exception('Error indexing ACL for resource %s: %s', id, e)
+    updated_count, updated_errors = indexer.index_records(
+        get_records_in_chunks(acl.get_matching_resources(), indices_to_refresh),
+        es_bulk_kwargs={'raise_on_error': False, **get_write_kwargs()}
+    )
 
-    # refresh the indices
-    for index in indices_to_refresh:
-        current_search_client.indices.refresh(index=index)
-        current_search_client.indices.flush(index=index)
+    after_write(indices_to_refresh)
 
     indices_to_refresh = set()
     # reindex the resources those were indexed by this acl but no longer should be
-    for id in acl.used_in_records(older_than_timestamp=timestamp):
-        try:
-            rec = Record.get_record(id)
-            indices_to_refresh.add(current_record_to_index(rec)[0])
-        except NoResultFound:                           # pragma no cover
-            continue
-        except:                                         # pragma no cover
-            logger.exception('Unexpected exception in record reindexing')
-            continue
+    removed_count, removed_errors = indexer.index_records(
+        get_records_in_chunks(acl.used_in_records(older_than_timestamp=timestamp), indices_to_refresh),
+        es_bulk_kwargs={'raise_on_error': False, **get_write_kwargs()}
+    )
 
-        try:
-            removed_count += 1
-            indexer.index(rec)
-        except:     # pragma no cover
-            logger.exception('Error indexing ACL for obsolete resource %s', id)
-
-    # refresh the indices
-    for index in indices_to_refresh:
-        current_search_client.indices.refresh(index=index)
-        current_search_client.indices.flush(index=index)
+    after_write(indices_to_refresh)
 
-    logger.info('Reindexing finished for ACL=%s, acl applied to %s records, acl removed from %s records',
-                acl_id, updated_count, removed_count)
+    logger.info('Reindexing finished for ACL=%s, acl applied to %s records, acl removed from %s records, '
+                '%s records failed', acl_id, updated_count, removed_count, updated_errors + removed_errors)
 
 
 @shared_task(ignore_result=True)
@@ -132,7 +98,7 @@ def acl_deleted_reindex(schemas, acl_id):
         raise AttributeError('ACL with id %s is still in the database, '
                              'please remove it before calling current_explicit_acls.reindex_acl_removed' % acl_id)
 
-    indexer = RecordIndexer()
+    indexer = ACLRecordIndexer()
 
     query = {
         "nested": {
@@ -145,30 +111,23 @@ def acl_deleted_reindex(schemas, acl_id):
         }
     }
     removed_count = 0
+    failed_count = 0
+    indices_to_refresh = set()
+    visibility_barrier(schema_to_index(schema)[0] for schema in schemas)
     for schema in schemas:
-        current_search_client.indices.refresh(index=schema_to_index(schema)[0])
-        current_search_client.indices.flush(index=schema_to_index(schema)[0])
         try:
             index, doc_type = schema_to_index(schema)
 
-            for doc in elasticsearch.helpers.scan(
-                current_search_client,
-                query={
-                    "query": query,
-                    "_source": False,
-                },
-                index=index,
-                **add_doc_type(doc_type)
-            ):
-                try:
-                    indexer.index(Record.get_record(doc['_id']))
-                    removed_count += 1
-                except NoResultFound:                           # pragma no cover
-                    continue
-                except:                                         # pragma no cover
-                    logger.exception('Unexpected exception in record reindexing')
-                    continue
+            record_ids = iter_ids(index, query, doc_type)
+            indexed, errors = indexer.index_records(get_records_in_chunks(record_ids, indices_to_refresh),
+                                                    es_bulk_kwargs={'raise_on_error': False,
+                                                                    **get_write_kwargs()})
+            removed_count += indexed
+            failed_count += errors
         except:     # pragma no cover
             logger.exception('Error removing ACL from schema %s', schema)
 
-    logger.info('Reindexing finished for deleted ACL=%s, acl removed from %s records', acl_id, removed_count)
+    after_write(indices_to_refresh)
+
+    logger.info('Reindexing finished for deleted ACL=%s, acl removed from %s records, %s records failed',
+                acl_id, removed_count, failed_count)
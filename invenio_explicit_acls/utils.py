@@ -24,6 +24,7 @@
 #
 """Utility functions."""
 import json
+from itertools import islice
 
 from invenio_indexer.utils import default_record_to_index
 from invenio_jsonschemas import current_jsonschemas
@@ -130,3 +131,69 @@ def get_record_acl_enabled_schema(record):
         return  # pragma no cover
 
     return schema
+
+
+def json_pointer_to_path(pointer):
+    """
+    Converts a json pointer to a dotted path of elasticsearch field.
+
+    Array indices are left out, so "/owners/0/id" is converted to "owners.id".
+    """
+    parts = [
+        part.replace('~1', '/').replace('~0', '~')
+        for part in (pointer or '').split('/')[1:]
+    ]
+    return '.'.join(part for part in parts if not part.isdigit())
+
+
+def acl_priority(acl):
+    """Returns (priority, priority group) of an ACL."""
+    return acl.priority or 0, acl.priority_group
+
+
+def get_priority_floors(items, key=acl_priority, floors=None):
+    """
+    Returns the highest priority of the items in each priority group.
+
+    :param items:  iterable of ACLs or any other items
+    :param key:    see prune_by_priority
+    :param floors: already known highest priorities to be updated by the items
+    :return: dict of priority group -> priority
+    """
+    ret = dict(floors or {})
+    for item in items:
+        item_priority = key(item)
+        if item_priority is not None:
+            priority, group = item_priority
+            if group not in ret or priority > ret[group]:
+                ret[group] = priority
+    return ret
+
+
+def prune_by_priority(items, key=acl_priority, floors=None):
+    """
+    Keeps only the items with the highest priority within their priority group.
+
+    :param items:  iterable of ACLs or any other items
+    :param key:    function returning (priority, priority group) of an item or None if it is not known
+                   (such items are always kept). Defaults to priority and priority_group of an ACL
+    :param floors: dict of priority group -> priority of an ACL that is already known to be applicable,
+                   items with a lower priority in the group are dropped
+    :return: list of the kept items in their original order
+    """
+    items = [(item, key(item)) for item in items]
+    max_priorities = get_priority_floors(items, key=lambda x: x[1], floors=floors)
+    return [
+        item for item, item_priority in items
+        if item_priority is None or item_priority[0] >= max_priorities[item_priority[1]]
+    ]
+
+
+def chunked(iterable, size):
+    """Splits iterable into lists of at most size items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
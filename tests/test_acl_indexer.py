@@ -0,0 +1,131 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_acl_indexer.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from helpers import clear_timestamp, create_record
+from invenio_search import RecordsSearch, current_search_client
+
+from invenio_explicit_acls.acls import DefaultACL, ElasticsearchACL
+from invenio_explicit_acls.actors import UserActor
+from invenio_explicit_acls.indexer import ACLRecordIndexer
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+from invenio_explicit_acls.utils import schema_to_index
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_get_records_acls(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+    with db.session.begin_nested():
+        default_acl = DefaultACL(name='default', schemas=[RECORD_SCHEMA],
+                                 priority=0, operation='get', originator=test_users.u1)
+        db.session.add(default_acl)
+        es_acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                                  priority=1, operation='get', originator=test_users.u1,
+                                  record_selector={'term': {
+                                      'keywords': 'blah'
+                                  }})
+        db.session.add(es_acl)
+    es_acl.update()
+
+    acls = current_explicit_acls.get_records_acls([record, record1])
+    assert {k: [x.id for x in v] for k, v in acls.items()} == {
+        str(record.id): [es_acl.id],
+        str(record1.id): [default_acl.id],
+    }
+
+
+def test_index_records(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+        u = UserActor(name='test', acl=acl, originator=test_users.u1, users=[test_users.u1])
+        db.session.add(u)
+    acl.update()
+
+    assert ACLRecordIndexer(acl_chunk_size=1).index_records([record, record1]) == (2, 0)
+    current_search_client.indices.refresh()
+
+    retrieved = RecordsSearch(index=schema_to_index(RECORD_SCHEMA)[0]).get_record(record.id).execute().hits[0].to_dict()
+    assert clear_timestamp(retrieved['_invenio_explicit_acls']) == [{'id': str(acl.id),
+                                                                     'operation': 'get',
+                                                                     'timestamp': 'cleared',
+                                                                     'user': [1]}]
+    retrieved = RecordsSearch(index=schema_to_index(RECORD_SCHEMA)[0]).get_record(record1.id).execute().hits[0].to_dict()
+    assert retrieved['_invenio_explicit_acls'] == []
+
+
+def test_reuse_serialized_record_acls(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah'], 'title': 'a title'},
+                                clz=SchemaEnforcingRecord)
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+        u = UserActor(name='test', acl=acl, originator=test_users.u1, users=[test_users.u1])
+        db.session.add(u)
+
+    # uncommitted ACL changes are never reused
+    assert current_explicit_acls.get_record_fingerprint(record) is None
+    db.session.commit()
+    acl.update()
+
+    assert current_explicit_acls.get_record_dependencies(schema_to_index(RECORD_SCHEMA)[0]) == {
+        '$schema', 'keywords'
+    }
+    assert not current_explicit_acls.has_serialized_record_acls(record)
+    serialized = current_explicit_acls.get_serialized_record_acls(record)
+    assert clear_timestamp(serialized) == [{'id': str(acl.id),
+                                            'operation': 'get',
+                                            'timestamp': 'cleared',
+                                            'user': [1]}]
+    assert current_explicit_acls.has_serialized_record_acls(record)
+
+    # change of a field that no ACL looks at
+    record['title'] = 'another title'
+    assert current_explicit_acls.has_serialized_record_acls(record)
+    assert current_explicit_acls.get_serialized_record_acls(record) is serialized
+
+    # change of a field referenced by a selector
+    record['keywords'] = ['test']
+    assert not current_explicit_acls.has_serialized_record_acls(record)
+    assert current_explicit_acls.get_serialized_record_acls(record) == []
+
+    # change of ACLs
+    record['keywords'] = ['blah']
+    assert current_explicit_acls.has_serialized_record_acls(record) is False
+    current_explicit_acls.get_serialized_record_acls(record)
+    assert current_explicit_acls.has_serialized_record_acls(record)
+    current_explicit_acls.acl_changed()
+    assert not current_explicit_acls.has_serialized_record_acls(record)
@@ -0,0 +1,236 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_acl_matcher.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from collections import namedtuple
+from unittest import mock
+
+from helpers import create_record
+
+from invenio_explicit_acls.acls import DefaultACL, IdACL, PropertyValueACL
+from invenio_explicit_acls.acls.propertyvalue_acls import BoolOperation, \
+    MatchOperation, PropertyValue, PropertyValueTerm
+from invenio_explicit_acls.matcher import PropertyValueIndex, \
+    _get_field_types
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+FakeACL = namedtuple('FakeACL', 'id property_values')
+FakeProperty = namedtuple('FakeProperty', 'name value match_operation bool_operation')
+
+FIELD_TYPES = {
+    'keywords': ('keyword', 'keywords'),
+    'count': ('integer', 'count'),
+    'contributors.role': ('keyword', 'contributors.role'),
+    'title': ('text', 'title'),
+}
+
+
+def prop(name, value, bool_operation=BoolOperation.must, match_operation=MatchOperation.term):
+    return FakeProperty(name, value, match_operation, bool_operation)
+
+
+def test_property_value_index():
+    index = PropertyValueIndex(FIELD_TYPES)
+    assert index.compile(FakeACL('must', [prop('keywords', 'blah'), prop('count', '5')]))
+    assert index.compile(FakeACL('should', [prop('keywords', 'a', BoolOperation.should),
+                                            prop('contributors.role', 'author', BoolOperation.should)]))
+    assert index.compile(FakeACL('must_not', [prop('keywords', 'blah', BoolOperation.mustNot)]))
+    assert index.compile(FakeACL('all', []))
+
+    # not supported in memory
+    assert not index.compile(FakeACL('match', [prop('keywords', 'blah', match_operation=MatchOperation.match)]))
+    assert not index.compile(FakeACL('text', [prop('title', 'blah')]))
+    assert not index.compile(FakeACL('unknown', [prop('unknown', 'blah')]))
+    assert not index.compile(FakeACL('must_should', [prop('keywords', 'blah'),
+                                                     prop('keywords', 'a', BoolOperation.should)]))
+
+    assert sorted(index.match({'keywords': ['blah'], 'count': 5})) == ['all', 'must']
+    assert sorted(index.match({'keywords': ['blah', 'a'], 'count': 4})) == ['all', 'should']
+    assert sorted(index.match({'contributors': [{'role': 'editor'}, {'role': 'author'}]})) == \
+        ['all', 'must_not', 'should']
+    assert sorted(index.match({})) == ['all', 'must_not']
+
+
+def test_acl_matcher(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        default_acl = DefaultACL(name='default', schemas=[RECORD_SCHEMA],
+                                 priority=0, operation='get', originator=test_users.u1)
+        db.session.add(default_acl)
+        id_acl = IdACL(name='id', schemas=[RECORD_SCHEMA], record_id=str(record1.id),
+                       priority=0, operation='get', originator=test_users.u1)
+        db.session.add(id_acl)
+        pv_acl = PropertyValueACL(name='pv', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='keywords', value='blah', acl=pv_acl, originator=test_users.u1))
+
+    # matcher is not used until the changes are committed
+    assert current_explicit_acls.acl_matcher is None
+    db.session.commit()
+    pv_acl.update()
+
+    matcher = current_explicit_acls.acl_matcher
+    assert matcher.get_default_acl_ids(record) == [default_acl.id]
+    assert matcher.get_id_acl_ids(record) == []
+    assert matcher.get_id_acl_ids(record1) == [id_acl.id]
+    assert matcher.get_property_value_acl_ids(record) == [pv_acl.id]
+    assert matcher.get_property_value_acl_ids(record1) == []
+    assert not matcher.needs_percolation('records-record-v1.0.0')
+
+    assert [x.id for x in PropertyValueACL.get_record_acls(record)] == [pv_acl.id]
+    assert [x.id for x in IdACL.get_record_acls(record1)] == [id_acl.id]
+    assert [x.id for x in DefaultACL.get_record_acls(record1)] == [default_acl.id]
+    assert PropertyValueACL._get_percolate_query(record)['query']['bool']['must_not'] == [
+        {'ids': {'values': [pv_acl.id]}}
+    ]
+
+
+def test_acl_matcher_copy_to(app, db, es, es_acl_prepare, test_users):
+    field_types = _get_field_types('records-record-v1.0.0')
+    assert field_types['subjects'] == ('keyword', 'subjects')
+    # copy_to target has no value in the record source
+    assert 'all_subjects' not in field_types
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'subjects': ['physics']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        pv_acl = PropertyValueACL(name='pv', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='all_subjects', value='physics', acl=pv_acl, originator=test_users.u1))
+    db.session.commit()
+    pv_acl.update()
+
+    matcher = current_explicit_acls.acl_matcher
+    assert matcher.get_property_value_acl_ids(record) == []
+    assert matcher.needs_percolation('records-record-v1.0.0')
+    assert [x.id for x in PropertyValueACL.get_record_acls(record)] == [pv_acl.id]
+
+
+def test_property_value_term_index(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test', 'other']},
+                                  clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        pv_acl = PropertyValueACL(name='pv', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='keywords', value='test', acl=pv_acl, originator=test_users.u1))
+        db.session.add(PropertyValue(name='keywords', value='other', acl=pv_acl, originator=test_users.u1,
+                                     bool_operation=BoolOperation.mustNot))
+        pv_acl2 = PropertyValueACL(name='pv2', schemas=[RECORD_SCHEMA],
+                                   priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl2)
+        db.session.add(PropertyValue(name='keywords', value='blah', acl=pv_acl2, originator=test_users.u1,
+                                     bool_operation=BoolOperation.should))
+        db.session.add(PropertyValue(name='keywords', value='test', acl=pv_acl2, originator=test_users.u1,
+                                     bool_operation=BoolOperation.should))
+
+    assert sorted((x.schema, x.name, x.value, x.operation) for x in pv_acl.terms) == [
+        (RECORD_SCHEMA, 'keywords', 'other', 'must_not'),
+        (RECORD_SCHEMA, 'keywords', 'test', 'must'),
+    ]
+
+    # the in-memory matcher is not used with uncommitted changes, term index is used instead
+    assert current_explicit_acls.acl_matcher is None
+    assert PropertyValueTerm.match_records([record, record1]) == {
+        str(record.id): [pv_acl2.id],
+        str(record1.id): [pv_acl2.id],
+    }
+    assert not PropertyValueTerm.has_percolated_acls('records-record-v1.0.0')
+    assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == {pv_acl.id, pv_acl2.id}
+    assert PropertyValueACL._get_percolate_query(record)['query']['bool']['must_not'] == [
+        {'ids': {'values': sorted([pv_acl.id, pv_acl2.id])}}
+    ]
+
+    # changing a property value reindexes the ACL
+    with db.session.begin_nested():
+        for prop in pv_acl.property_values:
+            if prop.bool_operation == BoolOperation.mustNot:
+                prop.value = 'unknown'
+    assert sorted(PropertyValueTerm.match_records([record1])[str(record1.id)]) == sorted([pv_acl.id, pv_acl2.id])
+
+    # ACLs with match operation are percolated
+    with db.session.begin_nested():
+        db.session.add(PropertyValue(name='title', value='blah', acl=pv_acl2, originator=test_users.u1,
+                                     match_operation=MatchOperation.match))
+    assert [(x.name, x.operation) for x in pv_acl2.terms] == [(None, PropertyValueTerm.PERCOLATE)]
+    assert PropertyValueTerm.has_percolated_acls('records-record-v1.0.0')
+    assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == {pv_acl.id}
+    assert PropertyValueTerm.match_records([record])[str(record.id)] == []
+
+    with db.session.begin_nested():
+        for prop in pv_acl.property_values:
+            db.session.delete(prop)
+        db.session.delete(pv_acl)
+    assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == set()
+
+
+def test_property_value_term_index_copy_to(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'subjects': ['physics']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        pv_acl = PropertyValueACL(name='pv', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='all_subjects', value='physics', acl=pv_acl, originator=test_users.u1))
+    pv_acl.update()
+
+    # the value of a copy_to target is not in the record, so the ACL must be percolated
+    assert current_explicit_acls.acl_matcher is None
+    assert [(x.name, x.operation) for x in pv_acl.terms] == [(None, PropertyValueTerm.PERCOLATE)]
+    assert PropertyValueTerm.has_percolated_acls('records-record-v1.0.0')
+    assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == set()
+    assert [x.id for x in PropertyValueACL.get_record_acls(record)] == [pv_acl.id]
+
+
+def test_property_value_term_index_cached(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        pv_acl = PropertyValueACL(name='pv', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='keywords', value='test', acl=pv_acl, originator=test_users.u1))
+    db.session.commit()
+
+    with mock.patch.object(PropertyValueTerm, '_load_index_acl_ids',
+                           wraps=PropertyValueTerm._load_index_acl_ids) as load_index_acl_ids:
+        assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == {pv_acl.id}
+        assert not PropertyValueTerm.has_percolated_acls('records-record-v1.0.0')
+        assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == {pv_acl.id}
+        assert load_index_acl_ids.call_count == 1
+
+        # committed ACL changes invalidate the cached ids
+        with db.session.begin_nested():
+            db.session.add(PropertyValue(name='title', value='blah', acl=pv_acl, originator=test_users.u1,
+                                         match_operation=MatchOperation.match))
+        db.session.commit()
+        assert PropertyValueTerm.get_indexed_acl_ids('records-record-v1.0.0') == set()
+        assert PropertyValueTerm.has_percolated_acls('records-record-v1.0.0')
+        assert load_index_acl_ids.call_count == 2
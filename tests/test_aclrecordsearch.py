@@ -24,21 +24,24 @@
 #
 import json
 import uuid
+from unittest import mock
 
 from elasticsearch_dsl.query import Ids
 from flask import current_app
 from flask_login import current_user, login_user, logout_user
 from flask_principal import Identity, identity_changed
+from flask_security import AnonymousUser
 from helpers import clear_timestamp, get_json, login, records_url, set_identity
-from invenio_access import authenticated_user
+from invenio_access import any_user, authenticated_user
 from invenio_indexer.api import RecordIndexer
 from invenio_pidstore.minters import recid_minter
 from invenio_pidstore.models import PersistentIdentifier
-from invenio_search import current_search_client
+from invenio_search import RecordsSearch, current_search_client
 
 from invenio_explicit_acls.acl_records_search import ACLDefaultFilter, \
     ACLRecordsSearch
 from invenio_explicit_acls.acls import DefaultACL, ElasticsearchACL
+from invenio_explicit_acls.cache import LocalCache
 from invenio_explicit_acls.actors import SystemRoleActor, UserActor
 from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.record import SchemaEnforcingRecord
@@ -260,3 +263,134 @@ def test_aclrecordsearch_explicit_user(app, db, es, es_acl_prepare, test_users):
         'system_roles': [authenticated_user]
     }).get_record(rec.id).execute())
     assert hits == []
+
+
+def test_acl_search_filter_cache(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    context = {'system_roles': ['authenticated_user']}
+    acl_filter = ACLDefaultFilter()
+
+    with mock.patch.object(ACLDefaultFilter, '_build_query', autospec=True,
+                           side_effect=ACLDefaultFilter._build_query) as build_query:
+        query = acl_filter.create_query(user=test_users.u3, context=context)
+        assert acl_filter.create_query(user=test_users.u3, context=context) == query
+        assert build_query.call_count == 1
+
+        # different system roles and operations get a different filter
+        acl_filter.create_query(user=test_users.u3, context={'system_roles': ['any_user']})
+        acl_filter.create_query(operation='update', user=test_users.u3, context=context)
+        assert build_query.call_count == 3
+
+        # filter is compiled again when role memberships change
+        test_users.u3.roles.append(test_users.r1)
+        db.session.commit()
+        query = acl_filter.create_query(user=test_users.u3, context=context)
+        assert build_query.call_count == 4
+        actor_queries = query.to_dict()['bool']['should'][0]['nested']['query']['bool']['must'][1]['bool']['should']
+        role_queries = [x['terms']['_invenio_explicit_acls.role'] for x in actor_queries
+                        if '_invenio_explicit_acls.role' in x.get('terms', {})]
+        assert role_queries
+        for role_ids in role_queries:
+            assert sorted(role_ids) == sorted([test_users.r1.id, test_users.r2.id])
+
+
+def test_principal_tokens(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_PRINCIPAL_TOKENS'] = True
+    current_explicit_acls.prepare(RECORD_SCHEMA)
+
+    with db.session.begin_nested():
+        acl1 = DefaultACL(name='get', schemas=[RECORD_SCHEMA],
+                          priority=0, operation='get', originator=test_users.u1)
+        actor1 = UserActor(name='u1', acl=acl1, users=[test_users.u1], originator=test_users.u1)
+        acl2 = DefaultACL(name='update', schemas=[RECORD_SCHEMA],
+                          priority=0, operation='update', originator=test_users.u1)
+        actor2 = SystemRoleActor(name='auth', acl=acl2, system_role='authenticated_user',
+                                 originator=test_users.u1)
+        db.session.add_all([acl1, actor1, acl2, actor2])
+
+    current_explicit_acls.reindex_acl(acl1, delayed=False)
+    current_explicit_acls.reindex_acl(acl2, delayed=False)
+
+    record_uuid = uuid.uuid4()
+    data = {'title': 'blah', 'contributors': [], 'keywords': ['blah']}
+    recid_minter(record_uuid, data)
+    rec = SchemaEnforcingRecord.create(data, id_=record_uuid)
+    RecordIndexer().index(rec)
+
+    current_search_client.indices.refresh()
+    current_search_client.indices.flush()
+
+    indexed = RecordsSearch(index=schema_to_index(RECORD_SCHEMA)[0]).get_record(rec.id).execute().hits[0].to_dict()
+    assert indexed['_invenio_explicit_acls_tokens'] == [
+        'get|u:%s' % test_users.u1.id,
+        'update|s:authenticated_user'
+    ]
+
+    context = {'system_roles': ['authenticated_user']}
+    query = ACLDefaultFilter(['get', 'update']).create_query(user=test_users.u1, context=context)
+    principals = ['r:%s' % test_users.r1.id, 's:authenticated_user', 'u:%s' % test_users.u1.id]
+    assert query.to_dict() == {
+        'bool': {
+            'should': [
+                {
+                    'terms': {
+                        '_name': 'invenio_explicit_acls_match_get',
+                        '_invenio_explicit_acls_tokens': ['get|%s' % x for x in principals]
+                    }
+                },
+                {
+                    'terms': {
+                        '_name': 'invenio_explicit_acls_match_update',
+                        '_invenio_explicit_acls_tokens': ['update|%s' % x for x in principals]
+                    }
+                }
+            ],
+            'minimum_should_match': 1
+        }
+    }
+
+    hits = list(ACLRecordsSearch(user=test_users.u1, context=context).get_record(rec.id).execute())
+    assert [x.meta.id for x in hits] == [str(rec.id)]
+
+    hits = list(ACLRecordsSearch(user=test_users.u2, context=context).get_record(rec.id).execute())
+    assert hits == []
+
+    hits = list(ACLRecordsSearch(operation='update', user=test_users.u2, context=context)
+                .get_record(rec.id).execute())
+    assert [x.meta.id for x in hits] == [str(rec.id)]
+
+
+def test_acl_search_filter_key_anonymous(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    anonymous = AnonymousUser()
+    key = current_explicit_acls.get_search_filter_key(anonymous, ['get'], {'system_roles': [any_user]})
+    assert key[:3] == (None, ('any_user',), ('get',))
+    # system roles of the context are part of the key for anonymous users as well
+    assert current_explicit_acls.get_search_filter_key(
+        anonymous, ['get'], {'system_roles': [any_user, 'campus']})[:3] == (None, ('any_user', 'campus'), ('get',))
+
+
+def test_acl_search_filter_key_actor_state(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    context = {'system_roles': ['authenticated_user']}
+    key = current_explicit_acls.get_search_filter_key(test_users.u1, ['get'], context)
+    assert key is not None
+
+    # user state an actor type depends on is a part of the key
+    with mock.patch.object(SystemRoleActor, 'get_user_cache_key', return_value=('campus',)):
+        state_key = current_explicit_acls.get_search_filter_key(test_users.u1, ['get'], context)
+    assert state_key is not None
+    assert state_key != key
+
+    # an actor type that can not describe the state disables the cache
+    with mock.patch.object(SystemRoleActor, 'get_user_cache_key', return_value=None):
+        assert current_explicit_acls.get_search_filter_key(test_users.u1, ['get'], context) is None
+
+
+def test_local_cache_timeout():
+    cache = LocalCache(10, timeout=60)
+    with mock.patch('invenio_explicit_acls.cache.time.monotonic', return_value=1000):
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+    with mock.patch('invenio_explicit_acls.cache.time.monotonic', return_value=1061):
+        assert cache.get('a') is None
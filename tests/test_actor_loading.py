@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_actor_loading.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from contextlib import contextmanager
+
+from helpers import create_record
+from sqlalchemy import event
+
+from invenio_explicit_acls.acls import DefaultACL
+from invenio_explicit_acls.actors import RoleActor, SystemRoleActor, \
+    UserActor
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+@contextmanager
+def count_statements(db):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_preloaded_actors(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        for priority in range(5):
+            acl = DefaultACL(name='default', schemas=[RECORD_SCHEMA], priority=0,
+                             originator=test_users.u1, operation='op%s' % priority)
+            db.session.add(acl)
+            db.session.add(UserActor(name='user', users=[test_users.u1, test_users.u2], acl=acl,
+                                     originator=test_users.u1))
+            db.session.add(RoleActor(name='role', roles=[test_users.r1], acl=acl, originator=test_users.u1))
+            db.session.add(SystemRoleActor(name='auth', system_role='authenticated_user', acl=acl,
+                                           originator=test_users.u1))
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    db.session.commit()
+
+    # build the cached matcher and schemas, then make sure actors are loaded again
+    for acl in current_explicit_acls.get_record_acls(record):
+        db.session.expire(acl)
+
+    with count_statements(db) as statements:
+        acls = current_explicit_acls.get_record_acls(record)
+        serialized = current_explicit_acls.serialize_record_acls(acls, record=record)
+
+    assert len(statements) <= len(current_explicit_acls.acl_models) + 3
+    assert len(serialized) == 5
+    for acl in serialized:
+        assert sorted(acl['user']) == [1, 2]
+        assert acl['role'] == [test_users.r1.id]
+        assert acl['system_role'] == ['authenticated_user']
+
+
+def test_lazy_actors(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_ACTOR_LOADING'] = 'lazy'
+    with db.session.begin_nested():
+        acl = DefaultACL(name='default', schemas=[RECORD_SCHEMA], priority=0,
+                         originator=test_users.u1, operation='get')
+        db.session.add(acl)
+        db.session.add(UserActor(name='user', users=[test_users.u1], acl=acl, originator=test_users.u1))
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    acls = current_explicit_acls.get_record_acls(record)
+    assert [x['user'] for x in current_explicit_acls.serialize_record_acls(acls, record=record)] == [[1]]
@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_audience.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from unittest import mock
+
+from helpers import create_record
+
+from invenio_explicit_acls.acls import DefaultACL
+from invenio_explicit_acls.actors import RecordUserActor, RoleActor, \
+    SystemRoleActor, UserActor
+from invenio_explicit_acls.audience import Audience
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_record_audience(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        acl = DefaultACL(name='get', schemas=[RECORD_SCHEMA], priority=0, operation='get',
+                         originator=test_users.u1)
+        db.session.add(acl)
+        db.session.add(UserActor(name='user', users=[test_users.u1], acl=acl, originator=test_users.u1))
+        db.session.add(RoleActor(name='role', roles=[test_users.r2], acl=acl, originator=test_users.u1))
+        acl1 = DefaultACL(name='update', schemas=[RECORD_SCHEMA], priority=0, operation='update',
+                          originator=test_users.u1)
+        db.session.add(acl1)
+        db.session.add(SystemRoleActor(name='auth', system_role='authenticated_user', acl=acl1,
+                                       originator=test_users.u1))
+        db.session.add(RecordUserActor(name='owner', path='/owner', acl=acl1, originator=test_users.u1))
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'owner': test_users.u3.id}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'owner': test_users.u2.id}, clz=SchemaEnforcingRecord)
+
+    audience = current_explicit_acls.get_record_audience(record, 'get')
+    assert audience == Audience({test_users.u1.id, test_users.u2.id, test_users.u3.id})
+    assert not audience.everyone
+
+    assert current_explicit_acls.get_records_audience([record, record1], 'update') == {
+        str(record.id): Audience({test_users.u3.id}, {'authenticated_user'}),
+        str(record1.id): Audience({test_users.u2.id}, {'authenticated_user'}),
+    }
+    assert current_explicit_acls.get_record_audience(record, 'update').includes(test_users.u1.id)
+    assert current_explicit_acls.get_record_audience(record, 'delete') == Audience()
+
+
+def test_record_audience_priority(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        acl = DefaultACL(name='low', schemas=[RECORD_SCHEMA], priority=0, operation='get',
+                         originator=test_users.u1)
+        db.session.add(acl)
+        db.session.add(SystemRoleActor(name='any', system_role='any_user', acl=acl, originator=test_users.u1))
+        acl1 = DefaultACL(name='high', schemas=[RECORD_SCHEMA], priority=1, operation='get',
+                          originator=test_users.u1)
+        db.session.add(acl1)
+        db.session.add(UserActor(name='user', users=[test_users.u2], acl=acl1, originator=test_users.u1))
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    assert current_explicit_acls.get_record_audience(record, 'get') == Audience({test_users.u2.id})
+
+
+def test_record_audience_cache(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_CACHE_AUDIENCE'] = True
+    with db.session.begin_nested():
+        acl = DefaultACL(name='get', schemas=[RECORD_SCHEMA], priority=0, operation='get',
+                         originator=test_users.u1)
+        db.session.add(acl)
+        actor = UserActor(name='user', users=[test_users.u1], acl=acl, originator=test_users.u1)
+        db.session.add(actor)
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    db.session.commit()
+
+    state = current_explicit_acls._get_current_object()
+    with mock.patch.object(state, 'get_records_acls', wraps=state.get_records_acls) as get_records_acls:
+        assert current_explicit_acls.get_record_audience(record, 'get') == Audience({test_users.u1.id})
+        assert current_explicit_acls.get_record_audience(record, 'get') == Audience({test_users.u1.id})
+        assert get_records_acls.call_count == 1
+
+        # changing an actor changes the ACL generation, so the audience is recomputed
+        actor.users = [test_users.u2]
+        db.session.commit()
+        assert current_explicit_acls.get_record_audience(record, 'get') == Audience({test_users.u2.id})
+        assert get_records_acls.call_count == 2
+
+
+def test_record_audience_cache_roles(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_CACHE_AUDIENCE'] = True
+    with db.session.begin_nested():
+        acl = DefaultACL(name='get', schemas=[RECORD_SCHEMA], priority=0, operation='get',
+                         originator=test_users.u1)
+        db.session.add(acl)
+        db.session.add(RoleActor(name='role', roles=[test_users.r2], acl=acl, originator=test_users.u1))
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    db.session.commit()
+
+    assert current_explicit_acls.get_record_audience(record, 'get') == \
+        Audience({test_users.u2.id, test_users.u3.id})
+
+    # role memberships are not ACL changes, the cached audience must be recomputed anyway
+    test_users.u1.roles.append(test_users.r2)
+    db.session.commit()
+    assert current_explicit_acls.get_record_audience(record, 'get') == \
+        Audience({test_users.u1.id, test_users.u2.id, test_users.u3.id})
+
+    test_users.u3.roles.remove(test_users.r2)
+    db.session.commit()
+    assert current_explicit_acls.get_record_audience(record, 'get') == \
+        Audience({test_users.u1.id, test_users.u2.id})
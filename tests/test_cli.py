@@ -47,7 +47,7 @@ def test_version():
 
 
 def test_prepare(app, db, es, es_acl_prepare):
-    assert 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0' in current_search_client.indices.get('*')
+    assert current_search_client.indices.exists_alias(name='invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0')
     mapping = current_search_client.indices.get_mapping('records-record-v1.0.0')
     assert len(mapping) == 1
     key = list(mapping.keys())[0]
@@ -72,7 +72,7 @@ def test_cli_prepare(app, db, es, capsys):
     captured = capsys.readouterr()
     assert captured.out.strip() == ''
     assert captured.err.strip() == ''
-    assert 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0' in current_search_client.indices.get('*')
+    assert current_search_client.indices.exists_alias(name='invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0')
     mapping = current_search_client.indices.get_mapping('records-record-v1.0.0')
     assert len(mapping) == 1
     key = list(mapping.keys())[0]
@@ -127,6 +127,60 @@ Adding 1 records to indexing queue""".strip() % (acl.id)
                                                                      'user': [1]}]
 
 
+def test_cli_rebuild_percolators(app, db, es, capsys, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+    acl.update()
+
+    alias = ElasticsearchACL.get_acl_index_name(schema_to_index(RECORD_SCHEMA)[0])
+    old_indices = set(current_search_client.indices.get_alias(name=alias).keys())
+
+    from invenio_explicit_acls.cli import rebuild_percolators_impl
+    rebuild_percolators_impl([RECORD_SCHEMA])
+    captured = capsys.readouterr()
+
+    new_indices = set(current_search_client.indices.get_alias(name=alias).keys())
+    assert len(new_indices) == 1
+    assert not (new_indices & old_indices)
+    assert captured.out.strip() == 'Percolator index for schema %s rebuilt as %s' % (
+        RECORD_SCHEMA, list(new_indices)[0])
+    for idx in old_indices:
+        assert not current_search_client.indices.exists(index=idx)
+
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record)] == [acl.id]
+
+
+def test_cli_rebuild_unversioned_percolator(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+
+    # simulate a percolator index created by an older version of the library
+    index = schema_to_index(RECORD_SCHEMA)[0]
+    alias = ElasticsearchACL.get_acl_index_name(index)
+    current_search_client.indices.delete(index=','.join(current_search_client.indices.get_alias(name=alias)))
+    current_search_client.indices.create(index=alias, body=ElasticsearchACL._get_acl_index_body(index))
+
+    # prepare keeps the unversioned index untouched
+    current_explicit_acls.prepare(RECORD_SCHEMA)
+    assert not current_search_client.indices.exists_alias(name=alias)
+
+    ElasticsearchACL.rebuild_schema_acls(RECORD_SCHEMA)
+    assert current_search_client.indices.exists_alias(name=alias)
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record)] == [acl.id]
+
+
 def normalize(x):
     ret = [line.strip() for line in x.split('\n')]
     ret = [line for line in ret if '"timestamp"' not in line]
@@ -22,6 +22,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import pytest
+
 from helpers import create_record
 from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search_client
@@ -50,6 +52,25 @@ def test_default_acl_get_record_acl(app, db, es, es_acl_prepare, test_users):
     assert acls[0].id == acl.id
 
 
+def test_default_acl_get_records_acls(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=[RECORD_SCHEMA],
+                         priority=0, operation='get', originator=test_users.u1)
+        db.session.add(acl)
+        acl2 = DefaultACL(name='test 2', schemas=[ANOTHER_SCHEMA],
+                          priority=0, operation='get', originator=test_users.u1)
+        db.session.add(acl2)
+
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+
+    acls = DefaultACL.get_records_acls([record, record1])
+    assert {k: [x.id for x in v] for k, v in acls.items()} == {
+        str(record.id): [acl.id],
+        str(record1.id): [acl.id],
+    }
+
+
 def test_default_acl_prepare_schema_acl(app, db, es, es_acl_prepare, test_users):
     # should pass as it does nothing
     DefaultACL.prepare_schema_acls(RECORD_SCHEMA)
@@ -70,6 +91,30 @@ def test_default_acl_get_matching_resources(app, db, es, es_acl_prepare, test_us
     assert ids[0] == str(pid.object_uuid)
 
 
+@pytest.mark.parametrize('slices', [1, 3])
+def test_default_acl_get_all_matching_resources(app, db, es, es_acl_prepare, test_users, slices):
+    pids = []
+    for i in range(15):
+        pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+        RecordIndexer().index(record)
+        pids.append(pid)
+    current_search_client.indices.refresh()
+
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=[RECORD_SCHEMA],
+                         priority=0, operation='get', originator=test_users.u1)
+        db.session.add(acl)
+
+    app.config['INVENIO_EXPLICIT_ACLS_SCAN_SLICES'] = slices
+    app.config['INVENIO_EXPLICIT_ACLS_SCAN_PAGE_SIZE'] = 4
+    try:
+        ids = list(acl.get_matching_resources())
+    finally:
+        app.config['INVENIO_EXPLICIT_ACLS_SCAN_SLICES'] = 1
+        app.config['INVENIO_EXPLICIT_ACLS_SCAN_PAGE_SIZE'] = 1000
+    assert sorted(ids) == sorted(str(pid.object_uuid) for pid in pids)
+
+
 def test_default_acl_update(app, db, es, es_acl_prepare, test_users):
     # should pass as it does nothing
     with db.session.begin_nested():
@@ -33,6 +33,8 @@ from invenio_search import current_search_client
 
 from helpers import create_record
 from invenio_explicit_acls.acls import ElasticsearchACL
+from invenio_explicit_acls.durability import get_durability_policy
+from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.record import SchemaEnforcingRecord
 from invenio_explicit_acls.utils import schema_to_index
 
@@ -71,13 +73,210 @@ def test_elasticsearch_acl_get_record_acl(app, db, es, es_acl_prepare, test_user
     assert acls[0].id == acl.id
 
 
+def test_elasticsearch_acl_get_records_acls(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+    pid2, record2 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah', 'test']},
+                                  clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+        acl1 = ElasticsearchACL(name='test 1', schemas=[RECORD_SCHEMA],
+                                priority=0, operation='get', originator=test_users.u1,
+                                record_selector={'term': {
+                                    'keywords': 'test'
+                                }})
+        db.session.add(acl1)
+
+    acl.update()
+    acl1.update()
+
+    acls = ElasticsearchACL.get_records_acls([record, record1, record2])
+    assert {k: sorted(x.id for x in v) for k, v in acls.items()} == {
+        str(record.id): [acl.id],
+        str(record1.id): [acl1.id],
+        str(record2.id): sorted([acl.id, acl1.id]),
+    }
+
+
+def test_elasticsearch_acl_get_all_matching_acls(app, db, es, es_acl_prepare, test_users):
+    # more ACLs than the default ES page (10) and than the configured percolate page size
+    current_app.config['INVENIO_EXPLICIT_ACLS_PERCOLATE_PAGE_SIZE'] = 5
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+
+    acls = []
+    with db.session.begin_nested():
+        for i in range(12):
+            acl = ElasticsearchACL(name='test %s' % i, schemas=[RECORD_SCHEMA],
+                                   priority=0, operation='get', originator=test_users.u1,
+                                   record_selector={'term': {
+                                       'keywords': 'blah'
+                                   }})
+            db.session.add(acl)
+            acls.append(acl)
+
+    for acl in acls:
+        acl.update()
+
+    # the hits are not paged with from/size, so the result window of the percolator index does not apply
+    current_search_client.indices.put_settings(
+        index=ElasticsearchACL.get_acl_index_name(schema_to_index(RECORD_SCHEMA)[0]),
+        body={'index': {'max_result_window': 8}})
+
+    expected = sorted(acl.id for acl in acls)
+    assert sorted(x.id for x in ElasticsearchACL.get_record_acls(record)) == expected
+    assert list(ElasticsearchACL.get_record_acls(record1)) == []
+
+    records_acls = ElasticsearchACL.get_records_acls([record, record1])
+    assert {k: sorted(x.id for x in v) for k, v in records_acls.items()} == {
+        str(record.id): expected,
+        str(record1.id): [],
+    }
+
+
+def test_elasticsearch_acl_bulk_update(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+
+    acls = []
+    with db.session.begin_nested():
+        for i in range(3):
+            acl = ElasticsearchACL(name='test %s' % i, schemas=[RECORD_SCHEMA],
+                                   priority=0, operation='get', originator=test_users.u1,
+                                   record_selector={'term': {
+                                       'keywords': 'blah'
+                                   }})
+            db.session.add(acl)
+            acls.append(acl)
+
+    assert list(ElasticsearchACL.get_record_acls(record)) == []
+
+    success, errors = ElasticsearchACL.bulk_update(acls)
+    assert (success, errors) == (3, [])
+    assert sorted(x.id for x in ElasticsearchACL.get_record_acls(record)) == sorted(x.id for x in acls)
+
+    success, errors = ElasticsearchACL.bulk_delete(acls[:2])
+    assert (success, errors) == (2, [])
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record)] == [acls[2].id]
+
+
+@pytest.mark.parametrize('policy,refreshes,flushes', [
+    ('flush', 1, 1),
+    ('refresh', 1, 0),
+    ('wait_for', 0, 0),
+    ('none', 0, 0),
+])
+def test_elasticsearch_acl_durability(app, db, es, es_acl_prepare, test_users, monkeypatch,
+                                      policy, refreshes, flushes):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+
+    calls = {'refresh': 0, 'flush': 0}
+    indices = current_search_client.indices
+    for method in calls:
+        def counting(*args, _method=method, _orig=getattr(indices, method), **kwargs):
+            calls[_method] += 1
+            return _orig(*args, **kwargs)
+
+        monkeypatch.setattr(indices, method, counting)
+
+    app.config['INVENIO_EXPLICIT_ACLS_DURABILITY'] = policy
+    try:
+        acl.update()
+        assert calls == {'refresh': refreshes, 'flush': flushes}
+
+        current_explicit_acls.visibility_barrier([RECORD_SCHEMA])
+        assert calls['refresh'] == refreshes + 1
+        assert [x.id for x in ElasticsearchACL.get_record_acls(record)] == [acl.id]
+
+        acl.delete()
+        current_explicit_acls.visibility_barrier([RECORD_SCHEMA])
+        assert list(ElasticsearchACL.get_record_acls(record)) == []
+    finally:
+        app.config['INVENIO_EXPLICIT_ACLS_DURABILITY'] = 'refresh'
+
+
+def test_elasticsearch_acl_percolation_cache(app, db, es, es_acl_prepare, test_users, monkeypatch):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah'], 'title': 'first'},
+                                clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah'], 'title': 'second'},
+                                  clz=SchemaEnforcingRecord)
+    pid2, record2 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test'], 'title': 'third'},
+                                  clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+    db.session.commit()
+    acl.update()
+
+    client = current_search_client._get_current_object()
+    percolated = []
+    search = client.search
+
+    def counting_search(*args, **kwargs):
+        percolated.append(kwargs['body']['query']['bool']['must'][0]['percolate']['documents'])
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(client, 'search', counting_search)
+
+    # records with the same keywords are percolated just once
+    acls = ElasticsearchACL.get_records_acls([record, record1, record2])
+    assert percolated == [[{'keywords': ['blah']}, {'keywords': ['test']}]]
+    assert [x.id for x in acls[str(record.id)]] == [acl.id]
+    assert [x.id for x in acls[str(record1.id)]] == [acl.id]
+    assert acls[str(record2.id)] == []
+
+    # and the results are reused later
+    del percolated[:]
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record1)] == [acl.id]
+    assert list(ElasticsearchACL.get_record_acls(record2)) == []
+    assert percolated == []
+
+    # changing an ACL invalidates the cached results
+    acl.record_selector = {'term': {'keywords': 'test'}}
+    db.session.add(acl)
+    db.session.commit()
+    acl.update()
+    assert list(ElasticsearchACL.get_record_acls(record1)) == []
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record2)] == [acl.id]
+    assert len(percolated) == 2
+
+
+def test_elasticsearch_acl_invalid_durability(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_DURABILITY'] = 'sometimes'
+    try:
+        with pytest.raises(AttributeError):
+            get_durability_policy()
+    finally:
+        app.config['INVENIO_EXPLICIT_ACLS_DURABILITY'] = 'refresh'
+
+
 def test_elasticsearch_acl_prepare_schema_acl(app, db, es, es_acl_prepare, test_users):
     # should pass as it does nothing
     ElasticsearchACL.prepare_schema_acls(RECORD_SCHEMA)
 
     idx = ElasticsearchACL.get_acl_index_name(schema_to_index(RECORD_SCHEMA)[0])
+    assert current_search_client.indices.exists_alias(name=idx)
     mapping = current_search_client.indices.get_mapping(idx)
-    assert idx in mapping
+    assert len(mapping) == 1
+    assert list(mapping.keys())[0].startswith(idx + '-')
 
     idx, doc_type = schema_to_index(RECORD_SCHEMA)
     mapping = current_search_client.indices.get_mapping(idx)
@@ -89,6 +288,46 @@ def test_elasticsearch_acl_prepare_schema_acl(app, db, es, es_acl_prepare, test_
         assert '_invenio_explicit_acls' in mapping[key]['mappings']['properties']
 
 
+
+def _create_legacy_acl_index(index_name, **properties):
+    """Replaces the percolator index with one created by an older version, without the newer ACL properties."""
+    acl_index_name = ElasticsearchACL.get_acl_index_name(index_name)
+    old_index_names = list(current_search_client.indices.get_alias(name=acl_index_name).keys())
+    body = ElasticsearchACL._get_acl_index_body(index_name)
+    mapping = body['mappings'] if 'properties' in body['mappings'] else next(iter(body['mappings'].values()))
+    for name in ('__acl_record_fields', '__acl_priority', '__acl_priority_group'):
+        del mapping['properties'][name]
+    mapping['properties'].update(properties)
+    body['aliases'] = {acl_index_name: {}}
+    for old_index_name in old_index_names:
+        current_search_client.indices.delete(index=old_index_name)
+    current_search_client.indices.create(index=acl_index_name + '-legacy', body=body)
+    return acl_index_name
+
+
+def test_elasticsearch_acl_prepare_legacy_acl_index(app, db, es, es_acl_prepare, test_users):
+    index_name, doc_type = schema_to_index(RECORD_SCHEMA)
+    acl_index_name = _create_legacy_acl_index(index_name)
+
+    ElasticsearchACL.prepare_schema_acls(RECORD_SCHEMA)
+
+    mapping = current_search_client.indices.get_mapping(acl_index_name)[acl_index_name + '-legacy']['mappings']
+    if ES_VERSION[0] < 7:
+        mapping = mapping[current_explicit_acls.acl_doctype_name]
+    assert mapping['properties']['__acl_record_fields'] == {'type': 'keyword'}
+    assert mapping['properties']['__acl_priority'] == {'type': 'integer'}
+    assert mapping['properties']['__acl_priority_group'] == {'type': 'keyword'}
+
+
+def test_elasticsearch_acl_prepare_incompatible_acl_index(app, db, es, es_acl_prepare, test_users):
+    index_name, doc_type = schema_to_index(RECORD_SCHEMA)
+    # dynamic mapping of a priority group written to an index without the property
+    _create_legacy_acl_index(index_name, __acl_priority_group={'type': 'text'})
+
+    with pytest.raises(RuntimeError, match='rebuild-percolators'):
+        ElasticsearchACL.prepare_schema_acls(RECORD_SCHEMA)
+
+
 def test_elasticsearch_acl_get_matching_resources(app, db, es, es_acl_prepare, test_users):
     pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
     pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
@@ -141,12 +380,14 @@ def test_elasticsearch_acl_update(app, db, es, es_acl_prepare, test_users):
     # ES7 returns extra:
     acl_md.pop('_seq_no', None)
     acl_md.pop('_primary_term', None)
+    # percolator indices are versioned and accessed via an alias
+    assert acl_md.pop('_index').startswith(idx + '-')
 
     print(json.dumps(acl_md, indent=4))
     assert acl_md == {
         '_id': acl.id,
-        '_index': 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0',
-        '_source': {'__acl_record_selector': {'term': {'keywords': 'test'}}, '__acl_record_type': 'elasticsearch'},
+        '_source': {'__acl_record_selector': {'term': {'keywords': 'test'}}, '__acl_record_type': 'elasticsearch',
+                    '__acl_record_fields': ['keywords'], '__acl_priority': 0, '__acl_priority_group': 'default'},
         '_type': '_doc',
         '_version': 2,
         'found': True
@@ -172,11 +413,13 @@ def test_elasticsearch_acl_delete(app, db, es, es_acl_prepare, test_users):
     # ES7 returns extra:
     acl_md.pop('_seq_no', None)
     acl_md.pop('_primary_term', None)
+    # percolator indices are versioned and accessed via an alias
+    assert acl_md.pop('_index').startswith(idx + '-')
 
     assert acl_md == {
         '_id': acl.id,
-        '_index': 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0',
-        '_source': {'__acl_record_selector': {'term': {'keywords': 'test'}}, '__acl_record_type': 'elasticsearch'},
+        '_source': {'__acl_record_selector': {'term': {'keywords': 'test'}}, '__acl_record_type': 'elasticsearch',
+                    '__acl_record_fields': ['keywords'], '__acl_priority': 0, '__acl_priority_group': 'default'},
         '_type': '_doc',
         '_version': 1,
         'found': True
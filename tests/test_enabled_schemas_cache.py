@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2019 UCT Prague.
+# 
+# test_enabled_schemas_cache.py is part of Invenio Explicit ACLs 
+# (see https://github.com/oarepo/invenio-explicit-acls).
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from unittest import mock
+
+from invenio_explicit_acls.acls import DefaultACL
+from invenio_explicit_acls.generation import ACL_GENERATION, \
+    PENDING_ACL_CHANGES, CacheGenerationStore
+from invenio_explicit_acls.models import ACL
+from invenio_explicit_acls.proxies import current_explicit_acls
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_enabled_schemas_cached(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    assert current_explicit_acls.enabled_schemas == set()
+
+    with mock.patch.object(ACL, 'enabled_schemas', wraps=ACL.enabled_schemas) as enabled_schemas:
+        assert current_explicit_acls.enabled_schemas == set()
+        assert current_explicit_acls.enabled_schemas == set()
+        assert enabled_schemas.call_count == 0
+
+
+def test_enabled_schemas_pending_changes(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    assert current_explicit_acls.enabled_schemas == set()
+    generation = current_explicit_acls.generation
+
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=[RECORD_SCHEMA], operation='get', originator=test_users.u1)
+        db.session.add(acl)
+
+    # flushed, but not committed changes are visible in the session
+    assert db.session.info[PENDING_ACL_CHANGES]
+    assert current_explicit_acls.enabled_schemas == {RECORD_SCHEMA}
+    assert current_explicit_acls.generation == generation
+
+    db.session.commit()
+    assert PENDING_ACL_CHANGES not in db.session.info
+    assert current_explicit_acls.generation == generation + 1
+    assert current_explicit_acls.enabled_schemas == {RECORD_SCHEMA}
+
+
+def test_enabled_schemas_rollback(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    generation = current_explicit_acls.generation
+
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=[RECORD_SCHEMA], operation='get', originator=test_users.u1)
+        db.session.add(acl)
+    db.session.rollback()
+
+    assert current_explicit_acls.generation == generation
+    assert current_explicit_acls.enabled_schemas == set()
+
+
+def test_enabled_schemas_savepoint_rollback(app, db, es, es_acl_prepare, test_users):
+    db.session.commit()
+    generation = current_explicit_acls.generation
+
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=[RECORD_SCHEMA], operation='get', originator=test_users.u1)
+        db.session.add(acl)
+
+    # rolling back a savepoint keeps the changes flushed before it
+    try:
+        with db.session.begin_nested():
+            db.session.add(DefaultACL(name='other', schemas=[RECORD_SCHEMA], operation='get',
+                                      originator=test_users.u1))
+            db.session.flush()
+            raise ValueError()
+    except ValueError:
+        pass
+    assert db.session.info[PENDING_ACL_CHANGES]
+
+    db.session.commit()
+    assert current_explicit_acls.generation == generation + 1
+    assert current_explicit_acls.enabled_schemas == {RECORD_SCHEMA}
+
+
+def test_local_generation_store_disables_caches(app, db, es, es_acl_prepare, test_users):
+    app.config['INVENIO_EXPLICIT_ACLS_LOCAL_GENERATION_CACHING'] = False
+    current_explicit_acls._get_current_object().__dict__.pop('generation_caching', None)
+    db.session.commit()
+
+    # generations of a process-local store are not seen by other processes, so nothing is cached
+    assert not current_explicit_acls.generation_caching
+    assert current_explicit_acls.acl_matcher is None
+    with mock.patch.object(ACL, 'enabled_schemas', wraps=ACL.enabled_schemas) as enabled_schemas:
+        assert current_explicit_acls.enabled_schemas == set()
+        assert current_explicit_acls.enabled_schemas == set()
+        assert enabled_schemas.call_count == 2
+
+
+class DictCache:
+    """Minimal invenio-cache stand-in, evicting a key is just removing it from values."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def add(self, key, value):
+        self.values.setdefault(key, value)
+
+    def inc(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+def test_cache_generation_store_eviction():
+    cache = DictCache()
+    store = CacheGenerationStore()
+    with mock.patch('invenio_explicit_acls.generation.current_cache', cache), \
+            mock.patch('invenio_explicit_acls.generation.time.time', side_effect=[1000.0, 1001.0, 1002.0]):
+        used = {store.get(ACL_GENERATION), store.bump(ACL_GENERATION), store.bump(ACL_GENERATION)}
+        cache.values.clear()
+        # an evicted counter must not restart from a generation that has already been used
+        assert store.get(ACL_GENERATION) not in used
+        cache.values.clear()
+        assert store.bump(ACL_GENERATION) not in used
@@ -54,6 +54,29 @@ def test_id_acl_get_record_acl(app, db, es, es_acl_prepare, test_users):
     assert acls[0].id == acl.id
 
 
+def test_id_acl_get_records_acls(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    pid2, record2 = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = IdACL(name='test', schemas=[RECORD_SCHEMA],
+                    priority=0, operation='get', originator=test_users.u1,
+                    record_id=str(record.id))
+        db.session.add(acl)
+        acl1 = IdACL(name='test 1', schemas=[RECORD_SCHEMA],
+                     priority=0, operation='get', originator=test_users.u1,
+                     record_id=str(record1.id))
+        db.session.add(acl1)
+
+    acls = IdACL.get_records_acls([record, record1, record2])
+    assert {k: [x.id for x in v] for k, v in acls.items()} == {
+        str(record.id): [acl.id],
+        str(record1.id): [acl1.id],
+        str(record2.id): [],
+    }
+
+
 def test_id_acl_prepare_schema_acl(app, db, es, es_acl_prepare, test_users):
     # should pass as it does nothing
     IdACL.prepare_schema_acls(RECORD_SCHEMA)
@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_instrumentation.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import pytest
+from helpers import create_record
+from invenio_indexer.api import RecordIndexer
+
+from invenio_explicit_acls.acls import DefaultACL
+from invenio_explicit_acls.instrumentation import TimingHistogram, acl_timing
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_timing_histogram():
+    histogram = TimingHistogram(buckets=(0.001, 0.01))
+    histogram.record('lookup', 0.0005, acl_type='default')
+    histogram.record('lookup', 0.005, acl_type='default', records=10)
+    histogram.record('lookup', 1, acl_type='default')
+    histogram.record('filter', 0.001)
+    assert sorted(histogram.snapshot(), key=lambda x: x['stage']) == [
+        {
+            'stage': 'filter',
+            'acl_type': None,
+            'count': 1,
+            'records': 1,
+            'total': 0.001,
+            'max': 0.001,
+            'buckets': [(0.001, 1), (0.01, 0), (None, 0)]
+        },
+        {
+            'stage': 'lookup',
+            'acl_type': 'default',
+            'count': 3,
+            'records': 12,
+            'total': pytest.approx(1.0055),
+            'max': 1,
+            'buckets': [(0.001, 1), (0.01, 1), (None, 1)]
+        }
+    ]
+    histogram.reset()
+    assert histogram.snapshot() == []
+
+
+def test_indexing_timings(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        acl = DefaultACL(name='default', schemas=[RECORD_SCHEMA], priority=0, operation='get',
+                         originator=test_users.u1)
+        db.session.add(acl)
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(kwargs)
+
+    current_explicit_acls.timing_histogram.reset()
+    acl_timing.connect(receiver)
+    try:
+        RecordIndexer().index(record)
+    finally:
+        acl_timing.disconnect(receiver)
+
+    stages = {(x['stage'], x['acl_type']) for x in received}
+    assert ('schema', None) in stages
+    assert ('lookup', 'default') in stages
+    assert ('lookup', 'elasticsearch,propertyvalue') in stages
+    assert ('filter', None) in stages
+    assert ('serialize', None) in stages
+    assert all(x['duration'] >= 0 for x in received)
+
+    assert {(x['stage'], x['acl_type']) for x in current_explicit_acls.timing_histogram.snapshot()} == stages
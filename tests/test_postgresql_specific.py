@@ -23,6 +23,7 @@
 # SOFTWARE.
 #
 from invenio_explicit_acls.acls import DefaultACL
+from invenio_explicit_acls.models import ACLSchema
 from invenio_explicit_acls.proxies import current_explicit_acls
 
 RECORD_SCHEMA = 'records/record-v1.0.0.json'
@@ -74,3 +75,30 @@ def test_filter_schemas(app, db, es, es_acl_prepare, test_users):
 
     assert DefaultACL.query.filter(DefaultACL.schemas.any('aaa')).count() == 2
     assert DefaultACL.query.filter(DefaultACL.schemas.any(RECORD_SCHEMA)).count() == 1
+
+
+def test_acl_schema_associations(app, db, es, es_acl_prepare, test_users):
+    assert DefaultACL.query.filter(DefaultACL.has_schema('aaa')).count() == 0
+
+    with db.session.begin_nested():
+        acl = DefaultACL(name='test', schemas=['aaa', RECORD_SCHEMA], operation='get', originator=test_users.u1)
+        db.session.add(acl)
+        acl1 = DefaultACL(name='test1', schemas=[RECORD_SCHEMA], operation='get', originator=test_users.u1)
+        db.session.add(acl1)
+
+    assert sorted(x.schema for x in acl.schema_associations) == ['aaa', RECORD_SCHEMA]
+    assert DefaultACL.query.filter(DefaultACL.has_schema('aaa')).count() == 1
+    assert DefaultACL.query.filter(DefaultACL.has_schema(RECORD_SCHEMA)).count() == 2
+    assert DefaultACL.query.filter(DefaultACL.has_schema('aaa', RECORD_SCHEMA)).count() == 2
+
+    with db.session.begin_nested():
+        acl1.schemas = ['aaa']
+
+    assert DefaultACL.query.filter(DefaultACL.has_schema('aaa')).count() == 2
+    assert DefaultACL.query.filter(DefaultACL.has_schema(RECORD_SCHEMA)).count() == 1
+
+    with db.session.begin_nested():
+        db.session.delete(acl)
+
+    assert ACLSchema.query.count() == 1
+    assert set(current_explicit_acls.enabled_schemas) == {'aaa'}
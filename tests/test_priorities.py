@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_priorities.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from collections import namedtuple
+
+from helpers import create_record
+
+from invenio_explicit_acls.acls import DefaultACL, ElasticsearchACL
+from invenio_explicit_acls.acls.es_mixin import get_es_records_acls
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+from invenio_explicit_acls.utils import prune_by_priority
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+FakeACL = namedtuple('FakeACL', 'id priority priority_group')
+
+
+def test_prune_by_priority():
+    acls = [
+        FakeACL('a', 0, 'default'),
+        FakeACL('b', 1, 'default'),
+        FakeACL('c', 1, 'default'),
+        FakeACL('d', 0, 'other'),
+        FakeACL('e', -1, 'other'),
+    ]
+    assert [x.id for x in prune_by_priority(acls)] == ['b', 'c', 'd']
+    assert [x.id for x in prune_by_priority(acls, floors={'default': 2})] == ['d']
+    assert prune_by_priority(['a', 'b', 'x'], key={'a': (0, 'g'), 'b': (1, 'g')}.get) == ['b', 'x']
+
+
+def test_priority_groups(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        low = DefaultACL(name='low', schemas=[RECORD_SCHEMA], priority=0, priority_group='default',
+                         operation='get', originator=test_users.u1)
+        high = DefaultACL(name='high', schemas=[RECORD_SCHEMA], priority=1, priority_group='default',
+                          operation='get', originator=test_users.u1)
+        other = DefaultACL(name='other', schemas=[RECORD_SCHEMA], priority=0, priority_group='other',
+                           operation='update', originator=test_users.u1)
+        shadowed = ElasticsearchACL(name='shadowed', schemas=[RECORD_SCHEMA], priority=0, priority_group='default',
+                                    operation='get', originator=test_users.u1,
+                                    record_selector={'term': {'keywords': 'blah'}})
+        db.session.add_all([low, high, other, shadowed])
+    shadowed.update()
+
+    # highest priority within each of the groups
+    assert sorted(x.name for x in current_explicit_acls.get_record_acls(record)) == ['high', 'other']
+    assert sorted(x.name for x in current_explicit_acls.get_records_acls([record])[str(record.id)]) == [
+        'high', 'other'
+    ]
+
+    # percolated ACLs shadowed by already known ACLs are not loaded at all
+    assert get_es_records_acls([ElasticsearchACL], [record],
+                               priority_floors={str(record.id): {'default': 1}}) == {str(record.id): []}
+    assert [x.id for x in get_es_records_acls([ElasticsearchACL], [record],
+                                              priority_floors={str(record.id): {'other': 1}})[str(record.id)]] == [
+        shadowed.id
+    ]
+
+    # the in-memory matcher prunes as well
+    db.session.commit()
+    assert sorted(current_explicit_acls.acl_matcher.get_default_acl_ids(record)) == sorted([high.id, other.id])
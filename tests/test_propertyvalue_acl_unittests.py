@@ -30,9 +30,11 @@ from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search_client
 
 from helpers import create_record
-from invenio_explicit_acls.acls import PropertyValueACL
+from invenio_explicit_acls.acls import ElasticsearchACL, PropertyValueACL
+from invenio_explicit_acls.acls.es_mixin import get_es_records_acls
 from invenio_explicit_acls.acls.propertyvalue_acls import BoolOperation, \
     MatchOperation, PropertyValue
+from invenio_explicit_acls.proxies import current_explicit_acls
 from invenio_explicit_acls.record import SchemaEnforcingRecord
 from invenio_explicit_acls.utils import schema_to_index
 
@@ -112,8 +114,10 @@ def test_propertyvalue_acl_prepare_schema_acl(app, db, es, es_acl_prepare, test_
     PropertyValueACL.prepare_schema_acls(RECORD_SCHEMA)
 
     idx = PropertyValueACL.get_acl_index_name(schema_to_index(RECORD_SCHEMA)[0])
+    assert current_search_client.indices.exists_alias(name=idx)
     mapping = current_search_client.indices.get_mapping(idx)
-    assert idx in mapping
+    assert len(mapping) == 1
+    assert list(mapping.keys())[0].startswith(idx + '-')
 
     idx, doc_type = schema_to_index(RECORD_SCHEMA)
     mapping = current_search_client.indices.get_mapping(idx)
@@ -226,11 +230,13 @@ def test_propertyvalue_acl_update(app, db, es, es_acl_prepare, test_users):
     # ES7 returns extra:
     acl_md.pop('_seq_no', None)
     acl_md.pop('_primary_term', None)
+    # percolator indices are versioned and accessed via an alias
+    assert acl_md.pop('_index').startswith(idx + '-')
     assert acl_md == {
         '_id': acl.id,
-        '_index': 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0',
         '_source': {'__acl_record_selector': {'bool': {'must': [{'term': {'keywords': 'test'}}]}},
-                    '__acl_record_type': 'propertyvalue'},
+                    '__acl_record_type': 'propertyvalue',
+                    '__acl_record_fields': ['keywords'], '__acl_priority': 0, '__acl_priority_group': 'default'},
         '_type': '_doc',
         '_version': 2,
         'found': True
@@ -257,11 +263,13 @@ def test_propertyvalue_acl_delete(app, db, es, es_acl_prepare, test_users):
     # ES7 returns extra:
     acl_md.pop('_seq_no', None)
     acl_md.pop('_primary_term', None)
+    # percolator indices are versioned and accessed via an alias
+    assert acl_md.pop('_index').startswith(idx + '-')
     assert acl_md == {
         '_id': acl.id,
-        '_index': 'invenio_explicit_acls-acl-v1.0.0-records-record-v1.0.0',
         '_source': {'__acl_record_selector': {'bool': {'must': [{'term': {'keywords': 'test'}}]}},
-                    '__acl_record_type': 'propertyvalue'},
+                    '__acl_record_type': 'propertyvalue',
+                    '__acl_record_fields': ['keywords'], '__acl_priority': 0, '__acl_priority_group': 'default'},
         '_type': '_doc',
         '_version': 1,
         'found': True
@@ -304,3 +312,47 @@ def test_propertyvalue_str(app, db, es, es_acl_prepare, test_users):
                                 bool_operation=BoolOperation.must,
                                 match_operation=MatchOperation.term)
         assert str(propval) == 'BoolOperation.must: MatchOperation.term(keywords=test)'
+
+
+def test_es_acl_types_share_percolation(app, db, es, es_acl_prepare, test_users, monkeypatch):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah']}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['test']}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        pv_acl = PropertyValueACL(name='test', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1)
+        db.session.add(pv_acl)
+        db.session.add(PropertyValue(name='keywords', value='blah', acl=pv_acl, originator=test_users.u1))
+
+        es_acl = ElasticsearchACL(name='test 2', schemas=[RECORD_SCHEMA],
+                                  priority=0, operation='get', originator=test_users.u1,
+                                  record_selector={'term': {
+                                      'keywords': 'blah'
+                                  }})
+        db.session.add(es_acl)
+
+    pv_acl.update()
+    es_acl.update()
+
+    client = current_search_client._get_current_object()
+    searches = []
+    search = client.search
+
+    def counting_search(*args, **kwargs):
+        searches.append(kwargs['index'])
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(client, 'search', counting_search)
+
+    acls = get_es_records_acls([PropertyValueACL, ElasticsearchACL], [record, record1])
+    assert len(searches) == 1
+    assert {type(x): x.id for x in acls[str(record.id)]} == {
+        PropertyValueACL: pv_acl.id,
+        ElasticsearchACL: es_acl.id
+    }
+    assert acls[str(record1.id)] == []
+
+    del searches[:]
+    acls = current_explicit_acls.get_record_acls(record)
+    assert len(searches) == 1
+    assert sorted(x.id for x in acls) == sorted([pv_acl.id, es_acl.id])
@@ -111,6 +111,23 @@ def test_get_matching_users(app, db, es, test_users):
     }))
 
 
+def test_resolve_matching_user_ids(app, db, es, test_users):
+    with db.session.begin_nested():
+        actor = RecordRoleActor(name='test', originator=test_users.u1, path='/roles')
+        db.session.add(actor)
+    assert RecordRoleActor.resolve_matching_user_ids([
+        (actor, {'roles': test_users.r1.id}),
+        (actor, {'roles': [test_users.r1.id, str(test_users.r2.id)]}),
+        (actor, {'roles': []}),
+        (actor, None),
+    ]) == [
+        {test_users.u1.id, test_users.u2.id},
+        {test_users.u1.id, test_users.u2.id, test_users.u3.id},
+        set(),
+        set()
+    ]
+
+
 def test_str(app, db, test_users):
     with db.session.begin_nested():
         actor = RecordRoleActor(name='test', originator=test_users.u1, path='/roles')
@@ -0,0 +1,90 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_recordset_acl_unittests.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+from helpers import create_record
+
+from invenio_explicit_acls.acls import RecordSetACL
+from invenio_explicit_acls.acls.recordset_acls import RecordSetACLRecord
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_recordset_acl_get_record_acl(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    pid1, record1 = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+    pid2, record2 = create_record({'$schema': RECORD_SCHEMA}, clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = RecordSetACL(name='test', schemas=[RECORD_SCHEMA],
+                           priority=0, operation='get', originator=test_users.u1)
+        acl.add_records([record.id, record1.id])
+        acl2 = RecordSetACL(name='test 2', schemas=[RECORD_SCHEMA],
+                            priority=0, operation='get', originator=test_users.u1)
+        acl2.add_records([str(record1.id), str(record1.id)])
+
+    assert [x.id for x in RecordSetACL.get_record_acls(record)] == [acl.id]
+    assert sorted(x.id for x in RecordSetACL.get_record_acls(record1)) == sorted([acl.id, acl2.id])
+    assert list(RecordSetACL.get_record_acls(record2)) == []
+
+    acls = RecordSetACL.get_records_acls([record, record1, record2])
+    assert {k: sorted(x.id for x in v) for k, v in acls.items()} == {
+        str(record.id): [acl.id],
+        str(record1.id): sorted([acl.id, acl2.id]),
+        str(record2.id): [],
+    }
+
+    assert [x.id for x in current_explicit_acls.get_record_acls(record)] == [acl.id]
+
+
+def test_recordset_acl_add_remove_records(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        acl = RecordSetACL(name='test', schemas=[RECORD_SCHEMA],
+                           priority=0, operation='get', originator=test_users.u1)
+        acl.add_records(['1111-11111111-11111111-%04d' % x for x in range(10)])
+        acl.add_records(['1111-11111111-11111111-%04d' % x for x in range(5, 15)])
+
+    assert sorted(acl.get_matching_resources()) == ['1111-11111111-11111111-%04d' % x for x in range(15)]
+
+    with db.session.begin_nested():
+        acl.remove_records(['1111-11111111-11111111-%04d' % x for x in range(10)])
+    assert sorted(acl.get_matching_resources()) == ['1111-11111111-11111111-%04d' % x for x in range(10, 15)]
+    assert acl.records.count() == 5
+
+    with db.session.begin_nested():
+        db.session.delete(acl)
+    assert RecordSetACLRecord.query.filter_by(acl_id=acl.id).count() == 0
+
+
+def test_recordset_acl_update_delete(app, db, es, es_acl_prepare, test_users):
+    # should pass as it does nothing
+    RecordSetACL.prepare_schema_acls(RECORD_SCHEMA)
+    with db.session.begin_nested():
+        acl = RecordSetACL(name='test', schemas=[RECORD_SCHEMA],
+                           priority=0, operation='get', originator=test_users.u1)
+        db.session.add(acl)
+    acl.update()
+    acl.delete()
+    assert repr(acl) == "\"test\" (%s) on schemas ['records/record-v1.0.0.json']" % acl.id
@@ -79,6 +79,24 @@ def test_get_matching_users(app, db, es, test_users):
     assert {test_users.u1.id, test_users.u2.id} == set(actor.get_matching_users())
 
 
+def test_resolve_matching_user_ids(app, db, es, test_users):
+    with db.session.begin_nested():
+        actor = RoleActor(name='test', originator=test_users.u1, roles=[test_users.r1])
+        actor1 = RoleActor(name='test 1', originator=test_users.u1, roles=[test_users.r1, test_users.r2])
+        actor2 = RoleActor(name='test 2', originator=test_users.u1, roles=[])
+        db.session.add(actor)
+        db.session.add(actor1)
+        db.session.add(actor2)
+
+    assert list(actor1.iter_matching_user_ids()) == [test_users.u1.id, test_users.u2.id, test_users.u3.id]
+    assert actor1.count_matching_users() == 3
+    assert RoleActor.resolve_matching_user_ids([(actor, None), (actor1, None), (actor2, None)]) == [
+        {test_users.u1.id, test_users.u2.id},
+        {test_users.u1.id, test_users.u2.id, test_users.u3.id},
+        set()
+    ]
+
+
 def test_str(app, db, test_users):
     with db.session.begin_nested():
         actor = RoleActor(name='test', originator=test_users.u1, roles=[test_users.r1])
@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2019 UCT Prague.
+#
+# test_selectors.py is part of Invenio Explicit ACLs
+# (see https://github.com/oarepo/invenio-explicit-acls).
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import pytest
+
+from helpers import create_record
+
+from invenio_explicit_acls.acls import ElasticsearchACL
+from invenio_explicit_acls.proxies import current_explicit_acls
+from invenio_explicit_acls.record import SchemaEnforcingRecord
+from invenio_explicit_acls.selectors import check_selector_cost, \
+    expand_field_sources, get_query_fields, get_selector_constructs, \
+    get_selector_cost, project_document
+
+RECORD_SCHEMA = 'records/record-v1.0.0.json'
+
+
+def test_get_query_fields():
+    assert get_query_fields({'term': {'keywords': 'blah'}}) == {'keywords'}
+    assert get_query_fields({'terms': {'keywords': ['a', 'b'], 'boost': 2}}) == {'keywords'}
+    assert get_query_fields({
+        'bool': {
+            'must': {'match': {'title.raw': {'query': 'blah'}}},
+            'should': [{'range': {'count': {'gte': 5}}}, {'exists': {'field': 'creator'}}],
+            'must_not': [{'nested': {'path': 'contributors',
+                                     'query': {'term': {'contributors.role': 'editor'}}}}]
+        }
+    }) == {'title.raw', 'count', 'creator', 'contributors', 'contributors.role'}
+    assert get_query_fields({'match_all': {}}) == set()
+    assert get_query_fields({'query_string': {'query': 'keywords:blah'}}) is None
+    assert get_query_fields({'multi_match': {'query': 'blah', 'fields': ['title*']}}) is None
+    assert get_query_fields({'script': {'script': 'true'}}) is None
+
+
+def test_project_document():
+    document = {
+        '$schema': RECORD_SCHEMA,
+        'title': 'blah',
+        'abstract': 'a very long abstract',
+        'contributors': [{'name': 'a', 'role': 'author'}, {'name': 'b'}],
+        'a.b': 1
+    }
+    assert project_document(document, {'title.raw', 'contributors.role'}) == {
+        'title': 'blah',
+        'contributors': [{'role': 'author'}, {}],
+        'a.b': 1
+    }
+    assert project_document(document, set()) == document
+
+
+def test_expand_field_sources():
+    assert expand_field_sources({'all', 'title'}, {'all': {'title', 'abstract'}, 'alias': {'count'}}) == {
+        'all', 'title', 'abstract'
+    }
+
+
+def test_get_percolated_fields(app, db, es, es_acl_prepare, test_users):
+    pid, record = create_record({'$schema': RECORD_SCHEMA, 'keywords': ['blah'], 'title': 'long title'},
+                                clz=SchemaEnforcingRecord)
+
+    with db.session.begin_nested():
+        acl = ElasticsearchACL(name='test', schemas=[RECORD_SCHEMA],
+                               priority=0, operation='get', originator=test_users.u1,
+                               record_selector={'term': {
+                                   'keywords': 'blah'
+                               }})
+        db.session.add(acl)
+
+    # whole records are percolated until the changes are committed
+    assert current_explicit_acls.get_percolated_fields('records-record-v1.0.0') is None
+    db.session.commit()
+    acl.update()
+
+    assert current_explicit_acls.get_percolated_fields('records-record-v1.0.0') == {'keywords'}
+    assert ElasticsearchACL._get_percolate_query(record)['query']['bool']['must'][0]['percolate']['document'] == {
+        'keywords': ['blah']
+    }
+    assert [x.id for x in ElasticsearchACL.get_record_acls(record)] == [acl.id]
+
+    # a selector without any field does not turn trimming off
+    with db.session.begin_nested():
+        acl1 = ElasticsearchACL(name='all', schemas=[RECORD_SCHEMA],
+                                priority=0, operation='get', originator=test_users.u1,
+                                record_selector={'match_all': {}})
+        db.session.add(acl1)
+    db.session.commit()
+    acl1.update()
+    assert current_explicit_acls.get_percolated_fields('records-record-v1.0.0') == {'keywords'}
+
+    # with a lax durability policy the cached fields are not computed before the new ACL is searchable
+    app.config['INVENIO_EXPLICIT_ACLS_DURABILITY'] = 'none'
+    with db.session.begin_nested():
+        acl2 = ElasticsearchACL(name='control number', schemas=[RECORD_SCHEMA],
+                                priority=0, operation='get', originator=test_users.u1,
+                                record_selector={'term': {'control_number': '1'}})
+        db.session.add(acl2)
+    db.session.commit()
+    acl2.update()
+    assert current_explicit_acls.get_percolated_fields('records-record-v1.0.0') == {'keywords', 'control_number'}
+
+
+def test_get_selector_constructs():
+    assert get_selector_constructs({'term': {'keywords': 'blah'}}) == [('clause', 'term')]
+    assert get_selector_constructs({
+        'bool': {
+            'must': [
+                {'wildcard': {'title': '*blah'}},
+                {'wildcard': {'keywords': {'value': 'bl*'}}},
+            ],
+            'should': {'regexp': {'title': {'value': 'b.*h'}}},
+            'filter': {'script': {'script': {'source': "doc['count'].value > 5"}}}
+        }
+    }) == [
+        ('leading_wildcard', 'bool.must.0.wildcard.title'),
+        ('wildcard', 'bool.must.1.wildcard.keywords'),
+        ('regexp', 'bool.should.regexp.title'),
+        ('script', 'bool.filter.script'),
+    ]
+    assert get_selector_constructs({'query_string': {'query': 'title:*blah'}}) == [
+        ('query_string', 'query_string'),
+        ('leading_wildcard', 'query_string'),
+    ]
+
+
+def test_selector_cost_policy(app):
+    cheap = {'bool': {'must': [{'term': {'keywords': 'blah'}}, {'range': {'count': {'gte': 5}}}]}}
+    expensive = {'wildcard': {'title': '*blah'}}
+    assert get_selector_cost(cheap) == 2
+    assert get_selector_cost(expensive) == 100
+
+    assert check_selector_cost(cheap) is None
+    assert 'leading_wildcard at wildcard.title' in check_selector_cost(expensive)
+
+    app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY'] = 'reject'
+    try:
+        with pytest.raises(ValueError, match='too expensive'):
+            check_selector_cost(expensive)
+    finally:
+        app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY'] = 'warn'
+
+    app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY'] = None
+    try:
+        assert check_selector_cost(expensive) is None
+    finally:
+        app.config['INVENIO_EXPLICIT_ACLS_SELECTOR_COST_POLICY'] = 'warn'
+
+
+def test_profile_selectors(app, db, es, es_acl_prepare, test_users):
+    with db.session.begin_nested():
+        cheap = ElasticsearchACL(name='cheap', schemas=[RECORD_SCHEMA],
+                                 priority=0, operation='get', originator=test_users.u1,
+                                 record_selector={'term': {'keywords': 'blah'}})
+        expensive = ElasticsearchACL(name='expensive', schemas=[RECORD_SCHEMA],
+                                     priority=0, operation='get', originator=test_users.u1,
+                                     record_selector={'wildcard': {'keywords': '*lah'}})
+        db.session.add(cheap)
+        db.session.add(expensive)
+
+    profiles = current_explicit_acls.profile_selectors()
+    assert [x['acl'].id for x in profiles] == [expensive.id, cheap.id]
+    assert [x['cost'] for x in profiles] == [100, 1]
+    assert all(x['valid'] for x in profiles)
+    assert all(x['index'] == 'records-record-v1.0.0' for x in profiles)
+    assert all(x['time_in_nanos'] >= 0 for x in profiles)
+    assert profiles[0]['constructs'] == [('leading_wildcard', 'wildcard.keywords')]
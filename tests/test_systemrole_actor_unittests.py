@@ -110,6 +110,24 @@ def test_get_matching_users(app, db, es, test_users):
         list(actor1.get_matching_users())
 
 
+def test_iter_matching_user_ids(app, db, es, test_users):
+    with db.session.begin_nested():
+        actor = SystemRoleActor(name='test', originator=test_users.u1, system_role='any_user')
+        actor1 = SystemRoleActor(name='test 1', originator=test_users.u1, system_role='custom_system_role')
+        db.session.add(actor)
+        db.session.add(actor1)
+
+    user_ids = sorted([test_users.u1.id, test_users.u2.id, test_users.u3.id])
+    assert list(actor.iter_matching_user_ids()) == user_ids
+    assert list(actor.iter_matching_user_id_chunks(chunk_size=2)) == [user_ids[:2], user_ids[2:]]
+    assert actor.count_matching_users() == 3
+
+    with pytest.raises(NotImplementedError):
+        list(actor1.iter_matching_user_ids())
+    with pytest.raises(NotImplementedError):
+        actor1.count_matching_users()
+
+
 def test_str(app, db, test_users):
     with db.session.begin_nested():
         actor = SystemRoleActor(name='test', originator=test_users.u1, system_role='authenticated_user')
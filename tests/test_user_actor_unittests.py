@@ -22,6 +22,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 #
+import sqlalchemy
 from elasticsearch import VERSION as ES_VERSION
 from elasticsearch_dsl.query import Term
 from flask_security import AnonymousUser
@@ -80,3 +81,26 @@ def test_str(app, db, test_users):
         actor = UserActor(name='test', originator=test_users.u1, users=[test_users.u2])
         db.session.add(actor)
     assert 'UserActor[test]' == str(actor)
+
+
+def test_user_ids(app, db, es, test_users):
+    with db.session.begin_nested():
+        actor = UserActor(name='test', originator=test_users.u1, users=[test_users.u3, test_users.u2])
+        actor1 = UserActor(name='test 1', originator=test_users.u1, users=[])
+        db.session.add(actor)
+        db.session.add(actor1)
+    db.session.expire(actor)
+    db.session.expire(actor1)
+
+    UserActor.preload([actor, actor1])
+    assert actor.user_ids == [test_users.u2.id, test_users.u3.id]
+    assert actor1.user_ids == []
+    # only the ids have been loaded, not the User objects
+    assert 'users' in sqlalchemy.inspect(actor).unloaded
+    assert sorted(actor.get_elasticsearch_representation()) == [test_users.u2.id, test_users.u3.id]
+    assert actor.user_matches(test_users.u2, {'system_roles': [authenticated_user]})
+    assert 'users' in sqlalchemy.inspect(actor).unloaded
+
+    # changes of the relationship are visible immediately
+    actor.users.append(test_users.u1)
+    assert actor.user_ids == [test_users.u1.id, test_users.u2.id, test_users.u3.id]